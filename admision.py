@@ -0,0 +1,246 @@
+"""
+🚦 CONTROL DE ADMISIÓN DE TURNOS
+Delante de cada turno del agente: un límite global de turnos en curso y otro
+por sesión, y una cola justa para el resto. Cuando se libera un hueco se
+atiende a la siguiente sesión por turnos rotatorios (no al primero que llegó),
+así una sesión con muchos mensajes o un lote no deja sin servicio a las
+demás. Quien espera conoce su posición; si la cola es demasiado larga o la
+espera supera el máximo, el turno se rechaza con un mensaje amable
+(Sobrecarga) en lugar de acumular trabajo que nadie va a esperar.
+
+El límite es por proceso: con varios workers, cada uno tiene el suyo
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional
+
+from metricas import metricas
+
+# Turnos del agente en curso a la vez en el proceso
+MAX_TURNOS = int(os.getenv("ADMISION_MAX_TURNOS", "8"))
+
+# Turnos en curso a la vez de una misma sesión
+MAX_POR_SESION = int(os.getenv("ADMISION_MAX_POR_SESION", "1"))
+
+# Turnos esperando en total / de una misma sesión; por encima se rechazan al llegar
+MAX_COLA = int(os.getenv("ADMISION_MAX_COLA", "50"))
+MAX_COLA_SESION = int(os.getenv("ADMISION_MAX_COLA_SESION", "2"))
+
+# Segundos máximos en la cola antes de rechazar el turno
+ESPERA_MAXIMA = float(os.getenv("ADMISION_ESPERA_MAX_S", "30"))
+
+# Herramientas en paralelo como máximo dentro de un turno (config["max_concurrency"])
+MAX_HERRAMIENTAS_TURNO = int(os.getenv("ADMISION_MAX_HERRAMIENTAS", "4"))
+
+# Cada cuánto se avisa de la posición a quien espera
+INTERVALO_AVISO = 1.0
+
+MENSAJE_SOBRECARGA = ("🚦 Ahora mismo estoy atendiendo a muchos viajeros a la vez y no puedo "
+                      "empezar con tu mensaje. Vuelve a enviarlo en un minuto, por favor.")
+
+class Sobrecarga(Exception):
+    """El turno no se admitió: cola llena o demasiada espera"""
+    def __init__(self, motivo: str):
+        super().__init__(MENSAJE_SOBRECARGA)
+        self.motivo = motivo
+
+class Ticket:
+    """Un turno que pide entrar"""
+    def __init__(self, sesion_id: str):
+        self.sesion_id = sesion_id
+        self.creado = time.monotonic()
+        self.admitido = threading.Event()
+        self.liberado = False
+        self._avisos: List[Callable[[], None]] = []
+
+    def al_admitir(self, funcion: Callable[[], None]):
+        self._avisos.append(funcion)
+
+def limitar_herramientas(config: Dict[str, Any], maximo: int = MAX_HERRAMIENTAS_TURNO) -> Dict[str, Any]:
+    """Config del turno con las llamadas a herramientas en paralelo acotadas (ToolNode las respeta)"""
+    return {**config, "max_concurrency": maximo}
+
+class ControlAdmision:
+    def __init__(self, max_turnos: int = MAX_TURNOS, max_por_sesion: int = MAX_POR_SESION,
+                 max_cola: int = MAX_COLA, max_cola_sesion: int = MAX_COLA_SESION,
+                 espera_maxima: float = ESPERA_MAXIMA, nombre: str = "agente"):
+        self.max_turnos = max_turnos
+        self.max_por_sesion = max_por_sesion
+        self.max_cola = max_cola
+        self.max_cola_sesion = max_cola_sesion
+        self.espera_maxima = espera_maxima
+        self.nombre = nombre
+        self.en_curso = 0
+        self._por_sesion: Dict[str, int] = {}
+        # Sesiones con turnos esperando, en el orden en que les toca
+        self._colas: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()
+        self._esperando = 0
+        self._lock = threading.Lock()
+
+    # --- Núcleo -------------------------------------------------------------
+
+    def solicitar(self, sesion_id: str) -> Ticket:
+        """Pone el turno en la cola (o lo admite ya); Sobrecarga si la cola está llena"""
+        ticket = Ticket(sesion_id)
+        with self._lock:
+            cola = self._colas.get(sesion_id)
+            if self._esperando >= self.max_cola:
+                motivo = "cola_llena"
+            elif cola is not None and len(cola) >= self.max_cola_sesion:
+                motivo = "cola_sesion"
+            else:
+                motivo = None
+                if cola is None:
+                    cola = self._colas[sesion_id] = deque()
+                cola.append(ticket)
+                self._esperando += 1
+                avisos = self._despachar()
+        if motivo:
+            metricas.incrementar("admision_rechazos_total", motivo=motivo, control=self.nombre)
+            raise Sobrecarga(motivo)
+        self._avisar(avisos)
+        return ticket
+
+    def _despachar(self) -> List[Ticket]:
+        """Con el lock tomado: admite turnos mientras haya huecos, rotando entre sesiones"""
+        admitidos = []
+        while self.en_curso < self.max_turnos:
+            sesion_id = next((s for s in self._colas
+                              if self._por_sesion.get(s, 0) < self.max_por_sesion), None)
+            if sesion_id is None:
+                break
+            cola = self._colas.pop(sesion_id)
+            ticket = cola.popleft()
+            if cola:
+                self._colas[sesion_id] = cola  # al final: ahora les toca a las demás
+            self._esperando -= 1
+            self.en_curso += 1
+            self._por_sesion[sesion_id] = self._por_sesion.get(sesion_id, 0) + 1
+            ticket.admitido.set()
+            admitidos.append(ticket)
+        metricas.fijar("admision_en_curso", self.en_curso, control=self.nombre)
+        metricas.fijar("admision_en_cola", self._esperando, control=self.nombre)
+        return admitidos
+
+    def _avisar(self, admitidos: List[Ticket]):
+        for ticket in admitidos:
+            metricas.incrementar("admision_admitidos_total", control=self.nombre)
+            metricas.incrementar("admision_espera_segundos_total", time.monotonic() - ticket.creado,
+                                 control=self.nombre)
+            for aviso in ticket._avisos:
+                aviso()
+
+    def liberar(self, ticket: Ticket):
+        """Fin del turno admitido, o abandono del que seguía en la cola"""
+        with self._lock:
+            if ticket.liberado:
+                return
+            ticket.liberado = True
+            if ticket.admitido.is_set():
+                self.en_curso -= 1
+                restantes = self._por_sesion.get(ticket.sesion_id, 1) - 1
+                if restantes:
+                    self._por_sesion[ticket.sesion_id] = restantes
+                else:
+                    self._por_sesion.pop(ticket.sesion_id, None)
+            else:
+                cola = self._colas.get(ticket.sesion_id)
+                if cola is not None and ticket in cola:
+                    cola.remove(ticket)
+                    self._esperando -= 1
+                    if not cola:
+                        del self._colas[ticket.sesion_id]
+            avisos = self._despachar()
+        self._avisar(avisos)
+
+    def posicion(self, ticket: Ticket) -> int:
+        """Turnos que se atenderán antes que este, contando el suyo (0 = ya admitido)"""
+        with self._lock:
+            if ticket.admitido.is_set():
+                return 0
+            cola = self._colas.get(ticket.sesion_id)
+            if cola is None or ticket not in cola:
+                return 0
+            indice = cola.index(ticket)
+            delante = indice
+            antes_en_ronda = True
+            for sesion_id, otra in self._colas.items():
+                if sesion_id == ticket.sesion_id:
+                    antes_en_ronda = False
+                    continue
+                # En cada ronda cada sesión pasa un turno; las anteriores en la ronda, uno más
+                delante += min(len(otra), indice + (1 if antes_en_ronda else 0))
+            return delante + 1
+
+    # --- Espera ---------------------------------------------------------------
+
+    def esperar(self, ticket: Ticket, al_esperar: Optional[Callable[[int], None]] = None,
+                espera: Optional[float] = None):
+        """Bloquea hasta la admisión avisando de la posición; Sobrecarga si se agota la espera"""
+        limite = time.monotonic() + (self.espera_maxima if espera is None else espera)
+        while not ticket.admitido.wait(timeout=max(0.0, min(INTERVALO_AVISO, limite - time.monotonic()))):
+            if time.monotonic() >= limite:
+                self._abandonar(ticket)
+                return
+            if al_esperar is not None:
+                al_esperar(self.posicion(ticket))
+
+    async def posiciones(self, ticket: Ticket, espera: Optional[float] = None) -> AsyncIterator[int]:
+        """
+        Igual que esperar, sin ocupar un hilo: produce la posición cada
+        INTERVALO_AVISO mientras espera y termina al ser admitido
+        """
+        bucle = asyncio.get_running_loop()
+        admitido = bucle.create_future()
+        ticket.al_admitir(lambda: bucle.call_soon_threadsafe(
+            lambda: admitido.done() or admitido.set_result(True)))
+        limite = time.monotonic() + (self.espera_maxima if espera is None else espera)
+        completado = False
+        try:
+            while not ticket.admitido.is_set():
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._abandonar(ticket)
+                    break
+                try:
+                    await asyncio.wait_for(asyncio.shield(admitido), timeout=min(INTERVALO_AVISO, restante))
+                except asyncio.TimeoutError:
+                    if not ticket.admitido.is_set():
+                        yield self.posicion(ticket)
+            completado = True
+        finally:
+            # Cliente desconectado o cancelación: el hueco (o el sitio en la cola) se devuelve
+            if not completado:
+                self.liberar(ticket)
+
+    def _abandonar(self, ticket: Ticket):
+        """Espera agotada; si justo lo admitieron, se respeta la admisión"""
+        if not ticket.admitido.is_set():
+            self.liberar(ticket)
+        if not ticket.admitido.is_set():
+            metricas.incrementar("admision_rechazos_total", motivo="espera", control=self.nombre)
+            raise Sobrecarga("espera")
+
+    @contextmanager
+    def turno(self, sesion_id: str, al_esperar: Optional[Callable[[int], None]] = None,
+              espera: Optional[float] = None) -> Iterator[Ticket]:
+        """Bloque con un turno admitido (para código síncrono: Streamlit, hilos)"""
+        ticket = self.solicitar(sesion_id)
+        try:
+            self.esperar(ticket, al_esperar, espera)
+            yield ticket
+        finally:
+            self.liberar(ticket)
+
+    def estado(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"en_curso": self.en_curso, "capacidad": self.max_turnos, "en_cola": self._esperando,
+                    "sesiones_en_cola": len(self._colas)}
+
+# Instancia global de la app Streamlit; la API crea la suya con API_MAX_CONCURRENTES
+control_admision = ControlAdmision()
@@ -0,0 +1,177 @@
+"""
+🔮 PRECARGA ESPECULATIVA POR SESIÓN
+La conversación sigue casi siempre el mismo orden: en cuanto se conoce el
+destino (y el origen o las fechas) se sabe qué pedirán los pasos siguientes
+(información del destino, temporada, vuelos). El anticipador observa los
+datos extraídos de cada mensaje y las llamadas a herramientas y llena las
+cachés en segundo plano, con un presupuesto de concurrencia y cancelando lo
+pendiente cuando el usuario cambia de planes
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from metricas import metricas
+from viajeros import viajeros_db
+
+# Hilos que ejecutan precargas (compartidos por todas las sesiones)
+HILOS_ANTICIPACION = int(os.getenv("ANTICIPAR_HILOS", "2"))
+
+# Precargas en vuelo o en cola como máximo; por encima se descartan las nuevas
+MAX_EN_VUELO = int(os.getenv("ANTICIPAR_MAX_EN_VUELO", "6"))
+
+# Sesiones cuyo plan se recuerda en este proceso
+MAX_SESIONES = int(os.getenv("ANTICIPAR_MAX_SESIONES", "1000"))
+
+# Argumentos de las herramientas que revelan el plan: herramienta -> {argumento: campo}
+ARGUMENTOS_PLAN = {
+    "info_destino": {"ciudad": "destino"},
+    "recomendaciones_temporada": {"destino": "destino", "mes": "mes"},
+    "generar_itinerario": {"destino": "destino"},
+    "calcular_presupuesto": {"destino": "destino"},
+    "planificar_viaje": {"destino": "destino", "mes": "mes"},
+    "buscar_vuelos": {"origen": "origen", "destino": "destino",
+                      "fecha_ida": "fecha_ida", "fecha_vuelta": "fecha_vuelta"},
+}
+
+@dataclass(frozen=True)
+class PlanViaje:
+    """Lo que se sabe del viaje de una sesión"""
+    destino: Optional[str] = None
+    origen: Optional[str] = None
+    fecha_ida: Optional[str] = None
+    fecha_vuelta: Optional[str] = None
+    mes: Optional[str] = None
+    adultos: int = 1
+
+    def combinar(self, **hechos: Any) -> "PlanViaje":
+        """Plan con los hechos nuevos; los None no borran lo que ya se sabía"""
+        return replace(self, **{k: v for k, v in hechos.items() if v is not None})
+
+    def misma_ruta(self, otro: "PlanViaje") -> bool:
+        return (_norm(self.destino), _norm(self.origen)) == (_norm(otro.destino), _norm(otro.origen))
+
+def _norm(ciudad: Optional[str]) -> Optional[str]:
+    return ciudad.strip().lower() if ciudad else None
+
+class _EstadoSesion:
+    def __init__(self):
+        self.plan = PlanViaje()
+        self.cancelado = threading.Event()
+        self.futuros: List[Future] = []
+
+    def cancelar(self):
+        """Marca la precarga en curso y quita de la cola las que no empezaron (liberan cupo)"""
+        self.cancelado.set()
+        for futuro in self.futuros:
+            futuro.cancel()
+        self.futuros = []
+
+class Anticipador:
+    """
+    `calentar(plan, cancelado)` hace las peticiones que necesitarán los pasos
+    siguientes y debe mirar `cancelado` entre una y otra
+    """
+    def __init__(self, calentar: Callable[[PlanViaje, threading.Event], None],
+                 hilos: int = HILOS_ANTICIPACION, max_en_vuelo: int = MAX_EN_VUELO):
+        self.calentar = calentar
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="anticipacion")
+        self._cupo = threading.BoundedSemaphore(max_en_vuelo)
+        self._sesiones: "OrderedDict[str, _EstadoSesion]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observar(self, sesion_id: str, **hechos: Any):
+        """
+        Incorpora hechos (destino, origen, fechas, mes) al plan de la
+        sesión y, si el plan cambió, cancela la precarga anterior y lanza otra.
+        Los adultos se leen de la lista de viajeros del contexto actual: la
+        precarga corre en otro hilo y forman parte de la clave de vuelos
+        """
+        hechos.setdefault("adultos", max(viajeros_db.contar_por_tipo().get("adulto", 0), 1))
+        with self._lock:
+            estado = self._sesiones.get(sesion_id)
+            if estado is None:
+                estado = self._sesiones[sesion_id] = _EstadoSesion()
+                while len(self._sesiones) > MAX_SESIONES:
+                    _, expulsado = self._sesiones.popitem(last=False)
+                    expulsado.cancelar()
+            self._sesiones.move_to_end(sesion_id)
+
+            anterior = estado.plan
+            plan = anterior.combinar(**hechos)
+            if not anterior.misma_ruta(plan):
+                # Otro destino u origen: lo pendiente ya no sirve (fechas y viajeros se conservan)
+                estado.cancelar()
+                estado.cancelado = threading.Event()
+                if anterior.destino:
+                    metricas.incrementar("anticipacion_cambios_plan_total")
+            estado.plan = plan
+            if plan == anterior or not plan.destino:
+                return
+            if not self._cupo.acquire(blocking=False):
+                metricas.incrementar("anticipacion_tareas_total", resultado="descartada")
+                return
+            metricas.incrementar("anticipacion_tareas_total", resultado="lanzada")
+            futuro = self._pool.submit(self._ejecutar, plan, estado.cancelado)
+            estado.futuros = [f for f in estado.futuros if not f.done()] + [futuro]
+        futuro.add_done_callback(self._terminada)
+
+    def _terminada(self, futuro: Future):
+        self._cupo.release()
+        if futuro.cancelled():
+            metricas.incrementar("anticipacion_tareas_total", resultado="cancelada")
+
+    def _ejecutar(self, plan: PlanViaje, cancelado: threading.Event):
+        if cancelado.is_set():
+            metricas.incrementar("anticipacion_tareas_total", resultado="cancelada")
+            return
+        try:
+            self.calentar(plan, cancelado)
+            metricas.incrementar("anticipacion_tareas_total",
+                                 resultado="cancelada" if cancelado.is_set() else "completada")
+        except Exception:
+            metricas.incrementar("anticipacion_tareas_total", resultado="error")
+
+    def observar_preprocesado(self, sesion_id: str, preprocesado):
+        """Hechos extraídos del mensaje del usuario antes de llamar al modelo"""
+        self.observar(sesion_id, destino=preprocesado.destino, origen=preprocesado.origen,
+                      fecha_ida=preprocesado.fecha_ida, fecha_vuelta=preprocesado.fecha_vuelta)
+
+    def observar_herramienta(self, sesion_id: str, herramienta: str, argumentos: Dict[str, Any]):
+        """Hechos a partir de una llamada del modelo a una herramienta"""
+        campos = ARGUMENTOS_PLAN.get(herramienta)
+        if campos:
+            self.observar(sesion_id, **{campo: argumentos.get(arg) for arg, campo in campos.items()})
+
+    def cancelar(self, sesion_id: str):
+        """La sesión terminó o se reinició"""
+        with self._lock:
+            estado = self._sesiones.pop(sesion_id, None)
+        if estado is not None:
+            estado.cancelar()
+
+    def plan(self, sesion_id: str) -> PlanViaje:
+        with self._lock:
+            estado = self._sesiones.get(sesion_id)
+            return estado.plan if estado else PlanViaje()
+
+    def observador(self, sesion_id: str) -> "ObservadorHerramientas":
+        """Callback para config["callbacks"] del turno de esa sesión"""
+        return ObservadorHerramientas(self, sesion_id)
+
+class ObservadorHerramientas(BaseCallbackHandler):
+    """Pasa al anticipador los argumentos de las herramientas que llama el modelo"""
+    def __init__(self, anticipador: Anticipador, sesion_id: str):
+        self.anticipador = anticipador
+        self.sesion_id = sesion_id
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *,
+                      inputs: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        if inputs:
+            self.anticipador.observar_herramienta(self.sesion_id, (serialized or {}).get("name", ""), inputs)
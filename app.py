@@ -5,10 +5,16 @@ Interfaz web con Streamlit
 
 import streamlit as st
 import os
-from datetime import datetime
+import sys
+import importlib
+import threading
+import uuid
 from dotenv import load_dotenv
-from asistente import crear_agente_vacaciones, viajeros_db
-from langchain_core.messages import HumanMessage, AIMessage
+from sesiones import AlmacenSesiones, ConflictoVersion, crear_almacen
+from viajeros import ViajerosDB, viajeros_aislados
+
+# asistente (LangChain, LangGraph, OpenAI...) se importa en segundo plano tras
+# pintar la página, y el agente se construye con el primer mensaje
 
 # Cargar variables de entorno
 load_dotenv()
@@ -162,21 +168,68 @@ st.markdown("""
 # INICIALIZACIÓN DE ESTADO
 # ============================================================================
 
+@st.cache_resource(show_spinner=False)
+def obtener_almacen() -> AlmacenSesiones:
+    """Almacén compartido de sesiones (SESIONES_URL): cualquier worker puede retomar cualquier sesión"""
+    return crear_almacen()
+
 def inicializar_estado():
-    """Inicializa el estado de la sesión"""
-    if 'agente' not in st.session_state:
-        st.session_state.agente = crear_agente_vacaciones()
+    """Inicializa el estado de la sesión (el id va en la URL: ?sesion=...)"""
+    sesion_id = st.query_params.get("sesion")
+    if not sesion_id:
+        sesion_id = uuid.uuid4().hex
+        st.query_params["sesion"] = sesion_id
     
-    if 'config' not in st.session_state:
-        st.session_state.config = {
-            "configurable": {"thread_id": f"travel_{datetime.now().strftime('%Y%m%d_%H%M%S')}"}
-        }
+    if st.session_state.get('sesion_id') != sesion_id:
+        st.session_state.sesion_id = sesion_id
+        st.session_state.config = {"configurable": {"thread_id": f"web_{sesion_id}"}}
+        cargar_sesion()
+
+def cargar_sesion():
+    """Trae del almacén el historial y los viajeros (pudo escribirlos otro worker)"""
+    datos = obtener_almacen().leer(st.session_state.sesion_id).datos
+    st.session_state.historial = datos.get("historial", [])
+    st.session_state.viajeros = ViajerosDB.desde_dict(datos.get("viajeros"))
+    st.session_state.consumo = datos.get("consumo", {})
+    st.session_state.contador_mensajes = sum(1 for m in st.session_state.historial if m['role'] == 'user')
+
+def guardar_sesion(nuevos_mensajes=(), limpiar_historial: bool = False, consumo_turno=None):
+    """
+    Añade los mensajes del turno, el consumo de tokens del turno y guarda los
+    viajeros. Si otro worker escribió entretanto, se reintenta sobre su
+    versión en lugar de pisarla
+    """
+    viajeros = st.session_state.viajeros.a_dict()
     
-    if 'historial' not in st.session_state:
-        st.session_state.historial = []
+    def cambio(datos):
+        historial = [] if limpiar_historial else datos.get("historial", [])
+        nuevos = {**datos, "historial": historial + list(nuevos_mensajes), "viajeros": viajeros}
+        if consumo_turno is not None:
+            from consumo import ConsumoTokens
+            nuevos["consumo"] = ConsumoTokens.desde_dict(datos.get("consumo")).sumar(consumo_turno).a_dict()
+        return nuevos
     
-    if 'contador_mensajes' not in st.session_state:
-        st.session_state.contador_mensajes = 0
+    try:
+        estado = obtener_almacen().actualizar(st.session_state.sesion_id, cambio)
+        st.session_state.historial = estado.datos["historial"]
+        st.session_state.consumo = estado.datos.get("consumo", {})
+    except ConflictoVersion:
+        st.warning("⚠️ La sesión se modificó desde otra pestaña; recarga la página.")
+
+@st.cache_resource(show_spinner=False)
+def precargar_asistente() -> threading.Thread:
+    """Importa asistente en un hilo, una sola vez por proceso, para que el primer mensaje no espere"""
+    hilo = threading.Thread(target=importlib.import_module, args=("asistente",),
+                            name="precarga-asistente", daemon=True)
+    hilo.start()
+    return hilo
+
+@st.cache_resource(show_spinner=False)
+def obtener_agente():
+    """Agente del proceso, construido con el primer mensaje; el historial de cada sesión va en el almacén"""
+    from asistente import crear_agente_vacaciones
+    from checkpointer_sesiones import CheckpointerSesiones
+    return crear_agente_vacaciones(checkpointer=CheckpointerSesiones(obtener_almacen()))
 
 # ============================================================================
 # FUNCIONES DE INTERFAZ
@@ -257,7 +310,7 @@ def mostrar_sidebar():
             """, unsafe_allow_html=True)
         
         with col2:
-            num_viajeros = len(viajeros_db.viajeros)
+            num_viajeros = len(st.session_state.viajeros.viajeros)
             st.markdown(f"""
             <div class="metric-card">
                 <div style='font-size: 2rem; font-weight: bold; color: #FF6B6B;'>{num_viajeros}</div>
@@ -265,9 +318,22 @@ def mostrar_sidebar():
             </div>
             """, unsafe_allow_html=True)
         
+        # Consumo de tokens de la sesión
+        consumo = st.session_state.consumo
+        tokens = consumo.get('prompt', 0) + consumo.get('respuesta', 0)
+        st.markdown(f"""
+        <div class="metric-card">
+            <div style='font-size: 1.6rem; font-weight: bold; color: #45B7D1;'>{tokens:,}</div>
+            <div style='font-size: 0.9rem; color: #95a5a6;'>Tokens · ${consumo.get('coste', 0):.4f} USD</div>
+        </div>
+        """, unsafe_allow_html=True)
+        if consumo.get('por_herramienta'):
+            herramientas = sorted(consumo['por_herramienta'].items(), key=lambda par: -par[1])[:3]
+            st.caption("🧮 Contexto por herramienta: " + " · ".join(f"{h} {t:,}" for h, t in herramientas))
+        
         # Desglose de viajeros
         if num_viajeros > 0:
-            conteo = viajeros_db.contar_por_tipo()
+            conteo = st.session_state.viajeros.contar_por_tipo()
             st.markdown(f"""
             <div style='background: rgba(78, 205, 196, 0.1); padding: 0.8rem; border-radius: 0.5rem; margin-top: 0.5rem;'>
                 <small>
@@ -284,13 +350,16 @@ def mostrar_sidebar():
         col1, col2 = st.columns(2)
         with col1:
             if st.button("🗑️ Limpiar Chat", use_container_width=True):
-                st.session_state.historial = []
+                from asistente import anticipador
+                anticipador.cancelar(st.session_state.sesion_id)
+                guardar_sesion(limpiar_historial=True)
                 st.session_state.contador_mensajes = 0
                 st.rerun()
             
         with col2:
             if st.button("👥 Limpiar Viajeros", use_container_width=True):
-                viajeros_db.limpiar()
+                st.session_state.viajeros.limpiar()
+                guardar_sesion()
                 st.rerun()
         
         st.markdown("---")
@@ -314,6 +383,8 @@ def mostrar_historial():
                 {mensaje['content']}
             </div>
             """, unsafe_allow_html=True)
+            if mensaje.get('preprocesado'):
+                st.caption(mensaje['preprocesado'])
         else:
             # Convertir saltos de línea a <br> para mejor visualización
             contenido = mensaje['content'].replace('\n', '<br>')
@@ -323,26 +394,109 @@ def mostrar_historial():
                 {contenido}
             </div>
             """, unsafe_allow_html=True)
+            if mensaje.get('consumo'):
+                c = mensaje['consumo']
+                st.caption(f"🧮 {c['prompt'] + c['respuesta']:,} tokens "
+                           f"({c['llamadas']} llamada(s) al modelo) · ${c['coste']:.4f} USD")
+
+@st.fragment(run_every=float(os.getenv("VUELOS_INTERVALO_UI_S", "2")))
+def vigilar_vuelos():
+    """
+    Mientras haya búsquedas de vuelos en segundo plano, avisa y, cuando llegan
+    los precios reales (o fallan), lo añade a la conversación (y al historial del agente)
+    """
+    from vuelos_progresivos import busquedas_vuelos
+    
+    thread_id = st.session_state.config["configurable"]["thread_id"]
+    en_curso = busquedas_vuelos.en_curso(thread_id)
+    if en_curso:
+        st.info("⏳ Buscando precios reales: " + ", ".join(b.descripcion for b in en_curso)
+                + ". Los mostraré aquí en cuanto lleguen.")
+    terminadas = busquedas_vuelos.aplicar(obtener_agente(), st.session_state.config)
+    if terminadas:
+        cargar_sesion()
+        guardar_sesion([{'role': 'assistant', 'content': b.mensaje} for b in terminadas])
+    if terminadas or not en_curso:
+        # Redibujar el chat; sin búsquedas activas el fragmento deja de ejecutarse
+        st.rerun()
 
 def procesar_mensaje(user_input: str):
     """Procesa el mensaje del usuario con el agente"""
+    # Partir del estado guardado (otro worker pudo atender el turno anterior)
+    cargar_sesion()
+    inicio_turno = len(st.session_state.historial)
+    
+    # Precios reales (o avisos de fallo) que llegaron después del último refresco de la página
+    from vuelos_progresivos import busquedas_vuelos
+    if busquedas_vuelos.pendientes(st.session_state.config["configurable"]["thread_id"]):
+        for busqueda in busquedas_vuelos.aplicar(obtener_agente(), st.session_state.config):
+            st.session_state.historial.append({'role': 'assistant', 'content': busqueda.mensaje})
+    
     # Agregar mensaje del usuario al historial
     st.session_state.historial.append({
         'role': 'user',
         'content': user_input
     })
     st.session_state.contador_mensajes += 1
+    contador = None
+    
+    # Módulos ligeros: las excepciones que se capturan abajo tienen que existir
+    # aunque falle la importación o la preparación del turno dentro del try
+    from plazos import PlazoAgotado, plazo_turno
+    from admision import Sobrecarga, control_admision, limitar_herramientas
+    
+    # Con mucha demanda el turno espera en la cola de admisión: se muestra la posición
+    aviso_cola = st.empty()
+    def avisar_posicion(posicion: int):
+        aviso_cola.info(f"🚦 Hay mucha demanda ahora mismo: eres el número {posicion} en la cola...")
     
     # Procesar con el agente
     with st.spinner('🤔 Planificando tu viaje perfecto...'):
         try:
+            from langchain_core.messages import HumanMessage, AIMessage
+            from preprocesador import preprocesar, registrar_respuesta_directa
+            from consumo import ConsumoTokens, ContadorTokens, config_turno
+            from asistente import anticipador
+            from vuelos_progresivos import VUELOS_PROGRESIVOS
+            
             response_content = ""
+            result = None
+            
+            # Cuenta los tokens del turno; con el presupuesto de la sesión agotado
+            # se compacta el historial o se usa el modelo económico
+            contador = ContadorTokens()
+            # Herramientas en paralelo acotadas por turno (ADMISION_MAX_HERRAMIENTAS)
+            config = limitar_herramientas(config_turno(st.session_state.config,
+                                                       ConsumoTokens.desde_dict(st.session_state.consumo), contador))
+            # Las herramientas que llama el modelo anticipan los datos de los pasos siguientes
+            config["callbacks"].append(anticipador.observador(st.session_state.sesion_id))
+            # Vuelos al instante con precios orientativos; los reales llegan después (vigilar_vuelos)
+            config["configurable"]["vuelos_progresivos"] = VUELOS_PROGRESIVOS
             
-            # Obtener el estado completo del grafo
-            result = st.session_state.agente.invoke(
-                {"messages": [HumanMessage(content=user_input)]},
-                st.session_state.config
-            )
+            # Obtener el estado completo del grafo (con los viajeros de esta sesión),
+            # con un plazo para todo el turno (PLAZO_TURNO_S) que empieza al tener hueco.
+            # La admisión va primero: un turno rechazado (Sobrecarga) no registra viajeros
+            with viajeros_aislados(st.session_state.viajeros), \
+                    control_admision.turno(st.session_state.sesion_id, avisar_posicion), plazo_turno():
+                aviso_cola.empty()
+                # Viajeros, fechas, días y presupuesto se extraen sin el modelo
+                preprocesado = preprocesar(user_input)
+                anticipador.observar_preprocesado(st.session_state.sesion_id, preprocesado)
+                if preprocesado.respuesta_directa:
+                    registrar_respuesta_directa(obtener_agente(), st.session_state.config, preprocesado)
+                    response_content = preprocesado.respuesta_directa
+                else:
+                    result = obtener_agente().invoke(
+                        {"messages": [HumanMessage(content=preprocesado.mensaje_agente)]},
+                        config
+                    )
+            aviso_cola.empty()
+            
+            if preprocesado.hay_datos:
+                st.session_state.historial[-1]['preprocesado'] = (
+                    f"⚡ Datos aplicados localmente en {preprocesado.segundos * 1000:.1f} ms"
+                    f" · ~{preprocesado.tokens_ahorrados} tokens ahorrados"
+                )
             
             # Obtener la última respuesta del asistente
             if result and "messages" in result:
@@ -355,7 +509,8 @@ def procesar_mensaje(user_input: str):
             if response_content:
                 st.session_state.historial.append({
                     'role': 'assistant',
-                    'content': response_content
+                    'content': response_content,
+                    'consumo': contador.turno.a_dict() if contador.turno.llamadas else None
                 })
             else:
                 st.session_state.historial.append({
@@ -363,6 +518,17 @@ def procesar_mensaje(user_input: str):
                     'content': "❌ No pude generar una respuesta. Por favor, intenta de nuevo."
                 })
         
+        except Sobrecarga as e:
+            # Cola llena o demasiada espera: mejor avisar que dejar al usuario esperando
+            aviso_cola.empty()
+            st.session_state.historial.append({'role': 'assistant', 'content': str(e)})
+        
+        except PlazoAgotado:
+            st.session_state.historial.append({
+                'role': 'assistant',
+                'content': "⏱️ Esta respuesta está tardando demasiado. Intenta de nuevo o pide una parte del plan cada vez."
+            })
+        
         except Exception as e:
             import traceback
             error_detail = traceback.format_exc()
@@ -370,6 +536,9 @@ def procesar_mensaje(user_input: str):
                 'role': 'assistant',
                 'content': f"❌ Error: {str(e)}\n\nSi el problema persiste, intenta limpiar el chat."
             })
+    
+    guardar_sesion(st.session_state.historial[inicio_turno:],
+                   consumo_turno=contador.turno if contador else None)
 
 # ============================================================================
 # INTERFAZ PRINCIPAL
@@ -393,6 +562,12 @@ def main():
     with chat_container:
         mostrar_historial()
     
+    # Solo mientras haya búsquedas de vuelos de esta sesión en este proceso
+    if "asistente" in sys.modules:
+        from vuelos_progresivos import busquedas_vuelos
+        if busquedas_vuelos.activas(st.session_state.config["configurable"]["thread_id"]):
+            vigilar_vuelos()
+    
     # Input del usuario con formulario para mejor UX
     st.markdown("---")
     with st.form(key="mensaje_form", clear_on_submit=True):
@@ -507,6 +682,10 @@ def main():
                 <p>Calculo el costo completo incluyendo vuelos, hotel, comidas, actividades y más.</p>
             </div>
             """, unsafe_allow_html=True)
+    
+    # Con la página ya pintada, adelantar la importación del agente
+    if os.getenv("PRECARGAR_AGENTE", "1") != "0":
+        precargar_asistente()
 
 if __name__ == "__main__":
     main()
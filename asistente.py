@@ -4,60 +4,41 @@ Sistema inteligente para planificar vacaciones perfectas
 """
 
 import os
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-import random
+import numpy as np
 
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
-from langchain_core.messages import SystemMessage
-from langgraph.prebuilt import create_react_agent
-from langgraph.checkpoint.memory import MemorySaver
+
+from configuracion import NIVEL_ITINERARIO, tablas_config
+from limitador import planificador_amadeus, PRIORIDAD_INTERACTIVA, PRIORIDAD_LOTE, PRIORIDAD_PRECARGA
+from cache_precios import cache_precios, describir_edad
+from caches import cache_geocodificacion, cache_wikipedia
+from resiliencia import CircuitoAbierto, upstream_amadeus, upstream_open_meteo, upstream_wikipedia
+import plazos
+from popularidad import rastreador_popularidad, numero_mes, Precalentador
+from anticipacion import Anticipador, PlanViaje
+from ofertas import OfertaVuelo, MAX_OFERTAS, parsear_respuesta
+from precios import (MONEDA, MezclaViajeros, mezcla_desde_conteo, mezcla_vuelo, precios_grupo,
+                     formatear_importe, nivel_presupuesto, presupuesto_escenarios)
+from simulador import simular_vuelos
+from conocimiento import paquete_destinos, banda_climatica
+from geografia import Lugar, ubicar, estacion, es_temporada_lluvias
+from itinerarios import planificar_itinerario, formatear_itinerario
+from viajeros import tipo_por_edad, viajeros_db
+from vuelos_progresivos import busquedas_vuelos
 
 # Cargar variables de entorno
 load_dotenv()
 
-# ============================================================================
-# BASE DE DATOS DE VIAJEROS
-# ============================================================================
-
-class ViajerosDB:
-    """Base de datos en memoria para gestionar viajeros"""
-    def __init__(self):
-        self.viajeros: List[Dict[str, Any]] = []
-        self.contador = 1
-    
-    def agregar(self, nombre: str, edad: int, tipo: str = "adulto") -> Dict:
-        viajero = {
-            "id": self.contador,
-            "nombre": nombre,
-            "edad": edad,
-            "tipo": tipo,  # adulto, niño, bebé
-            "fecha_registro": datetime.now().strftime("%Y-%m-%d %H:%M")
-        }
-        self.viajeros.append(viajero)
-        self.contador += 1
-        return viajero
-    
-    def listar(self) -> List[Dict]:
-        return self.viajeros
-    
-    def limpiar(self):
-        self.viajeros = []
-        self.contador = 1
-    
-    def contar_por_tipo(self) -> Dict[str, int]:
-        conteo = {"adulto": 0, "niño": 0, "bebé": 0}
-        for v in self.viajeros:
-            conteo[v["tipo"]] = conteo.get(v["tipo"], 0) + 1
-        return conteo
-
-# Instancia global
-viajeros_db = ViajerosDB()
-
 # ============================================================================
 # HERRAMIENTA 1: GESTIÓN DE VIAJEROS
 # ============================================================================
@@ -83,14 +64,7 @@ def gestionar_viajeros(
         if not nombre or edad is None:
             return "❌ Necesito nombre y edad del viajero"
         
-        # Clasificar por edad
-        if edad >= 18:
-            tipo = "adulto"
-        elif edad >= 2:
-            tipo = "niño"
-        else:
-            tipo = "bebé"
-        
+        tipo = tipo_por_edad(edad)
         viajero = viajeros_db.agregar(nombre, edad, tipo)
         return f"✅ Viajero agregado: {nombre} ({edad} años) - Categoría: {tipo}"
     
@@ -120,71 +94,46 @@ def gestionar_viajeros(
 # ============================================================================
 
 def obtener_codigo_iata(ciudad: str) -> Optional[str]:
-    """Obtiene el código IATA de una ciudad"""
-    codigos_comunes = {
-        # Sudamérica
-        "lima": "LIM", "cusco": "CUZ", "cuzco": "CUZ", "arequipa": "AQP",
-        "buenos aires": "BUE", "santiago": "SCL", 
-        "bogota": "BOG", "bogotá": "BOG",  # Con y sin acento
-        "medellin": "MDE", "medellín": "MDE",
-        "cartagena": "CTG", 
-        "quito": "UIO", 
-        "guayaquil": "GYE", 
-        "rio de janeiro": "GIG", "río de janeiro": "GIG",
-        "sao paulo": "GRU", "são paulo": "GRU",
-        "brasilia": "BSB", "brasília": "BSB",
-        "montevideo": "MVD", 
-        "asuncion": "ASU", "asunción": "ASU",
-        "la paz": "LPB", "caracas": "CCS",
-        
-        # Norteamérica
-        "new york": "NYC", "nueva york": "NYC", "miami": "MIA",
-        "los angeles": "LAX", "chicago": "CHI", "houston": "HOU",
-        "san francisco": "SFO", "washington": "WAS", "boston": "BOS",
-        "las vegas": "LAS", "orlando": "MCO", "seattle": "SEA",
-        "mexico": "MEX", "cancun": "CUN", "guadalajara": "GDL",
-        "toronto": "YYZ", "vancouver": "YVR", "montreal": "YUL",
-        
-        # Europa
-        "madrid": "MAD", "barcelona": "BCN", "sevilla": "SVQ",
-        "paris": "PAR", "parís": "PAR",
-        "londres": "LON", "london": "LON",
-        "roma": "ROM", 
-        "milan": "MIL", "milán": "MIL",
-        "berlin": "BER", "berlín": "BER",
-        "amsterdam": "AMS", "ámsterdam": "AMS",
-        "bruselas": "BRU", 
-        "viena": "VIE", 
-        "praga": "PRG", 
-        "lisboa": "LIS", 
-        "dublin": "DUB", "dublín": "DUB",
-        "atenas": "ATH", 
-        "estambul": "IST", "istanbul": "IST",
-        "moscu": "MOW", "moscú": "MOW",
-        "zurich": "ZRH", "zúrich": "ZRH",
-        
-        # Asia
-        "tokyo": "TYO", "tokio": "TYO", "toquio": "TYO",
-        "bangkok": "BKK", 
-        "singapur": "SIN", "singapore": "SIN",
-        "hong kong": "HKG", 
-        "dubai": "DXB", "dubái": "DXB",
-        "delhi": "DEL", 
-        "mumbai": "BOM", "bombay": "BOM",
-        "shanghai": "SHA", "shanghái": "SHA",
-        "beijing": "BJS", "pekín": "BJS", "pekin": "BJS",
-        "seul": "SEL", "seoul": "SEL",
-        "taipei": "TPE", 
-        "manila": "MNL",
-        
-        # Oceanía
-        "sydney": "SYD", "melbourne": "MEL", "auckland": "AKL",
-    }
-    return codigos_comunes.get(ciudad.lower())
+    """Obtiene el código IATA de una ciudad (tabla "codigos_iata" de datos/tablas.json)"""
+    return tablas_config["codigos_iata"].get(ciudad.lower())
+
+# Token OAuth de Amadeus reutilizado entre búsquedas (dura ~30 minutos)
+_token_amadeus: Dict[str, Any] = {"valor": None, "expira": 0.0}
+_token_amadeus_lock = threading.Lock()
+
+def obtener_token_amadeus(amadeus_key: str, amadeus_secret: str,
+                          prioridad: int = PRIORIDAD_INTERACTIVA) -> Optional[str]:
+    """Devuelve un token de acceso válido, pidiéndolo solo si caducó"""
+    with _token_amadeus_lock:
+        if _token_amadeus["valor"] and time.time() < _token_amadeus["expira"]:
+            return _token_amadeus["valor"]
+        
+        auth_url = "https://test.api.amadeus.com/v1/security/oauth2/token"
+        auth_data = {
+            "grant_type": "client_credentials",
+            "client_id": amadeus_key,
+            "client_secret": amadeus_secret
+        }
+        
+        auth_response = planificador_amadeus.ejecutar(
+            lambda: upstream_amadeus.llamar(
+                lambda: requests.post(auth_url, data=auth_data, timeout=plazos.timeout(10))),
+            prioridad=prioridad, disponible=upstream_amadeus.disponible
+        )
+        if auth_response is None or auth_response.status_code != 200:
+            return None
+        
+        datos = auth_response.json()
+        # Margen de un minuto para no usar un token a punto de caducar
+        _token_amadeus["valor"] = datos["access_token"]
+        _token_amadeus["expira"] = time.time() + int(datos.get("expires_in", 1799)) - 60
+        return _token_amadeus["valor"]
 
 def buscar_vuelos_amadeus(origen_iata: str, destino_iata: str, fecha_ida: str, 
-                          fecha_vuelta: Optional[str], num_adultos: int) -> Optional[Dict]:
-    """Busca vuelos usando Amadeus API"""
+                          fecha_vuelta: Optional[str], num_adultos: int,
+                          prioridad: int = PRIORIDAD_INTERACTIVA,
+                          max_ofertas: int = MAX_OFERTAS) -> Optional[List[OfertaVuelo]]:
+    """Busca vuelos usando Amadeus API y devuelve solo las ofertas que se muestran"""
     try:
         # Obtener credenciales
         amadeus_key = os.getenv("AMADEUS_API_KEY")
@@ -194,21 +143,14 @@ def buscar_vuelos_amadeus(origen_iata: str, destino_iata: str, fecha_ida: str,
             # print("Amadeus API no configurada")
             return None
         
-        # 1. Obtener token de acceso
-        auth_url = "https://test.api.amadeus.com/v1/security/oauth2/token"
-        auth_data = {
-            "grant_type": "client_credentials",
-            "client_id": amadeus_key,
-            "client_secret": amadeus_secret
-        }
-        
-        auth_response = requests.post(auth_url, data=auth_data, timeout=10)
-        if auth_response.status_code != 200:
-            # print(f"Error auth Amadeus: {auth_response.status_code}")
-            # print(f"Respuesta: {auth_response.text}")
+        # Amadeus caído o muy lento, o turno sin tiempo: directamente a los datos simulados
+        if not upstream_amadeus.disponible() or plazos.casi_agotado():
             return None
         
-        token = auth_response.json()["access_token"]
+        # 1. Obtener token de acceso (cacheado)
+        token = obtener_token_amadeus(amadeus_key, amadeus_secret, prioridad)
+        if not token:
+            return None
         
         # 2. Buscar vuelos
         search_url = "https://test.api.amadeus.com/v2/shopping/flight-offers"
@@ -219,23 +161,41 @@ def buscar_vuelos_amadeus(origen_iata: str, destino_iata: str, fecha_ida: str,
             "destinationLocationCode": destino_iata,
             "departureDate": fecha_ida,
             "adults": num_adultos,
-            "max": 5
+            "currencyCode": MONEDA,
+            "max": max_ofertas
         }
         
         if fecha_vuelta:
             params["returnDate"] = fecha_vuelta
         
+        resultado: Dict[str, Any] = {}
+        
+        def pedir_ofertas() -> requests.Response:
+            # El cuerpo se lee dentro de la llamada: el interruptor cronometra también
+            # la descarga y un corte a mitad cuenta como fallo. Con stream=True la
+            # conexión solo vuelve al pool al cerrar la respuesta (también 401, 429, 5xx)
+            respuesta = requests.get(search_url, headers=headers, params=params,
+                                     timeout=plazos.timeout(15), stream=True)
+            with respuesta:
+                if respuesta.status_code == 200:
+                    resultado["ofertas"] = parsear_respuesta(respuesta, max_ofertas, en_streaming=True)
+            return respuesta
+        
         # print(f"Buscando vuelos: {origen_iata}->{destino_iata}, {fecha_ida}, {num_adultos} adultos")
-        search_response = requests.get(search_url, headers=headers, params=params, timeout=15)
+        search_response = planificador_amadeus.ejecutar(
+            lambda: upstream_amadeus.llamar(pedir_ofertas),
+            prioridad=prioridad, disponible=upstream_amadeus.disponible
+        )
         
+        if search_response is None:
+            return None
         if search_response.status_code == 200:
-            data = search_response.json()
-            # print(f"Encontrados {len(data.get('data', []))} vuelos")
-            return data
-        else:
-            # print(f"Error busqueda Amadeus: {search_response.status_code}")
-            # print(f"Respuesta: {search_response.text}")
-            pass
+            # print(f"Encontrados {len(resultado['ofertas'])} vuelos")
+            return resultado.get("ofertas") or None
+        if search_response.status_code == 401:
+            # Token revocado o caducado antes de tiempo
+            with _token_amadeus_lock:
+                _token_amadeus["valor"] = None
         
         return None
         
@@ -252,18 +212,34 @@ class VueloInput(BaseModel):
     fecha_ida: str = Field(description="Fecha de ida (YYYY-MM-DD)")
     fecha_vuelta: Optional[str] = Field(default=None, description="Fecha de vuelta (YYYY-MM-DD)")
 
+def amadeus_configurado() -> bool:
+    return bool(os.getenv("AMADEUS_API_KEY") and os.getenv("AMADEUS_API_SECRET"))
+
 @tool("buscar_vuelos", args_schema=VueloInput)
 def buscar_vuelos(
     origen: str,
     destino: str,
     fecha_ida: str,
-    fecha_vuelta: Optional[str] = None
+    fecha_vuelta: Optional[str] = None,
+    config: RunnableConfig = None
 ) -> str:
     """
     Busca vuelos disponibles entre dos ciudades usando Amadeus API.
     Si la API no está disponible, usa datos simulados realistas.
     Retorna opciones con precios reales o aproximados por persona.
     """
+    # Con "vuelos_progresivos" en la config del turno, la búsqueda real sigue en segundo plano
+    configurable = (config or {}).get("configurable", {})
+    hilo = configurable.get("thread_id") if configurable.get("vuelos_progresivos") else None
+    return consultar_vuelos(origen, destino, fecha_ida, fecha_vuelta, hilo_progresivo=hilo)
+
+def consultar_vuelos(origen: str, destino: str, fecha_ida: str, fecha_vuelta: Optional[str] = None,
+                     hilo_progresivo: Optional[str] = None, registrar: bool = True) -> str:
+    """
+    Texto de buscar_vuelos. Con `hilo_progresivo`, si el precio no está en
+    caché, responde con precios orientativos y deja la búsqueda real en
+    curso para ese hilo (vuelos_progresivos)
+    """
     try:
         # Validar que las fechas sean futuras
         from datetime import datetime, timedelta
@@ -285,20 +261,40 @@ def buscar_vuelos(
         if not origen_iata or not destino_iata:
             return f"❌ No se encontró código IATA para {origen if not origen_iata else destino}. Ciudades disponibles: Lima, Madrid, Barcelona, París, Londres, New York, Miami, Cancún, etc."
         
+        if registrar:
+            rastreador_popularidad.registrar(origen, destino, fecha_ida_obj.month)
+        
         # Obtener información de viajeros
-        conteo = viajeros_db.contar_por_tipo()
-        num_adultos = max(conteo.get("adulto", 0), 1)
-        num_ninos = conteo.get("niño", 0)
-        num_bebes = conteo.get("bebé", 0)
-        num_viajeros = len(viajeros_db.viajeros) or 1
+        # Un grupo sin adultos se cotiza con uno (igual que se busca y se enlaza)
+        mezcla = mezcla_vuelo(viajeros_db.contar_por_tipo())
+        num_adultos, num_ninos, num_bebes = mezcla
+        num_viajeros = mezcla.total
         
-        # Intentar usar Amadeus API
-        datos_amadeus = buscar_vuelos_amadeus(origen_iata, destino_iata, fecha_ida, 
+        # Intentar usar Amadeus API (a través de la caché de precios)
+        clave_cache = (origen_iata, destino_iata, fecha_ida, fecha_vuelta, num_adultos)
+        cargar = lambda: buscar_vuelos_amadeus(origen_iata, destino_iata, fecha_ida,
                                                fecha_vuelta, num_adultos)
+        busqueda = None
+        cacheado, edad_cache = cache_precios.consultar(clave_cache)
+        if (hilo_progresivo and (cacheado is None or edad_cache >= cache_precios.max_obsoleto)
+                and amadeus_configurado() and upstream_amadeus.disponible()):
+            # Respuesta inmediata con precios orientativos; los reales llegan después
+            def buscar_en_fondo() -> Optional[str]:
+                ofertas, _ = cache_precios.obtener(clave_cache, cargar)
+                return consultar_vuelos(origen, destino, fecha_ida, fecha_vuelta, registrar=False) if ofertas else None
+            busqueda = busquedas_vuelos.iniciar(hilo_progresivo, clave_cache,
+                                                f"{origen} → {destino} ({fecha_ida})", buscar_en_fondo)
+            ofertas_amadeus, edad_cache = None, None
+        else:
+            ofertas_amadeus, edad_cache = cache_precios.obtener(
+                clave_cache, cargar,
+                cargar_fondo=lambda: buscar_vuelos_amadeus(origen_iata, destino_iata, fecha_ida,
+                                                           fecha_vuelta, num_adultos, PRIORIDAD_LOTE)
+            )
         
         tipo_viaje = "ida y vuelta" if fecha_vuelta else "solo ida"
         
-        if datos_amadeus and "data" in datos_amadeus and len(datos_amadeus["data"]) > 0:
+        if ofertas_amadeus:
             # USAR DATOS REALES DE AMADEUS
             resultado = f"✈️ VUELOS REALES - {tipo_viaje.upper()}\n"
             resultado += f"📍 {origen} ({origen_iata}) → {destino} ({destino_iata})\n"
@@ -308,47 +304,34 @@ def buscar_vuelos(
             resultado += f"\n👥 Viajeros: {num_viajeros} persona(s)\n"
             resultado += f"   ({num_adultos} adulto(s), {num_ninos} niño(s), {num_bebes} bebé(s))\n\n"
             
-            vuelos = datos_amadeus["data"][:3]  # Top 3 opciones
+            # Calcular para todo el grupo (todas las ofertas a la vez)
+            ofertas = ofertas_amadeus[:MAX_OFERTAS]
+            tarifas = precios_grupo([oferta.precio for oferta in ofertas], [mezcla])
             
-            for i, vuelo in enumerate(vuelos):
-                precio_base = float(vuelo["price"]["total"])
-                moneda = vuelo["price"]["currency"]
-                
-                # Calcular para todo el grupo
-                precio_ninos = precio_base * 0.75 * num_ninos
-                precio_bebes = precio_base * 0.15 * num_bebes
-                total_grupo = (precio_base * num_adultos) + precio_ninos + precio_bebes
+            for i, oferta in enumerate(ofertas):
+                moneda = oferta.moneda
                 
-                # Información del vuelo
-                segmentos = vuelo["itineraries"][0]["segments"]
-                primer_segmento = segmentos[0]
-                ultimo_segmento = segmentos[-1]
-                
-                aerolinea_code = primer_segmento["carrierCode"]
-                duracion = vuelo["itineraries"][0]["duration"]
-                escalas = len(segmentos) - 1
-                
-                hora_salida = primer_segmento["departure"]["at"].split("T")[1][:5]
-                hora_llegada = ultimo_segmento["arrival"]["at"].split("T")[1][:5]
-                
-                resultado += f"🛫 Opción {i+1}: {aerolinea_code}\n"
-                resultado += f"   ⏰ Salida: {hora_salida} | Llegada: {hora_llegada}\n"
-                resultado += f"   🔄 Escalas: {escalas} | Duración: {duracion[2:]}\n"
-                resultado += f"   💰 Precio por adulto: {precio_base:.2f} {moneda}\n"
+                resultado += f"🛫 Opción {i+1}: {oferta.aerolinea}\n"
+                resultado += f"   ⏰ Salida: {oferta.salida} | Llegada: {oferta.llegada}\n"
+                resultado += f"   🔄 Escalas: {oferta.escalas} | Duración: {oferta.duracion}\n"
+                resultado += f"   💰 Precio por adulto: {formatear_importe(tarifas.adulto[i], moneda)}\n"
                 if num_ninos > 0:
-                    resultado += f"   👶 Niños ({num_ninos}): {precio_ninos:.2f} {moneda}\n"
+                    resultado += f"   👶 Niños ({num_ninos}): {formatear_importe(tarifas.total_ninos[i, 0], moneda)}\n"
                 if num_bebes > 0:
-                    resultado += f"   🍼 Bebés ({num_bebes}): {precio_bebes:.2f} {moneda}\n"
-                resultado += f"   💵 TOTAL GRUPO: {total_grupo:.2f} {moneda}\n\n"
+                    resultado += f"   🍼 Bebés ({num_bebes}): {formatear_importe(tarifas.total_bebes[i, 0], moneda)}\n"
+                resultado += f"   💵 TOTAL GRUPO: {formatear_importe(tarifas.total[i, 0], moneda)}\n\n"
             
-            resultado += "✅ Precios reales obtenidos de Amadeus API\n\n"
+            resultado += "✅ Precios reales obtenidos de Amadeus API\n"
+            if edad_cache is not None:
+                resultado += f"♻️ Precios en caché (actualizados hace {describir_edad(edad_cache)})\n"
+            resultado += "\n"
             
             # Agregar links de compra
             resultado += "🔗 ENLACES PARA COMPRAR:\n"
             resultado += f"🌐 Google Flights: https://www.google.com/flights?hl=es#flt={origen_iata}.{destino_iata}.{fecha_ida}"
             if fecha_vuelta:
                 resultado += f"*{destino_iata}.{origen_iata}.{fecha_vuelta}"
-            resultado += f";c:EUR;e:1;sd:1;t:f\n"
+            resultado += f";c:{MONEDA};e:1;sd:1;t:f\n"
             
             resultado += f"🌐 Skyscanner: https://www.skyscanner.com/transport/flights/{origen_iata}/{destino_iata}/{fecha_ida.replace('-', '')}"
             if fecha_vuelta:
@@ -376,66 +359,33 @@ def buscar_vuelos(
             if fecha_vuelta:
                 resultado += f" | Vuelta: {fecha_vuelta}"
             resultado += f"\n👥 Viajeros: {num_viajeros} persona(s)\n\n"
-            resultado += "⚠️ Usando datos simulados (configura AMADEUS_API_KEY para precios reales)\n\n"
-            
-            # Aerolíneas simuladas
-            aerolineas = [
-                {"nombre": "LATAM Airlines", "codigo": "LA"},
-                {"nombre": "Avianca", "codigo": "AV"},
-                {"nombre": "Copa Airlines", "codigo": "CM"},
-                {"nombre": "Iberia", "codigo": "IB"},
-                {"nombre": "American Airlines", "codigo": "AA"},
-                {"nombre": "Air Europa", "codigo": "UX"}
-            ]
-            
-            # Calcular precio base según distancia estimada (simulado)
-            rutas_populares = {
-                ("LIM", "CUZ"): 150, ("LIM", "MAD"): 800,
-                ("MAD", "BCN"): 120, ("BUE", "GIG"): 350,
-                ("MIA", "LIM"): 600, ("BOG", "CTG"): 180,
-            }
-            
-            # Buscar precio base
-            ruta = (origen_iata, destino_iata)
-            ruta_inversa = (destino_iata, origen_iata)
-            precio_base = rutas_populares.get(ruta) or rutas_populares.get(ruta_inversa) or 500
+            if busqueda is not None:
+                resultado += ("⏳ Precios ORIENTATIVOS: estoy buscando los precios reales en segundo plano "
+                              "y los mostraré en cuanto lleguen\n\n")
+            else:
+                resultado += "⚠️ Usando datos simulados (configura AMADEUS_API_KEY para precios reales)\n\n"
             
-            # Generar opciones de vuelos
-            multiplicador = 2 if fecha_vuelta else 1
+            # Ofertas deterministas por (ruta, fechas, semilla)
+            ofertas = simular_vuelos(origen_iata, destino_iata, fecha_ida, fecha_vuelta)
+            tarifas = precios_grupo([oferta.precio for oferta in ofertas], [mezcla])
             
-            # Generar 3 opciones
-            for i, aerolinea in enumerate(random.sample(aerolineas, min(3, len(aerolineas)))):
-                variacion = random.uniform(0.85, 1.25)
-                precio_adulto = int(precio_base * variacion * multiplicador)
-                precio_nino = int(precio_adulto * 0.75)
-                precio_bebe = int(precio_adulto * 0.15)
-                
-                # Calcular total
-                total = (precio_adulto * num_adultos +
-                        precio_nino * num_ninos +
-                        precio_bebe * num_bebes)
-                
-                if total == 0:  # Si no hay viajeros registrados
-                    total = precio_adulto
-                
-                hora_salida = random.choice(["06:30", "10:15", "14:45", "18:30", "22:00"])
-                duracion = random.choice(["2h 30m", "3h 15m", "5h 45m", "8h 20m"])
-                
-                resultado += f"🛫 Opción {i+1}: {aerolinea['nombre']} ({aerolinea['codigo']})\n"
-                resultado += f"   ⏰ Salida: {hora_salida} | Duración: {duracion}\n"
-                resultado += f"   💰 Precio por adulto: ${precio_adulto} USD\n"
+            for i, oferta in enumerate(ofertas):
+                resultado += f"🛫 Opción {i+1}: {oferta.aerolinea}\n"
+                resultado += f"   ⏰ Salida: {oferta.salida} | Llegada: {oferta.llegada}\n"
+                resultado += f"   🔄 Escalas: {oferta.escalas} | Duración: {oferta.duracion}\n"
+                resultado += f"   💰 Precio por adulto: {formatear_importe(tarifas.adulto[i])}\n"
                 if num_ninos > 0:
-                    resultado += f"   👶 Niños: ${precio_nino} USD/niño\n"
+                    resultado += f"   👶 Niños: {formatear_importe(tarifas.nino[i])}/niño\n"
                 if num_bebes > 0:
-                    resultado += f"   🍼 Bebés: ${precio_bebe} USD/bebé\n"
-                resultado += f"   💵 TOTAL: ${total} USD\n\n"
+                    resultado += f"   🍼 Bebés: {formatear_importe(tarifas.bebe[i])}/bebé\n"
+                resultado += f"   💵 TOTAL: {formatear_importe(tarifas.total[i, 0])}\n\n"
             
             # Agregar links de compra
             resultado += "🔗 ENLACES PARA COMPRAR:\n"
             resultado += f"🌐 Google Flights: https://www.google.com/flights?hl=es#flt={origen_iata}.{destino_iata}.{fecha_ida}"
             if fecha_vuelta:
                 resultado += f"*{destino_iata}.{origen_iata}.{fecha_vuelta}"
-            resultado += f";c:EUR;e:1;sd:1;t:f\n"
+            resultado += f";c:{MONEDA};e:1;sd:1;t:f\n"
             
             resultado += f"🌐 Skyscanner: https://www.skyscanner.com/transport/flights/{origen_iata}/{destino_iata}/{fecha_ida.replace('-', '')}"
             if fecha_vuelta:
@@ -467,6 +417,111 @@ class DestinoInput(BaseModel):
     ciudad: str = Field(description="Ciudad o lugar turístico")
     idioma: str = Field(default="es", description="Idioma del resumen (es, en)")
 
+WIKI_HEADERS = {
+    "User-Agent": "TravelProAI/3.0 (Educational project)",
+    "Accept": "application/json"
+}
+
+def geocodificar(ciudad: str) -> Optional[Dict[str, Any]]:
+    """Primer resultado de Open-Meteo para la ciudad (cacheado)"""
+    clave = ciudad.strip().lower()
+    cacheado = cache_geocodificacion.obtener(clave)
+    if cacheado is not None:
+        return cacheado
+    
+    # Sin tiempo en el turno: el último dato conocido en lugar de esperar a la red
+    if plazos.casi_agotado():
+        return cache_geocodificacion.obtener_caducado(clave)
+    
+    clima_url = f"https://geocoding-api.open-meteo.com/v1/search?name={ciudad}&count=1&language=es"
+    espera = plazos.timeout(10)
+    try:
+        geo_response = upstream_open_meteo.llamar(lambda: requests.get(clima_url, timeout=espera))
+    except (CircuitoAbierto, requests.RequestException):
+        # Servicio caído: el último dato conocido, aunque haya caducado
+        return cache_geocodificacion.obtener_caducado(clave)
+    if geo_response.status_code != 200:
+        return None
+    
+    geo_data = geo_response.json()
+    if not geo_data.get('results'):
+        return None
+    
+    resultado_geo = geo_data['results'][0]
+    cache_geocodificacion.guardar(clave, resultado_geo)
+    return resultado_geo
+
+def resumen_wikipedia(ciudad: str, idioma: str = "es") -> Optional[Tuple[str, str]]:
+    """(título, resumen) de Wikipedia para la ciudad (cacheado)"""
+    from urllib.parse import quote
+    
+    clave = (ciudad.strip().lower(), idioma)
+    cacheado = cache_wikipedia.obtener(clave)
+    if cacheado is not None:
+        return cacheado
+    
+    # Codificar la ciudad para URL (maneja acentos y espacios)
+    ciudad_encoded = quote(ciudad)
+    wiki_url = f"https://{idioma}.wikipedia.org/api/rest_v1/page/summary/{ciudad_encoded}"
+    
+    # Sin tiempo en el turno: el último resumen conocido en lugar de esperar a la red
+    if plazos.casi_agotado():
+        return cache_wikipedia.obtener_caducado(clave)
+    
+    def pedir(url: str, **kwargs) -> requests.Response:
+        espera = plazos.timeout(10)
+        return upstream_wikipedia.llamar(lambda: requests.get(url, headers=WIKI_HEADERS, timeout=espera, **kwargs))
+    
+    try:
+        wiki_response = pedir(wiki_url)
+    except (CircuitoAbierto, requests.RequestException):
+        # Servicio caído: el último resumen conocido, aunque haya caducado
+        return cache_wikipedia.obtener_caducado(clave)
+    if wiki_response.status_code != 200:
+        return None
+    
+    wiki_data = wiki_response.json()
+    titulo = wiki_data.get('title', ciudad)
+    descripcion = wiki_data.get('extract', '')
+    
+    # Verificar que sea un destino turístico (no un personaje o concepto)
+    # Si la descripción es muy corta o menciona mitología, buscar con "ciudad de X"
+    if (len(descripcion) < 100 or 'mitolog' in descripcion.lower()) and not plazos.casi_agotado():
+        # Intentar con "ciudad de X" o usando búsqueda
+        search_url = f"https://{idioma}.wikipedia.org/w/api.php"
+        search_params = {
+            "action": "query",
+            "format": "json",
+            "list": "search",
+            "srsearch": f"{ciudad} ciudad",
+            "srlimit": 1
+        }
+        try:
+            search_resp = pedir(search_url, params=search_params)
+            if search_resp.status_code == 200:
+                search_data = search_resp.json()
+                if search_data.get('query', {}).get('search'):
+                    titulo_real = search_data['query']['search'][0]['title']
+                    # Volver a buscar con el título correcto
+                    wiki_url_real = f"https://{idioma}.wikipedia.org/api/rest_v1/page/summary/{quote(titulo_real)}"
+                    wiki_resp_real = pedir(wiki_url_real)
+                    if wiki_resp_real.status_code == 200:
+                        wiki_data = wiki_resp_real.json()
+                        titulo = wiki_data.get('title', ciudad)
+                        descripcion = wiki_data.get('extract', '')
+        except (CircuitoAbierto, requests.RequestException):
+            pass  # Nos quedamos con el primer resumen
+    
+    # Limitar descripción para ahorrar tokens pero mantener info útil (500 caracteres)
+    if len(descripcion) > 500:
+        descripcion = descripcion[:500] + "..."
+    
+    if not descripcion:
+        return None
+    
+    cache_wikipedia.guardar(clave, (titulo, descripcion))
+    return titulo, descripcion
+
 @tool("info_destino", args_schema=DestinoInput)
 def info_destino(ciudad: str, idioma: str = "es") -> str:
     """
@@ -474,79 +529,45 @@ def info_destino(ciudad: str, idioma: str = "es") -> str:
     Incluye descripción, atracciones principales y datos relevantes.
     """
     try:
-        from urllib.parse import quote
-        resultado = ""
+        rastreador_popularidad.registrar(None, ciudad)
         
-        # 1. Obtener descripción de Wikipedia (PRIORITARIO)
-        # Codificar la ciudad para URL (maneja acentos y espacios)
-        ciudad_encoded = quote(ciudad)
-        wiki_url = f"https://{idioma}.wikipedia.org/api/rest_v1/page/summary/{ciudad_encoded}"
+        # 0. Paquete offline: respuesta instantánea para las ciudades conocidas
+        local = paquete_destinos.buscar(ciudad, idioma)
+        if local:
+            resultado = f"📍 {local['titulo']}\n\n"
+            resultado += f"ℹ️ {local['resumen']}\n\n"
+            resultado += f"📊 DATOS CLAVE:\n"
+            resultado += f"🌍 País: {local['pais'] or ''}\n"
+            if local['poblacion']:
+                resultado += f"👥 Población: {local['poblacion']:,}\n"
+            if local['clima']:
+                resultado += f"🌡️ Clima general: {local['clima']}\n"
+            return resultado
         
-        headers = {
-            "User-Agent": "TravelProAI/3.0 (Educational project)",
-            "Accept": "application/json"
-        }
+        resultado = ""
         
-        wiki_response = requests.get(wiki_url, headers=headers, timeout=10)
+        # 1. Obtener descripción de Wikipedia (PRIORITARIO)
+        wiki = resumen_wikipedia(ciudad, idioma)
+        if wiki:
+            titulo, descripcion = wiki
+            resultado += f"📍 {titulo}\n\n"
+            resultado += f"ℹ️ {descripcion}\n\n"
         
-        if wiki_response.status_code == 200:
-            wiki_data = wiki_response.json()
-            titulo = wiki_data.get('title', ciudad)
-            descripcion = wiki_data.get('extract', '')
-            
-            # Verificar que sea un destino turístico (no un personaje o concepto)
-            # Si la descripción es muy corta o menciona mitología, buscar con "ciudad de X"
-            if len(descripcion) < 100 or 'mitolog' in descripcion.lower():
-                # Intentar con "ciudad de X" o usando búsqueda
-                search_url = f"https://{idioma}.wikipedia.org/w/api.php"
-                search_params = {
-                    "action": "query",
-                    "format": "json",
-                    "list": "search",
-                    "srsearch": f"{ciudad} ciudad",
-                    "srlimit": 1
-                }
-                search_resp = requests.get(search_url, headers=headers, params=search_params, timeout=10)
-                if search_resp.status_code == 200:
-                    search_data = search_resp.json()
-                    if search_data.get('query', {}).get('search'):
-                        titulo_real = search_data['query']['search'][0]['title']
-                        # Volver a buscar con el título correcto
-                        wiki_url_real = f"https://{idioma}.wikipedia.org/api/rest_v1/page/summary/{quote(titulo_real)}"
-                        wiki_resp_real = requests.get(wiki_url_real, headers=headers, timeout=10)
-                        if wiki_resp_real.status_code == 200:
-                            wiki_data = wiki_resp_real.json()
-                            titulo = wiki_data.get('title', ciudad)
-                            descripcion = wiki_data.get('extract', '')
+        # 2. Obtener datos geográficos adicionales
+        resultado_geo = geocodificar(ciudad)
+        if resultado_geo:
+            pais = resultado_geo.get('country', '')
+            poblacion = resultado_geo.get('population', 0)
+            lat = resultado_geo.get('latitude', 0)
             
-            # Limitar descripción para ahorrar tokens pero mantener info útil (500 caracteres)
-            if len(descripcion) > 500:
-                descripcion = descripcion[:500] + "..."
+            # Determinar clima general por latitud
+            clima = banda_climatica(lat)
             
-            if descripcion:
-                resultado += f"📍 {titulo}\n\n"
-                resultado += f"ℹ️ {descripcion}\n\n"
-        
-        # 2. Obtener datos geográficos adicionales
-        clima_url = f"https://geocoding-api.open-meteo.com/v1/search?name={ciudad}&count=1&language=es"
-        geo_response = requests.get(clima_url, timeout=10)
-        
-        if geo_response.status_code == 200:
-            geo_data = geo_response.json()
-            if geo_data.get('results'):
-                resultado_geo = geo_data['results'][0]
-                pais = resultado_geo.get('country', '')
-                poblacion = resultado_geo.get('population', 0)
-                lat = resultado_geo.get('latitude', 0)
-                
-                # Determinar clima general por latitud
-                clima = "tropical" if abs(lat) < 23.5 else "templado" if abs(lat) < 66.5 else "frío"
-                
-                resultado += f"📊 DATOS CLAVE:\n"
-                resultado += f"🌍 País: {pais}\n"
-                if poblacion > 0:
-                    resultado += f"👥 Población: {poblacion:,}\n"
-                resultado += f"🌡️ Clima general: {clima}\n"
+            resultado += f"📊 DATOS CLAVE:\n"
+            resultado += f"🌍 País: {pais}\n"
+            if poblacion > 0:
+                resultado += f"👥 Población: {poblacion:,}\n"
+            resultado += f"🌡️ Clima general: {clima}\n"
         
         if not resultado:
             return f"❌ No se encontró información de {ciudad}. Intenta con el nombre en español o inglés."
@@ -565,6 +586,102 @@ class TemporadaInput(BaseModel):
     destino: str = Field(description="Destino turístico")
     mes: str = Field(description="Mes del viaje (ej: 'Enero', 'Julio')")
 
+# (título, actividades, consejos) por tipo de temporada
+RECOMENDACIONES = {
+    "verano": ("☀️ TEMPORADA: VERANO", [
+        "🏖️ Playas y deportes acuáticos", "🚶 Tours a pie y senderismo",
+        "🍹 Terrazas y actividades al aire libre", "📸 Fotografía paisajística",
+        "🎪 Festivales y eventos culturales",
+    ], "Protector solar, ropa ligera, hidratación"),
+    "invierno": ("❄️ TEMPORADA: INVIERNO", [
+        "🏛️ Museos y sitios históricos", "🍽️ Gastronomía local",
+        "🎭 Teatro y eventos culturales", "🛍️ Compras y mercados locales",
+        "☕ Cafés y experiencias gastronómicas",
+    ], "Ropa abrigada, planificar horarios, reservas previas"),
+    "transicion": ("🌸 TEMPORADA: PRIMAVERA/OTOÑO", [
+        "🌳 Parques y jardines", "🚴 Ciclismo y actividades moderadas",
+        "🎨 Eventos culturales", "📚 Tours históricos y culturales",
+        "🍷 Experiencias gastronómicas",
+    ], "Ropa en capas, clima variable"),
+    "invierno_nieve": ("❄️ TEMPORADA: INVIERNO CON NIEVE", [
+        "⛷️ Esquí y deportes de nieve", "🏛️ Museos y sitios históricos",
+        "🎄 Mercados y fiestas de temporada", "♨️ Spas y baños termales",
+        "🍲 Gastronomía local de invierno",
+    ], "Ropa térmica, calzado impermeable, pocas horas de luz"),
+    "tropical_seca": ("☀️ TEMPORADA SECA (clima tropical)", [
+        "🏖️ Playas, snorkel y buceo", "🥾 Excursiones a la naturaleza",
+        "🚤 Paseos en barco e islas", "🌅 Atardeceres y vida nocturna",
+        "🍹 Mercados y gastronomía callejera",
+    ], "Protector solar alto, ropa ligera, reservar con antelación (temporada alta)"),
+    "tropical_lluvias": ("🌧️ TEMPORADA DE LLUVIAS (clima tropical)", [
+        "🏛️ Museos y centros culturales", "🍳 Clases de cocina local",
+        "💆 Spas y bienestar", "🌿 Selva y cascadas en su mejor momento",
+        "🛍️ Mercados cubiertos y compras",
+    ], "Impermeable, repelente de insectos, planes flexibles; precios más bajos"),
+    "arido_calor": ("🔥 TEMPORADA DE CALOR (clima árido)", [
+        "🌄 Excursiones al amanecer", "🏊 Piscinas y playas por la tarde",
+        "🏛️ Museos y centros comerciales en las horas centrales",
+        "🌌 Observación de estrellas", "🍽️ Cenas al aire libre",
+    ], "Evitar el sol del mediodía, mucha agua, sombrero y gafas de sol"),
+    "arido_templado": ("🌵 TEMPORADA AGRADABLE (clima árido)", [
+        "🐪 Excursiones por el desierto", "🥾 Senderismo y miradores",
+        "🌌 Observación de estrellas", "📸 Fotografía de paisajes",
+        "🏛️ Sitios arqueológicos",
+    ], "Noches frías: llevar abrigo; protector solar durante el día"),
+    "polar": ("🧊 CLIMA FRÍO EXTREMO", [
+        "🐧 Avistamiento de fauna", "🚢 Cruceros y navegación",
+        "🌌 Auroras (en invierno)", "🥾 Trekking guiado",
+        "🏛️ Museos de historia local",
+    ], "Ropa técnica por capas, guantes y gorro todo el año"),
+    "altura_seca": ("⛰️ TEMPORADA SECA (clima de altura)", [
+        "🥾 Trekking y caminatas de varios días", "🏔️ Miradores y cielos despejados",
+        "🏛️ Sitios arqueológicos", "🎉 Fiestas tradicionales", "🌌 Observación de estrellas",
+    ], "Días soleados y noches heladas: ropa por capas, protector solar; aclimatarse a la altura"),
+    "altura_lluvias": ("🌧️ TEMPORADA DE LLUVIAS (clima de altura)", [
+        "🏛️ Museos y centros históricos", "🛍️ Mercados y artesanía",
+        "🍲 Gastronomía andina y de montaña", "🌿 Valles verdes (excursiones por la mañana)",
+        "♨️ Aguas termales",
+    ], "Chaqueta impermeable y capas de abrigo; lluvia casi todas las tardes, algunos senderos pueden cerrar"),
+    "altura": ("⛰️ CLIMA DE ALTURA", [
+        "🚶 Tours a pie por el centro histórico", "🏔️ Miradores y excursiones de un día",
+        "🏛️ Museos y sitios históricos", "🛍️ Mercados y artesanía",
+        "☕ Cafés y gastronomía local",
+    ], "Templado de día y frío de noche todo el año: ropa por capas; aclimatarse a la altura"),
+    "monzon_lluvias": ("🌧️ TEMPORADA DE LLUVIAS (verano húmedo)", [
+        "🏛️ Museos y centros culturales", "🛍️ Centros comerciales y mercados cubiertos",
+        "🍜 Gastronomía local", "💆 Spas y bienestar", "🌿 Parques y jardines entre chaparrones",
+    ], "Calor húmedo y tormentas: impermeable, ropa ligera que seque rápido, planes flexibles"),
+    "invierno_seco": ("🌤️ TEMPORADA SECA (invierno)", [
+        "🚶 Tours a pie y visitas a monumentos", "🥾 Excursiones con cielos despejados",
+        "🏛️ Museos y sitios históricos", "🍲 Gastronomía local de temporada",
+        "🛍️ Mercados y compras",
+    ], "Días secos y soleados, noches frías: abrigo y crema hidratante"),
+}
+
+def tipo_temporada(lugar: Optional[Lugar], mes: Optional[int]) -> str:
+    """Elige el bloque de RECOMENDACIONES según zona climática, hemisferio y mes"""
+    if lugar is None or mes is None:
+        return "transicion"
+    grupo = lugar.grupo_climatico
+    temporada = estacion(lugar, mes)
+    if lugar.de_altura:
+        if not lugar.invierno_seco:
+            return "altura"
+        return "altura_lluvias" if es_temporada_lluvias(lugar, mes) else "altura_seca"
+    if grupo == "A":
+        return "tropical_lluvias" if es_temporada_lluvias(lugar, mes) else "tropical_seca"
+    if grupo == "B":
+        return "arido_calor" if temporada == "verano" else "arido_templado"
+    if grupo == "E":
+        return "polar"
+    if lugar.invierno_seco:
+        if es_temporada_lluvias(lugar, mes):
+            return "monzon_lluvias"
+        return "invierno_seco" if temporada == "invierno" else temporada
+    if grupo == "D" and temporada == "invierno":
+        return "invierno_nieve"
+    return temporada
+
 @tool("recomendaciones_temporada", args_schema=TemporadaInput)
 def recomendaciones_temporada(destino: str, mes: str) -> str:
     """
@@ -572,62 +689,36 @@ def recomendaciones_temporada(destino: str, mes: str) -> str:
     Considera el clima y eventos típicos del destino.
     """
     try:
-        meses_verano_norte = ["junio", "julio", "agosto"]
-        meses_invierno_norte = ["diciembre", "enero", "febrero"]
-        
-        mes_lower = mes.lower()
-        
-        # Consultar clima actual
-        clima_url = f"https://geocoding-api.open-meteo.com/v1/search?name={destino}&count=1&language=es"
-        geo_response = requests.get(clima_url, timeout=10)
-        
-        hemisferio = "norte"  # Por defecto
-        if geo_response.status_code == 200:
-            geo_data = geo_response.json()
-            if geo_data.get('results'):
-                lat = geo_data['results'][0].get('latitude', 0)
-                hemisferio = "sur" if lat < 0 else "norte"
-        
-        # Determinar temporada
-        if hemisferio == "norte":
-            es_verano = mes_lower in meses_verano_norte
-            es_invierno = mes_lower in meses_invierno_norte
-        else:
-            es_verano = mes_lower in meses_invierno_norte
-            es_invierno = mes_lower in meses_verano_norte
+        mes_num = numero_mes(mes)
+        rastreador_popularidad.registrar(None, destino, mes_num)
+        
+        # Índice local (sin red); solo se geocodifica si el lugar es desconocido
+        lugar = ubicar(destino, obtener_codigo_iata(destino))
+        if lugar is None:
+            resultado_geo = geocodificar(destino)
+            if resultado_geo:
+                lugar = Lugar(destino, resultado_geo.get('latitude', 0),
+                              resultado_geo.get('longitude', 0), resultado_geo.get('country', ''), None,
+                              resultado_geo.get('elevation'))
+        
+        hemisferio = lugar.hemisferio if lugar else "norte"  # Por defecto
+        tipo = tipo_temporada(lugar, mes_num)
+        titulo, actividades, consejos = RECOMENDACIONES[tipo]
         
         resultado = f"🗓️ Recomendaciones para {destino} en {mes.capitalize()}\n"
-        resultado += f"🌐 Hemisferio: {hemisferio.capitalize()}\n\n"
-        
-        if es_verano:
-            resultado += "☀️ TEMPORADA: VERANO\n"
-            resultado += "Actividades recomendadas:\n"
-            resultado += "🏖️ Playas y deportes acuáticos\n"
-            resultado += "🚶 Tours a pie y senderismo\n"
-            resultado += "🍹 Terrazas y actividades al aire libre\n"
-            resultado += "📸 Fotografía paisajística\n"
-            resultado += "🎪 Festivales y eventos culturales\n"
-            resultado += "\n💡 Consejos: Protector solar, ropa ligera, hidratación"
-        
-        elif es_invierno:
-            resultado += "❄️ TEMPORADA: INVIERNO\n"
-            resultado += "Actividades recomendadas:\n"
-            resultado += "🏛️ Museos y sitios históricos\n"
-            resultado += "🍽️ Gastronomía local\n"
-            resultado += "🎭 Teatro y eventos culturales\n"
-            resultado += "🛍️ Compras y mercados locales\n"
-            resultado += "☕ Cafés y experiencias gastronómicas\n"
-            resultado += "\n💡 Consejos: Ropa abrigada, planificar horarios, reservas previas"
+        resultado += f"🌐 Hemisferio: {hemisferio.capitalize()}\n"
+        if lugar and lugar.koppen:
+            resultado += f"🌡️ Clima: {lugar.descripcion_clima} (Köppen {lugar.koppen})\n"
+        resultado += "\n"
         
-        else:
-            resultado += "🌸 TEMPORADA: PRIMAVERA/OTOÑO\n"
-            resultado += "Actividades recomendadas:\n"
-            resultado += "🌳 Parques y jardines\n"
-            resultado += "🚴 Ciclismo y actividades moderadas\n"
-            resultado += "🎨 Eventos culturales\n"
-            resultado += "📚 Tours históricos y culturales\n"
-            resultado += "🍷 Experiencias gastronómicas\n"
-            resultado += "\n💡 Consejos: Ropa en capas, clima variable"
+        resultado += f"{titulo}\n"
+        resultado += "Actividades recomendadas:\n"
+        for actividad in actividades:
+            resultado += f"{actividad}\n"
+        # Los climas mediterráneos ('s') no tienen bloque propio de lluvias
+        if tipo in ("invierno", "invierno_nieve", "transicion") and lugar and mes_num and es_temporada_lluvias(lugar, mes_num):
+            resultado += "🌧️ Nota: coincide con la época de lluvias, ten un plan B bajo techo\n"
+        resultado += f"\n💡 Consejos: {consejos}"
         
         return resultado
     
@@ -651,66 +742,8 @@ def generar_itinerario(destino: str, dias: int, presupuesto: str = "medio") -> s
     Adaptado al presupuesto especificado.
     """
     try:
-        actividades_por_presupuesto = {
-            "bajo": {
-                "actividades": ["Tours gratuitos", "Mercados locales", "Parques públicos", "Museos gratis", "Caminatas"],
-                "comida_dia": 25,
-                "actividad_dia": 15,
-                "transporte_dia": 10
-            },
-            "medio": {
-                "actividades": ["Tours guiados", "Museos", "Restaurantes locales", "Actividades culturales", "Compras"],
-                "comida_dia": 50,
-                "actividad_dia": 40,
-                "transporte_dia": 20
-            },
-            "alto": {
-                "actividades": ["Tours premium", "Experiencias exclusivas", "Fine dining", "Spa", "Tours privados"],
-                "comida_dia": 120,
-                "actividad_dia": 100,
-                "transporte_dia": 40
-            }
-        }
-        
-        config = actividades_por_presupuesto.get(presupuesto.lower(), actividades_por_presupuesto["medio"])
-        
-        resultado = f"📅 ITINERARIO DE {dias} DÍAS EN {destino.upper()}\n"
-        resultado += f"💰 Presupuesto: {presupuesto.capitalize()}\n"
-        resultado += f"👥 Viajeros: {len(viajeros_db.viajeros) or 1}\n\n"
-        
-        total_gasto = 0
-        
-        for dia in range(1, dias + 1):
-            resultado += f"📆 DÍA {dia}:\n"
-            
-            if dia == 1:
-                resultado += "   🛬 Llegada y check-in\n"
-                actividad1 = random.choice(["Paseo por el centro histórico", "Tour de orientación", "Cena de bienvenida"])
-                resultado += f"   🏃 {actividad1}\n"
-            elif dia == dias:
-                resultado += "   🧳 Check-out\n"
-                actividad1 = random.choice(["Últimas compras", "Paseo de despedida", "Visita rápida"])
-                resultado += f"   🏃 {actividad1}\n"
-                resultado += "   🛫 Regreso\n"
-            else:
-                actividad1 = random.choice(config["actividades"])
-                actividad2 = random.choice(config["actividades"])
-                resultado += f"   ☀️ Mañana: {actividad1}\n"
-                resultado += f"   🌆 Tarde: {actividad2}\n"
-            
-            gasto_dia = config["comida_dia"] + config["actividad_dia"] + config["transporte_dia"]
-            total_gasto += gasto_dia
-            resultado += f"   💵 Gasto estimado: ${gasto_dia} USD/persona\n\n"
-        
-        num_personas = len(viajeros_db.viajeros) or 1
-        total_viaje = total_gasto * num_personas
-        
-        resultado += f"💰 RESUMEN FINANCIERO:\n"
-        resultado += f"   Por persona: ${total_gasto} USD\n"
-        resultado += f"   Total grupo ({num_personas} persona(s)): ${total_viaje} USD\n"
-        resultado += f"\n📝 Nota: Precios aproximados, no incluyen vuelos ni alojamiento\n"
-        
-        return resultado
+        plan = planificar_itinerario(destino, dias, presupuesto, len(viajeros_db.viajeros) or 1)
+        return formatear_itinerario(plan)
     
     except Exception as e:
         return f"❌ Error al generar itinerario: {str(e)}"
@@ -732,53 +765,14 @@ def calcular_presupuesto(dias: int, destino: str, nivel: str = "medio") -> str:
     Incluye: vuelos, alojamiento, comida, actividades, transporte.
     """
     try:
-        # Costos por nivel y por día
-        costos = {
-            "economico": {
-                "vuelo": 400,
-                "hotel_noche": 40,
-                "comida_dia": 25,
-                "actividades_dia": 15,
-                "transporte_dia": 10,
-                "otros_dia": 10
-            },
-            "medio": {
-                "vuelo": 700,
-                "hotel_noche": 80,
-                "comida_dia": 50,
-                "actividades_dia": 40,
-                "transporte_dia": 20,
-                "otros_dia": 20
-            },
-            "lujo": {
-                "vuelo": 1500,
-                "hotel_noche": 200,
-                "comida_dia": 120,
-                "actividades_dia": 100,
-                "transporte_dia": 40,
-                "otros_dia": 50
-            }
-        }
-        
-        config = costos.get(nivel.lower(), costos["medio"])
-        num_personas = len(viajeros_db.viajeros) or 1
-        conteo = viajeros_db.contar_por_tipo()
-        
-        # Calcular costos
-        vuelos = config["vuelo"] * num_personas
-        # Descuentos para niños
-        if conteo.get("niño", 0) > 0:
-            vuelos -= config["vuelo"] * 0.25 * conteo["niño"]
-        if conteo.get("bebé", 0) > 0:
-            vuelos -= config["vuelo"] * 0.85 * conteo["bebé"]
-        
-        alojamiento = config["hotel_noche"] * dias
-        comida = config["comida_dia"] * dias * num_personas
-        actividades = config["actividades_dia"] * dias * num_personas
-        transporte = config["transporte_dia"] * dias * num_personas
-        otros = config["otros_dia"] * dias * num_personas
+        mezcla = mezcla_desde_conteo(viajeros_db.contar_por_tipo())
+        num_personas = mezcla.total
         
-        total = vuelos + alojamiento + comida + actividades + transporte + otros
+        # Mismo motor que comparar_presupuestos (vuelos con tarifas de niño/bebé de buscar_vuelos)
+        desglose = presupuesto_escenarios([dias], [nivel], [mezcla])
+        vuelos, alojamiento, comida, actividades, transporte, otros, total, _ = (
+            float(campo.flat[0]) for campo in desglose
+        )
         
         resultado = f"💰 PRESUPUESTO ESTIMADO - {destino.upper()}\n"
         resultado += f"📊 Nivel: {nivel.capitalize()}\n"
@@ -786,27 +780,221 @@ def calcular_presupuesto(dias: int, destino: str, nivel: str = "medio") -> str:
         resultado += f"👥 Viajeros: {num_personas} persona(s)\n\n"
         
         resultado += "📋 DESGLOSE:\n"
-        resultado += f"✈️  Vuelos (ida y vuelta): ${int(vuelos)} USD\n"
-        resultado += f"🏨 Alojamiento ({dias} noches): ${int(alojamiento)} USD\n"
-        resultado += f"🍽️  Comidas: ${int(comida)} USD\n"
-        resultado += f"🎭 Actividades: ${int(actividades)} USD\n"
-        resultado += f"🚕 Transporte local: ${int(transporte)} USD\n"
-        resultado += f"🛍️  Otros gastos: ${int(otros)} USD\n"
+        resultado += f"✈️  Vuelos (ida y vuelta): {formatear_importe(vuelos, decimales=0)}\n"
+        resultado += f"🏨 Alojamiento ({dias} noches): {formatear_importe(alojamiento, decimales=0)}\n"
+        resultado += f"🍽️  Comidas: {formatear_importe(comida, decimales=0)}\n"
+        resultado += f"🎭 Actividades: {formatear_importe(actividades, decimales=0)}\n"
+        resultado += f"🚕 Transporte local: {formatear_importe(transporte, decimales=0)}\n"
+        resultado += f"🛍️  Otros gastos: {formatear_importe(otros, decimales=0)}\n"
         resultado += f"\n{'='*40}\n"
-        resultado += f"💵 TOTAL: ${int(total)} USD\n"
-        resultado += f"💳 Por persona: ${int(total/num_personas)} USD\n"
+        resultado += f"💵 TOTAL: {formatear_importe(total, decimales=0)}\n"
+        resultado += f"💳 Por persona: {formatear_importe(total / num_personas, decimales=0)}\n"
         
         return resultado
     
     except Exception as e:
         return f"❌ Error al calcular presupuesto: {str(e)}"
 
+# ============================================================================
+# HERRAMIENTA 7: COMPARADOR DE PRESUPUESTOS
+# ============================================================================
+
+class ComparadorInput(BaseModel):
+    """Input para comparar escenarios de presupuesto"""
+    destino: str = Field(description="Destino del viaje")
+    dias: List[int] = Field(description="Duraciones a comparar (ej: [5, 7])")
+    niveles: List[str] = Field(default=["economico", "medio", "lujo"],
+                               description="Niveles a comparar: 'economico', 'medio', 'lujo'")
+    grupos: Optional[List[str]] = Field(
+        default=None,
+        description="Mezclas de viajeros 'adultos+niños+bebés' (ej: ['2+0+0', '2+1+0']). "
+                    "Si se omite, se usa el grupo registrado"
+    )
+
+def parsear_grupo(texto: str) -> MezclaViajeros:
+    """'2+1+0' -> MezclaViajeros(2, 1, 0); faltantes cuentan como 0. ValueError si no es un grupo válido"""
+    partes = [p for p in texto.replace(" ", "").split("+") if p]
+    if len(partes) > 3 or not all(p.isdigit() for p in partes):
+        raise ValueError(f"grupo '{texto}' no válido: usa 'adultos+niños+bebés' (ej: '2+1+0')")
+    mezcla = MezclaViajeros(*[int(p) for p in partes], *[0] * (3 - len(partes)))
+    if not mezcla.total:
+        raise ValueError(f"el grupo '{texto}' no tiene viajeros")
+    return mezcla
+
+@tool("comparar_presupuestos", args_schema=ComparadorInput)
+def comparar_presupuestos(destino: str, dias: List[int],
+                          niveles: Optional[List[str]] = None,
+                          grupos: Optional[List[str]] = None) -> str:
+    """
+    Compara en una sola llamada el presupuesto total de varias duraciones,
+    niveles y grupos de viajeros. Úsala cuando el usuario dude entre opciones
+    (ej: '¿5 o 7 días?', '¿económico o medio?').
+    """
+    try:
+        if not dias:
+            raise ValueError("indica al menos una duración en días (ej: [5, 7])")
+        for d in dias:
+            if isinstance(d, bool) or not isinstance(d, int) or d <= 0:
+                raise ValueError(f"duración '{d}' no válida: usa días enteros positivos")
+        niveles = [nivel_presupuesto(n) for n in (niveles or ["economico", "medio", "lujo"])]
+        if grupos:
+            mezclas = [parsear_grupo(g) for g in grupos]
+        else:
+            mezclas = [mezcla_desde_conteo(viajeros_db.contar_por_tipo())]
+        
+        desglose = presupuesto_escenarios(dias, niveles, mezclas)
+        
+        resultado = f"📊 COMPARATIVA DE PRESUPUESTOS - {destino.upper()}\n"
+        resultado += "(total del grupo y, entre paréntesis, por persona)\n"
+        for k, mezcla in enumerate(mezclas):
+            resultado += f"\n👥 {mezcla.adultos} adulto(s), {mezcla.ninos} niño(s), {mezcla.bebes} bebé(s)\n"
+            resultado += "Días   | " + " | ".join(f"{n.capitalize():>28}" for n in niveles) + "\n"
+            for i, d in enumerate(dias):
+                celdas = []
+                for j in range(len(niveles)):
+                    total = desglose.total[i, j, k]
+                    celdas.append(f"{formatear_importe(total, decimales=0)} "
+                                  f"({formatear_importe(total / mezcla.total, decimales=0)}/p)".rjust(28))
+                resultado += f"{d:>3} d  | " + " | ".join(celdas) + "\n"
+        
+        # La más económica dentro de cada grupo: entre grupos distintos el total no es comparable
+        resultado += "\n"
+        por_persona = []
+        for k, mezcla in enumerate(mezclas):
+            i, j = np.unravel_index(np.argmin(desglose.total[:, :, k]), desglose.total.shape[:2])
+            total = desglose.total[i, j, k]
+            por_persona.append(total / mezcla.total)
+            grupo = f" ({mezcla.adultos}+{mezcla.ninos}+{mezcla.bebes})" if len(mezclas) > 1 else ""
+            resultado += (f"💡 Opción más económica{grupo}: {dias[i]} días, nivel {niveles[j]} - "
+                          f"{formatear_importe(total, decimales=0)}\n")
+        if len(mezclas) > 1:
+            k = int(np.argmin(por_persona))
+            mezcla = mezclas[k]
+            resultado += (f"👥 Menor coste por persona: {mezcla.adultos}+{mezcla.ninos}+{mezcla.bebes} "
+                          f"({formatear_importe(por_persona[k], decimales=0)}/p)\n")
+        resultado += "📝 Incluye vuelos, alojamiento, comidas, actividades, transporte y otros\n"
+        return resultado
+    
+    except Exception as e:
+        return f"❌ Error al comparar presupuestos: {str(e)}"
+
+# ============================================================================
+# HERRAMIENTA 8: PLAN COMPLETO (DESTINO + TEMPORADA + ITINERARIO + PRESUPUESTO)
+# ============================================================================
+
+# Hilos compartidos por todas las sesiones para las partes de planificar_viaje
+_pool_plan = ThreadPoolExecutor(max_workers=int(os.getenv("PLAN_TRABAJADORES", "8")),
+                                thread_name_prefix="plan")
+
+class PlanInput(BaseModel):
+    """Input para el plan completo"""
+    destino: str = Field(description="Destino del viaje")
+    dias: int = Field(description="Número de días del viaje")
+    mes: str = Field(description="Mes del viaje (ej: 'Marzo') o fecha de ida YYYY-MM-DD")
+    nivel: str = Field(default="medio", description="Nivel: 'economico', 'medio', 'lujo'")
+
+def _en_paralelo(*tareas):
+    """
+    Ejecuta cada (función, argumentos) en el pool con una copia del contexto
+    (así ven los viajeros de la sesión) y devuelve los resultados en orden
+    """
+    futuros = [_pool_plan.submit(contextvars.copy_context().run, funcion, *argumentos)
+               for funcion, *argumentos in tareas]
+    return [f.result() for f in futuros]
+
+@tool("planificar_viaje", args_schema=PlanInput)
+def planificar_viaje(destino: str, dias: int, mes: str, nivel: str = "medio") -> str:
+    """
+    Plan completo en UNA llamada: información del destino, recomendaciones de
+    temporada, itinerario día a día y presupuesto total, calculados a la vez.
+    Úsala en lugar de llamar por separado a info_destino,
+    recomendaciones_temporada, generar_itinerario y calcular_presupuesto.
+    """
+    nivel = nivel_presupuesto(nivel)
+    partes = _en_paralelo(
+        (info_destino.func, destino),
+        (recomendaciones_temporada.func, destino, mes),
+        (generar_itinerario.func, destino, dias, NIVEL_ITINERARIO[nivel]),
+        (calcular_presupuesto.func, dias, destino, nivel),
+    )
+    titulos = ("DESTINO", "TEMPORADA", "ITINERARIO", "PRESUPUESTO")
+    return "\n\n".join(f"━━ {titulo} ━━\n{parte.strip()}" for titulo, parte in zip(titulos, partes))
+
+# ============================================================================
+# PRECALENTADO DE CACHÉS
+# ============================================================================
+
+def fecha_representativa(mes: int) -> str:
+    """Día 15 de la próxima ocurrencia futura del mes (para precalentar vuelos)"""
+    hoy = datetime.now()
+    anio = hoy.year if (mes, 15) > (hoy.month, hoy.day) else hoy.year + 1
+    return f"{anio}-{mes:02d}-15"
+
+def calentar_ruta(origen: Optional[str], destino: str, mes: Optional[int],
+                  prioridad: int = PRIORIDAD_PRECARGA):
+    """Llena las cachés de geocodificación, Wikipedia y vuelos para una combinación"""
+    geocodificar(destino)
+    resumen_wikipedia(destino, "es")
+    
+    if origen and mes:
+        origen_iata = obtener_codigo_iata(origen)
+        destino_iata = obtener_codigo_iata(destino)
+        if origen_iata and destino_iata:
+            fecha = fecha_representativa(mes)
+            cache_precios.obtener(
+                (origen_iata, destino_iata, fecha, None, 1),
+                lambda: buscar_vuelos_amadeus(origen_iata, destino_iata, fecha, None, 1, prioridad)
+            )
+
+precalentador = Precalentador(
+    rastreador_popularidad,
+    lambda clave: calentar_ruta(*clave),
+    top_n=int(os.getenv("PRECALENTAR_TOP_N", "20")),
+    horas_valle=os.getenv("PRECALENTAR_HORAS", "2-6"),
+)
+
+def calentar_plan(plan: PlanViaje, cancelado: threading.Event):
+    """
+    Precarga especulativa de una sesión: las mismas claves que usarán
+    info_destino, recomendaciones_temporada y buscar_vuelos con ese plan.
+    Entre paso y paso se abandona si el usuario cambió de planes
+    """
+    pasos = [lambda: geocodificar(plan.destino), lambda: resumen_wikipedia(plan.destino, "es")]
+    
+    origen_iata = obtener_codigo_iata(plan.origen) if plan.origen else None
+    destino_iata = obtener_codigo_iata(plan.destino)
+    mes = numero_mes(plan.mes) if plan.mes else None
+    fecha_ida = plan.fecha_ida or (fecha_representativa(mes) if mes else None)
+    if origen_iata and destino_iata and fecha_ida and fecha_ida > datetime.now().strftime("%Y-%m-%d"):
+        # Con la fecha del usuario la clave es exacta; con solo el mes, la del precalentador
+        fecha_vuelta = plan.fecha_vuelta if plan.fecha_ida else None
+        adultos = plan.adultos if plan.fecha_ida else 1
+        pasos.append(lambda: cache_precios.obtener(
+            (origen_iata, destino_iata, fecha_ida, fecha_vuelta, adultos),
+            lambda: buscar_vuelos_amadeus(origen_iata, destino_iata, fecha_ida, fecha_vuelta,
+                                          adultos, PRIORIDAD_PRECARGA)
+        ))
+    
+    for paso in pasos:
+        if cancelado.is_set():
+            return
+        paso()
+
+anticipador = Anticipador(calentar_plan)
+
 # ============================================================================
 # CONFIGURACIÓN DEL AGENTE
 # ============================================================================
 
-def crear_agente_vacaciones():
-    """Crea y configura el agente de planificación de vacaciones"""
+AVISO_PLAZO = ("⏱️ Queda muy poco tiempo para este turno: NO llames a más herramientas. "
+               "Responde ya con la información que tienes y ofrece completar el resto en el siguiente mensaje.")
+
+def crear_agente_vacaciones(checkpointer=None):
+    """
+    Crea y configura el agente de planificación de vacaciones.
+    `checkpointer` permite compartir el historial entre procesos (por
+    defecto, memoria del proceso).
+    """
     
     # Configuración de API
     openai_key = os.getenv("OPENAI_API_KEY")
@@ -816,14 +1004,40 @@ def crear_agente_vacaciones():
     if not openai_key:
         raise ValueError("❌ No se encontró OPENAI_API_KEY. Verifica tu archivo .env")
     
-    llm = ChatOpenAI(
+    # Importaciones pesadas solo al construir el agente (las herramientas no las necesitan)
+    from langchain_openai import ChatOpenAI
+    from langchain_core.messages import SystemMessage
+    from langgraph.prebuilt import create_react_agent
+    from langgraph.checkpoint.memory import MemorySaver
+    
+    from langchain_core.runnables import ConfigurableField, RunnableLambda
+    from consumo import compactar
+    
+    class ChatOpenAIConPlazo(ChatOpenAI):
+        """Cada petición a OpenAI usa como timeout lo que le queda al turno (plazos.py)"""
+        def _get_request_payload(self, input_, *, stop=None, **kwargs):
+            payload = super()._get_request_payload(input_, stop=stop, **kwargs)
+            queda = plazos.restante()
+            if queda is not None:
+                payload["timeout"] = plazos.timeout(self.request_timeout or queda)
+            return payload
+    
+    # stream_usage: el consumo de tokens llega también en modo streaming (ver consumo.py).
+    # configurable["modelo_llm"] cambia de modelo en un turno concreto (presupuesto agotado)
+    llm = ChatOpenAIConPlazo(
         model=model_name,
         temperature=temperature,
-        api_key=openai_key
-    )
+        api_key=openai_key,
+        timeout=float(os.getenv("OPENAI_TIMEOUT_S", "30")),
+        max_retries=int(os.getenv("OPENAI_REINTENTOS", "1")),
+        stream_usage=True
+    ).configurable_fields(model_name=ConfigurableField(id="modelo_llm"))
+    
+    # Precalentado de cachés (arranca una sola vez por proceso)
+    precalentador.iniciar(al_iniciar=int(os.getenv("PRECALENTAR_AL_INICIAR", "5")))
     
     # Sistema de memoria
-    memory = MemorySaver()
+    memory = checkpointer if checkpointer is not None else MemorySaver()
     
     # Prompt del sistema
     system_prompt = """Eres Travel Pro AI, un agente experto en planificación de vacaciones con un proceso conversacional estructurado.
@@ -839,17 +1053,23 @@ PASO 2: DESTINO Y DURACIÓN
 - Pregunta: ¿A dónde quieren ir?
 - Pregunta: ¿Por cuántos días?
 - Pregunta: ¿Desde qué ciudad viajan?
-- Usa info_destino para dar información breve del destino
+- La información del destino llega con planificar_viaje (PASO 4); usa info_destino
+  solo si el usuario pregunta por el destino antes de tener todos los datos
 
 PASO 3: OCASIÓN ESPECIAL
 - Pregunta si el viaje es para algo especial (luna de miel, aniversario, vacaciones familiares, etc.)
 - Esto ayuda a personalizar las recomendaciones
 
 PASO 4: ITINERARIO PERSONALIZADO
-- Pregunta el nivel de presupuesto (económico, medio, lujo)
-- Usa recomendaciones_temporada para actividades según época
-- Usa generar_itinerario con la info recopilada
-- Muestra el itinerario día a día
+- Pregunta el nivel de presupuesto (económico, medio, lujo) y el mes del viaje
+- Con destino, días, mes y nivel usa planificar_viaje UNA sola vez: trae la
+  información del destino, las recomendaciones de temporada, el itinerario y
+  el presupuesto a la vez. NO llames después a info_destino,
+  recomendaciones_temporada, generar_itinerario ni calcular_presupuesto
+- Muestra el itinerario día a día y el presupuesto total
+
+- Si el usuario duda entre duraciones, niveles o grupos, usa comparar_presupuestos
+  UNA sola vez con todas las opciones en lugar de varios calcular_presupuesto
 
 PASO 5: FECHAS DE VIAJE
 - AHORA pregunta las fechas específicas (formato: YYYY-MM-DD)
@@ -859,6 +1079,8 @@ PASO 6: BÚSQUEDA DE VUELOS
 - Usa buscar_vuelos con toda la información
 - Los links se generan automáticamente
 - Muestra opciones y presupuesto total
+- Si los precios son ORIENTATIVOS, preséntalos como estimación y di que los reales
+  aparecerán en cuanto lleguen; NO repitas la búsqueda
 
 📋 REGLAS IMPORTANTES:
 1. NO SALTES PASOS - Sigue el orden
@@ -875,7 +1097,8 @@ PASO 6: BÚSQUEDA DE VUELOS
 
 ⚠️ IMPORTANTE:
 - Si el usuario da toda la info de una vez, sigue igual el flujo pero más rápido
-- Siempre usa info_destino ANTES de generar itinerario
+- Para el plan usa planificar_viaje; las herramientas sueltas solo para
+  preguntas puntuales (ej: solo el clima de un mes o solo el presupuesto)
 - Busca vuelos AL FINAL, después del itinerario
 - Los links de vuelos se generan AUTOMÁTICAMENTE
 
@@ -892,15 +1115,37 @@ Tú: "¡Genial! 🌴 Primero, cuéntame: ¿Quiénes viajan? Dame nombres y edade
         info_destino,
         recomendaciones_temporada,
         generar_itinerario,
-        calcular_presupuesto
+        calcular_presupuesto,
+        comparar_presupuestos,
+        planificar_viaje
     ]
     
+    # bind_tools sobre el modelo configurable devuelve el enlace fijado al modelo por
+    # defecto: se conserva ese enlace (herramientas y opciones) apuntándolo al configurable
+    enlazado = llm.bind_tools(tools).model_copy(update={"bound": llm})
+    
+    def preparar_mensajes(estado, config):
+        """
+        Prompt del sistema + historial (compactado si la sesión agotó su
+        presupuesto de tokens). Si al turno le queda poco, se pide cerrar ya
+        """
+        queda = plazos.restante()
+        if queda is not None and queda <= 0:
+            raise plazos.PlazoAgotado("El turno superó su plazo")
+        mensajes = estado["messages"]
+        if config.get("configurable", {}).get("compactar_historial"):
+            mensajes = compactar(mensajes)
+        mensajes = [SystemMessage(content=system_prompt)] + list(mensajes)
+        if plazos.casi_agotado():
+            mensajes.append(SystemMessage(content=AVISO_PLAZO))
+        return mensajes
+    
     # Crear agente
     agente = create_react_agent(
-        model=llm,
+        model=enlazado,
         tools=tools,
         checkpointer=memory,
-        state_modifier=SystemMessage(content=system_prompt)
+        state_modifier=RunnableLambda(preparar_mensajes)
     )
     
     return agente
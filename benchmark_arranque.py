@@ -0,0 +1,102 @@
+"""
+⏱️ BENCHMARK DE ARRANQUE
+Mide en procesos nuevos (arranque en frío) lo que importa app.py antes de
+pintar la página, frente a la importación completa del agente, y muestra
+el informe de `python -X importtime` de los módulos más lentos
+
+Uso:
+    python benchmark_arranque.py [--repeticiones 5] [--top 15] [--json arranque.json]
+    python benchmark_arranque.py --maximo-ms 1500   # falla si el arranque supera el límite
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+# Lo que importa app.py antes de la primera página
+MODULOS_ARRANQUE = ["streamlit", "dotenv", "viajeros"]
+
+# Lo que importaba antes (y lo que se importa en segundo plano / con el primer mensaje)
+MODULOS_AGENTE = MODULOS_ARRANQUE + [
+    "asistente", "langchain_openai", "langchain_core.messages",
+    "langgraph.prebuilt", "langgraph.checkpoint.memory",
+]
+
+ESCENARIOS = {
+    "arranque (perezoso)": MODULOS_ARRANQUE,
+    "agente completo": MODULOS_AGENTE,
+}
+
+class TiempoImportacion(NamedTuple):
+    modulo: str
+    propio_ms: float
+    acumulado_ms: float
+
+def _codigo(modulos: Sequence[str]) -> str:
+    return "; ".join(f"import {m}" for m in modulos)
+
+def tiempo_arranque(modulos: Sequence[str], repeticiones: int = 5) -> List[float]:
+    """Segundos de pared de un intérprete nuevo que importa `modulos`"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, "-c", _codigo(modulos)], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+def informe_importtime(modulos: Sequence[str]) -> List[TiempoImportacion]:
+    """Parsea la salida de `-X importtime` (microsegundos) de una importación en frío"""
+    proceso = subprocess.run([sys.executable, "-X", "importtime", "-c", _codigo(modulos)],
+                             check=True, capture_output=True, text=True)
+    filas = []
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        propio, acumulado, modulo = linea[len("import time:"):].split("|", 2)
+        filas.append(TiempoImportacion(modulo.strip(), int(propio) / 1000, int(acumulado) / 1000))
+    return filas
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark de arranque en frío de la app")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Arranques por escenario")
+    parser.add_argument("--top", type=int, default=15, help="Módulos más lentos a mostrar")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    parser.add_argument("--maximo-ms", type=float, help="Límite para el arranque perezoso (código 1 si se supera)")
+    args = parser.parse_args(argv)
+
+    resultados: Dict[str, Dict] = {}
+    print("⏱️ ARRANQUE EN FRÍO (mediana de procesos nuevos)\n")
+    for nombre, modulos in ESCENARIOS.items():
+        tiempos = tiempo_arranque(modulos, args.repeticiones)
+        mediana = statistics.median(tiempos) * 1000
+        resultados[nombre] = {"modulos": modulos, "mediana_ms": round(mediana, 1),
+                              "tiempos_ms": [round(t * 1000, 1) for t in tiempos]}
+        print(f"   {nombre:<22} {mediana:8.0f} ms")
+
+    perezoso = resultados["arranque (perezoso)"]["mediana_ms"]
+    completo = resultados["agente completo"]["mediana_ms"]
+    print(f"\n🚀 Hasta la primera página: {completo - perezoso:.0f} ms menos ({completo / perezoso:.1f}x)")
+
+    filas = informe_importtime(MODULOS_AGENTE)
+    print(f"\n📋 IMPORTACIONES MÁS LENTAS (acumulado, -X importtime)\n")
+    for fila in sorted(filas, key=lambda f: f.acumulado_ms, reverse=True)[:args.top]:
+        print(f"   {fila.acumulado_ms:8.1f} ms  {fila.modulo}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"fecha": time.strftime("%Y-%m-%d %H:%M:%S"), "python": sys.version.split()[0],
+                       "escenarios": resultados,
+                       "importtime": [fila._asdict() for fila in filas]}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resultados guardados en {args.json}")
+
+    if args.maximo_ms is not None and perezoso > args.maximo_ms:
+        print(f"\n❌ El arranque ({perezoso:.0f} ms) supera el límite de {args.maximo_ms:.0f} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+⏱️ BENCHMARK DE CHECKPOINTS
+Simula una conversación con el mismo patrón que el agente (pregunta, llamada
+a herramienta con un resultado largo como los de buscar_vuelos o
+generar_itinerario, respuesta) sobre un grafo de LangGraph real y compara
+el formato anterior (copia completa sin comprimir) con el delta comprimido:
+bytes por checkpoint, tiempo de escritura y tiempo de restaurar el hilo
+
+Uso:
+    python benchmark_checkpoints.py [--turnos 30] [--repeticiones 20] [--json checkpoints.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from checkpointer_sesiones import CheckpointerSesiones
+from sesiones import AlmacenSQLite, RegistroCheckpoint
+
+# Resultado de herramienta representativo (~2 KB, como un itinerario o una lista de vuelos)
+RESULTADO_HERRAMIENTA = "\n".join(
+    f"📅 DÍA {dia}: Visita al centro histórico, museo principal y cena típica. "
+    f"Presupuesto estimado: {80 + dia * 5} USD por persona. Transporte: metro y a pie."
+    for dia in range(1, 15))
+
+class SinComprimir(CheckpointerSesiones):
+    """Formato anterior: el checkpoint completo tal como lo serializa LangGraph"""
+    def put(self, config, checkpoint, metadata, new_versions):
+        configurable = config["configurable"]
+        thread_id, ns = str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")
+        tipo, datos = self.serde.dumps_typed(checkpoint)
+        self.almacen.guardar_checkpoint(RegistroCheckpoint(
+            thread_id, ns, checkpoint["id"], configurable.get("checkpoint_id"), tipo, datos,
+            self._metadata_serde.dumps(metadata)))
+        return self._config(thread_id, ns, checkpoint["id"])
+
+def crear_grafo(checkpointer: CheckpointerSesiones):
+    """Modelo -> herramienta -> modelo, sin LLM: mismo número de pasos que el agente"""
+    def modelo(estado: MessagesState) -> Dict[str, Any]:
+        if isinstance(estado["messages"][-1], ToolMessage):
+            return {"messages": [AIMessage(content="Aquí tienes el plan con los vuelos y el itinerario.")]}
+        return {"messages": [AIMessage(content="", tool_calls=[
+            {"id": f"llamada_{len(estado['messages'])}", "name": "generar_itinerario",
+             "args": {"destino": "Cusco", "dias": 14}}])]}
+
+    def herramientas(estado: MessagesState) -> Dict[str, Any]:
+        llamada = estado["messages"][-1].tool_calls[0]
+        return {"messages": [ToolMessage(content=RESULTADO_HERRAMIENTA, tool_call_id=llamada["id"],
+                                         name=llamada["name"])]}
+
+    grafo = StateGraph(MessagesState)
+    grafo.add_node("agent", modelo)
+    grafo.add_node("tools", herramientas)
+    grafo.add_edge(START, "agent")
+    grafo.add_conditional_edges("agent", lambda e: "tools" if e["messages"][-1].tool_calls else END)
+    grafo.add_edge("tools", "agent")
+    return grafo.compile(checkpointer=checkpointer)
+
+def medir(checkpointer: CheckpointerSesiones, turnos: int, repeticiones: int) -> Dict[str, Any]:
+    grafo = crear_grafo(checkpointer)
+    config = {"configurable": {"thread_id": "benchmark"}}
+    inicio = time.perf_counter()
+    for turno in range(turnos):
+        grafo.invoke({"messages": [("user", f"Turno {turno}: planifica 14 días en Cusco")]}, config)
+    escritura = time.perf_counter() - inicio
+
+    registros = list(checkpointer.almacen.listar_checkpoints("benchmark"))
+    tamanos = [len(r.checkpoint) for r in registros]
+    restauraciones = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        tupla = checkpointer.get_tuple(config)
+        restauraciones.append(time.perf_counter() - inicio)
+    return {
+        "checkpoints": len(registros),
+        "mensajes": len(tupla.checkpoint["channel_values"]["messages"]),
+        "bytes_total": sum(tamanos),
+        "bytes_medio": round(statistics.mean(tamanos)),
+        "bytes_ultimo": tamanos[0],
+        "escritura_ms_por_turno": round(escritura * 1000 / turnos, 2),
+        "restaurar_ms": round(statistics.median(restauraciones) * 1000, 3),
+    }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark de tamaño y restauración de checkpoints")
+    parser.add_argument("--turnos", type=int, default=30, help="Turnos de la conversación simulada")
+    parser.add_argument("--repeticiones", type=int, default=20, help="Restauraciones a medir")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    args = parser.parse_args(argv)
+
+    resultados: Dict[str, Dict] = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        escenarios = {
+            "completo sin comprimir": SinComprimir,
+            "completo comprimido": lambda a: CheckpointerSesiones(a, delta=False),
+            "delta comprimido": lambda a: CheckpointerSesiones(a, delta=True),
+        }
+        print(f"💾 CHECKPOINTS ({args.turnos} turnos, 4 mensajes por turno)\n")
+        print(f"   {'formato':<24} {'total':>10} {'medio':>9} {'último':>9} {'escritura':>11} {'restaurar':>10}")
+        for nombre, crear in escenarios.items():
+            almacen = AlmacenSQLite(os.path.join(directorio, nombre.replace(" ", "_") + ".sqlite"))
+            r = resultados[nombre] = medir(crear(almacen), args.turnos, args.repeticiones)
+            print(f"   {nombre:<24} {r['bytes_total'] / 1024:8.0f} KB {r['bytes_medio']:7d} B "
+                  f"{r['bytes_ultimo']:7d} B {r['escritura_ms_por_turno']:8.2f} ms {r['restaurar_ms']:7.2f} ms")
+
+    base, delta = resultados["completo sin comprimir"], resultados["delta comprimido"]
+    print(f"\n📉 Almacenamiento: {base['bytes_total'] / delta['bytes_total']:.1f}x menos con delta comprimido")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"fecha": time.strftime("%Y-%m-%d %H:%M:%S"), "python": sys.version.split()[0],
+                       "turnos": args.turnos, "escenarios": resultados}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resultados guardados en {args.json}")
+
+if __name__ == "__main__":
+    main()
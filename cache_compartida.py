@@ -0,0 +1,205 @@
+"""
+🗃️ CACHÉ COMPARTIDA ENTRE PROCESOS
+Segundo nivel, debajo de las cachés en memoria, para que varios workers
+(Streamlit o API) en la misma máquina compartan geocodificaciones, resúmenes
+de Wikipedia y precios de vuelos sin calentarlos cada uno por su lado. Es un
+archivo SQLite en modo WAL (sin servicios externos) con:
+
+- Espacios de nombres (una caché = un espacio) con su propio TTL por entrada.
+- Valores en JSON compacto, comprimido con zlib si es grande (nunca marshal
+  ni pickle: el archivo lo puede escribir cualquier proceso de la máquina).
+- Tamaño acotado: por encima de CACHE_COMPARTIDA_MAX_MB se expulsan las
+  entradas usadas hace más tiempo.
+- Escrituras atómicas (INSERT ... ON CONFLICT en una sola sentencia).
+
+Es un acelerador: si el archivo no se puede usar, las cachés siguen en memoria
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Hashable, NamedTuple, Optional
+
+from metricas import metricas
+
+# Archivo de la caché ("" desactiva el nivel compartido)
+# (por defecto junto al código, no en el directorio de trabajo)
+RUTA_CACHE_COMPARTIDA = os.getenv("CACHE_COMPARTIDA", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                   ".estado", "caches.sqlite"))
+
+# Tamaño máximo de los valores guardados
+MAX_BYTES = int(float(os.getenv("CACHE_COMPARTIDA_MAX_MB", "64")) * 1024 * 1024)
+
+# Segundos que un worker espera el bloqueo de escritura antes de desistir
+ESPERA_BLOQUEO = float(os.getenv("CACHE_COMPARTIDA_ESPERA_S", "2"))
+
+# Valores a partir de este tamaño se comprimen
+MIN_COMPRIMIR = 512
+
+# Escrituras (de este proceso) entre comprobaciones de tamaño
+ESCRITURAS_POR_REVISION = 64
+
+# Un acierto solo actualiza la fecha de uso si la anterior es más vieja que esto
+PRECISION_USO = 60.0
+
+# Cabecera: formato JSON + compresión. Cualquier otra (p. ej. entradas antiguas) = fallo de caché
+_PLANO = b"jp"
+_COMPRIMIDO = b"jz"
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    espacio TEXT NOT NULL,
+    clave TEXT NOT NULL,
+    valor BLOB NOT NULL,
+    guardado REAL NOT NULL,
+    caduca REAL NOT NULL,
+    usado REAL NOT NULL,
+    UNIQUE (espacio, clave)
+);
+CREATE INDEX IF NOT EXISTS cache_usado ON cache (usado);
+"""
+
+class EntradaCompartida(NamedTuple):
+    valor: Any
+    guardado: float
+    caduca: float
+
+# ============================================================================
+# CODIFICACIÓN
+# ============================================================================
+
+def codificar(valor: Any) -> bytes:
+    """Tipos básicos (dict, list, str, números, None); las tuplas vuelven como listas"""
+    datos = json.dumps(valor, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(datos) >= MIN_COMPRIMIR:
+        return _COMPRIMIDO + zlib.compress(datos, 6)
+    return _PLANO + datos
+
+def decodificar(datos: bytes) -> Any:
+    cabecera, cuerpo = bytes(datos[:2]), datos[2:]
+    if cabecera == _COMPRIMIDO:
+        return json.loads(zlib.decompress(cuerpo))
+    if cabecera == _PLANO:
+        return json.loads(bytes(cuerpo))
+    raise ValueError("formato de caché desconocido")
+
+def texto_clave(clave: Hashable) -> str:
+    """Claves str o tuplas de str/números/None: repr es estable entre procesos"""
+    return clave if isinstance(clave, str) else repr(clave)
+
+# ============================================================================
+# ALMACÉN
+# ============================================================================
+
+class CacheCompartida:
+    """Archivo SQLite en WAL compartido por los procesos de la máquina; una conexión por hilo"""
+    def __init__(self, ruta: str, max_bytes: int = MAX_BYTES):
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        if os.path.dirname(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        self._local = threading.local()
+        self._escrituras = 0
+        self._lock = threading.Lock()
+        conexion = self._conexion()
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.executescript(ESQUEMA)
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=ESPERA_BLOQUEO, isolation_level=None)
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def leer(self, espacio: str, clave: Hashable) -> Optional[EntradaCompartida]:
+        """Entrada aunque haya caducado (el llamador decide si la sirve); None si no hay"""
+        clave = texto_clave(clave)
+        try:
+            conexion = self._conexion()
+            fila = conexion.execute(
+                "SELECT valor, guardado, caduca, usado FROM cache WHERE espacio = ? AND clave = ?",
+                (espacio, clave)).fetchone()
+            if fila is None:
+                return None
+            ahora = time.time()
+            if ahora - fila[3] > PRECISION_USO:
+                conexion.execute("UPDATE cache SET usado = ? WHERE espacio = ? AND clave = ?",
+                                 (ahora, espacio, clave))
+            return EntradaCompartida(decodificar(fila[0]), fila[1], fila[2])
+        except (sqlite3.Error, ValueError, zlib.error):
+            metricas.incrementar("cache_compartida_errores_total", espacio=espacio)
+            return None
+
+    def escribir(self, espacio: str, clave: Hashable, valor: Any, ttl: float,
+                 guardado: Optional[float] = None):
+        guardado = time.time() if guardado is None else guardado
+        try:
+            datos = codificar(valor)
+            self._conexion().execute(
+                "INSERT INTO cache (espacio, clave, valor, guardado, caduca, usado) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(espacio, clave) DO UPDATE SET valor = excluded.valor, guardado = excluded.guardado, "
+                "caduca = excluded.caduca, usado = excluded.usado",
+                (espacio, texto_clave(clave), datos, guardado, guardado + ttl, time.time()))
+        except (sqlite3.Error, ValueError, TypeError):
+            metricas.incrementar("cache_compartida_errores_total", espacio=espacio)
+            return
+        metricas.incrementar("cache_compartida_escrituras_total", espacio=espacio)
+        with self._lock:
+            self._escrituras += 1
+            revisar = self._escrituras % ESCRITURAS_POR_REVISION == 0
+        if revisar:
+            self.recortar()
+
+    def recortar(self) -> int:
+        """Expulsa las entradas usadas hace más tiempo hasta quedar por debajo de max_bytes"""
+        expulsadas = 0
+        try:
+            conexion = self._conexion()
+            conexion.execute("BEGIN IMMEDIATE")
+            try:
+                total, entradas = conexion.execute(
+                    "SELECT COALESCE(SUM(LENGTH(valor)), 0), COUNT(*) FROM cache").fetchone()
+                while total > self.max_bytes and entradas:
+                    # Lotes del 10 %: pocas pasadas aunque la tabla sea grande
+                    lote = max(1, entradas // 10)
+                    liberado = conexion.execute(
+                        "SELECT COALESCE(SUM(LENGTH(valor)), 0) FROM "
+                        "(SELECT valor FROM cache ORDER BY usado LIMIT ?)", (lote,)).fetchone()[0]
+                    conexion.execute("DELETE FROM cache WHERE rowid IN "
+                                     "(SELECT rowid FROM cache ORDER BY usado LIMIT ?)", (lote,))
+                    total -= liberado
+                    entradas -= lote
+                    expulsadas += lote
+            except BaseException:
+                conexion.execute("ROLLBACK")
+                raise
+            conexion.execute("COMMIT")
+        except sqlite3.Error:
+            metricas.incrementar("cache_compartida_errores_total", espacio="*")
+            return 0
+        if expulsadas:
+            metricas.incrementar("cache_compartida_expulsiones_total", expulsadas)
+        return expulsadas
+
+    def estado(self) -> Dict[str, Any]:
+        total, entradas = self._conexion().execute(
+            "SELECT COALESCE(SUM(LENGTH(valor)), 0), COUNT(*) FROM cache").fetchone()
+        return {"ruta": self.ruta, "entradas": entradas, "bytes": total, "max_bytes": self.max_bytes}
+
+def crear_cache_compartida(ruta: str = RUTA_CACHE_COMPARTIDA) -> Optional[CacheCompartida]:
+    """None si está desactivada o el archivo no se puede abrir (las cachés siguen en memoria)"""
+    if not ruta:
+        return None
+    try:
+        return CacheCompartida(ruta)
+    except (sqlite3.Error, OSError):
+        metricas.incrementar("cache_compartida_errores_total", espacio="*")
+        return None
+
+# Instancia global: la usan caches.CacheTTL y cache_precios.CachePrecios
+cache_compartida = crear_cache_compartida()
@@ -0,0 +1,136 @@
+"""
+♻️ CACHÉ DE PRECIOS (STALE-WHILE-REVALIDATE)
+Sirve al instante el último precio conocido de una ruta y lo refresca
+en segundo plano cuando deja de estar fresco. Debajo, la caché compartida
+entre procesos: lo que carga o refresca un worker lo ven los demás
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from cache_compartida import CacheCompartida, cache_compartida
+from metricas import metricas
+from ofertas import OfertaVuelo
+
+# ============================================================================
+# CACHÉ CON REVALIDACIÓN EN SEGUNDO PLANO
+# ============================================================================
+
+class CachePrecios:
+    """
+    - Entrada fresca (edad < fresco): se sirve directamente.
+    - Entrada obsoleta (edad < max_obsoleto): se sirve y se refresca en segundo plano.
+    - Sin entrada o demasiado vieja: se carga en línea (bloquea).
+    Con `compartida`, los valores pasan por `codificar`/`decodificar` para
+    guardarse como tipos básicos en el espacio "precios"
+    """
+    def __init__(self, fresco: float, max_obsoleto: float, max_entradas: int = 500,
+                 trabajadores: int = 2, compartida: Optional[CacheCompartida] = None,
+                 codificar: Callable[[Any], Any] = lambda valor: valor,
+                 decodificar: Callable[[Any], Any] = lambda valor: valor):
+        self.fresco = fresco
+        self.max_obsoleto = max_obsoleto
+        self.max_entradas = max_entradas
+        self.compartida = compartida
+        self.codificar = codificar
+        self.decodificar = decodificar
+        self._entradas: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._refrescando: set = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=trabajadores, thread_name_prefix="refresco_precios")
+
+    def _poner(self, clave: Hashable, valor: Any, guardado: float):
+        with self._lock:
+            self._entradas[clave] = (valor, guardado)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def _guardar(self, clave: Hashable, valor: Any):
+        guardado = time.time()
+        self._poner(clave, valor, guardado)
+        if self.compartida is not None:
+            self.compartida.escribir("precios", clave, self.codificar(valor), self.max_obsoleto, guardado)
+
+    def _refrescar(self, clave: Hashable, cargar: Callable[[], Optional[Any]]):
+        try:
+            valor = cargar()
+            if valor is not None:
+                self._guardar(clave, valor)
+                metricas.incrementar("cache_precios_refrescos_total")
+        except Exception:
+            metricas.incrementar("cache_precios_refrescos_fallidos_total")
+        finally:
+            with self._lock:
+                self._refrescando.discard(clave)
+
+    def consultar(self, clave: Hashable) -> Tuple[Optional[Any], Optional[float]]:
+        """Devuelve (valor, edad en segundos) sin cargar nada"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+        if self.compartida is not None and (entrada is None or time.time() - entrada[1] >= self.fresco):
+            # Otro worker puede tenerlo (o haberlo refrescado ya)
+            compartida = self.compartida.leer("precios", clave)
+            if compartida is not None and (entrada is None or compartida.guardado > entrada[1]):
+                entrada = (self.decodificar(compartida.valor), compartida.guardado)
+                self._poner(clave, *entrada)
+                metricas.incrementar("cache_compartida_aciertos_total", cache="precios")
+        if entrada is None:
+            return None, None
+        valor, guardado = entrada
+        return valor, time.time() - guardado
+
+    def obtener(self, clave: Hashable, cargar: Callable[[], Optional[Any]],
+                cargar_fondo: Optional[Callable[[], Optional[Any]]] = None
+                ) -> Tuple[Optional[Any], Optional[float]]:
+        """
+        Devuelve (valor, edad). La edad es None cuando el valor se acaba de
+        obtener en línea. `cargar_fondo` permite refrescar con menor prioridad.
+        """
+        valor, edad = self.consultar(clave)
+        if valor is not None and edad < self.max_obsoleto:
+            with self._lock:
+                # Pudo expulsarse entre la consulta y aquí
+                if clave in self._entradas:
+                    self._entradas.move_to_end(clave)
+                lanzar = edad >= self.fresco and clave not in self._refrescando
+                if lanzar:
+                    self._refrescando.add(clave)
+            if lanzar:
+                self._pool.submit(self._refrescar, clave, cargar_fondo or cargar)
+                metricas.incrementar("cache_precios_obsoletos_total")
+            else:
+                metricas.incrementar("cache_precios_aciertos_total")
+            return valor, edad
+
+        metricas.incrementar("cache_precios_fallos_total")
+        valor = cargar()
+        if valor is not None:
+            self._guardar(clave, valor)
+        return valor, None
+
+    def estado(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entradas": len(self._entradas), "refrescando": len(self._refrescando)}
+
+def describir_edad(segundos: float) -> str:
+    """Texto corto con la antigüedad de un precio cacheado"""
+    if segundos < 60:
+        return f"{int(segundos)} s"
+    if segundos < 3600:
+        return f"{int(segundos // 60)} min"
+    return f"{segundos / 3600:.1f} h"
+
+# Instancia global (límites configurables por entorno, en segundos)
+cache_precios = CachePrecios(
+    fresco=float(os.getenv("CACHE_PRECIOS_FRESCO", "600")),
+    max_obsoleto=float(os.getenv("CACHE_PRECIOS_MAX_OBSOLETO", "10800")),
+    max_entradas=int(os.getenv("CACHE_PRECIOS_ENTRADAS", "500")),
+    compartida=cache_compartida,
+    codificar=lambda ofertas: [oferta.a_tupla() for oferta in ofertas],
+    decodificar=lambda filas: [OfertaVuelo(*fila) for fila in filas],
+)
@@ -0,0 +1,93 @@
+"""
+🗄️ CACHÉS DE DATOS EXTERNOS
+Cachés en memoria con caducidad para geocodificación y Wikipedia, con la
+caché compartida entre procesos debajo (cache_compartida). Las entradas
+caducadas se pueden seguir sirviendo si el servicio no está disponible
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from cache_compartida import CacheCompartida, cache_compartida
+from metricas import metricas
+
+# ============================================================================
+# CACHÉ LRU CON CADUCIDAD
+# ============================================================================
+
+class CacheTTL:
+    """
+    Caché LRU acotada en número de entradas donde cada entrada caduca a los
+    `ttl` segundos. Con `compartida`, los fallos en memoria se buscan en la
+    caché entre procesos (espacio = nombre, mismo TTL) y lo guardado se
+    escribe en ambas
+    """
+    def __init__(self, nombre: str, ttl: float, max_entradas: int = 1000,
+                 compartida: Optional[CacheCompartida] = None):
+        self.nombre = nombre
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.compartida = compartida
+        self._entradas: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _poner(self, clave: Hashable, valor: Any, caduca: float):
+        with self._lock:
+            self._entradas[clave] = (valor, caduca)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def _de_compartida(self, clave: Hashable) -> Optional[Tuple[Any, float]]:
+        """Entrada de la caché entre procesos (copiada a memoria), aunque haya caducado"""
+        if self.compartida is None:
+            return None
+        entrada = self.compartida.leer(self.nombre, clave)
+        if entrada is None:
+            return None
+        self._poner(clave, entrada.valor, entrada.caduca)
+        return entrada.valor, entrada.caduca
+
+    def obtener(self, clave: Hashable) -> Optional[Any]:
+        # Las entradas caducadas se conservan (hasta que las expulse el LRU)
+        # por si el servicio cae: ver obtener_caducado
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[1] >= time.time():
+                self._entradas.move_to_end(clave)
+        if entrada is None or entrada[1] < time.time():
+            # Otro worker puede haberla cargado (o refrescado) ya
+            entrada = self._de_compartida(clave)
+            if entrada is None or entrada[1] < time.time():
+                metricas.incrementar("cache_fallos_total", cache=self.nombre)
+                return None
+            metricas.incrementar("cache_compartida_aciertos_total", cache=self.nombre)
+        metricas.incrementar("cache_aciertos_total", cache=self.nombre)
+        return entrada[0]
+
+    def obtener_caducado(self, clave: Hashable) -> Optional[Any]:
+        """Valor aunque haya caducado; para responder algo mientras el servicio no está disponible"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+        if entrada is None:
+            entrada = self._de_compartida(clave)
+        if entrada is not None:
+            metricas.incrementar("cache_caducados_servidos_total", cache=self.nombre)
+        return entrada[0] if entrada is not None else None
+
+    def guardar(self, clave: Hashable, valor: Any):
+        self._poner(clave, valor, time.time() + self.ttl)
+        if self.compartida is not None:
+            self.compartida.escribir(self.nombre, clave, valor, self.ttl)
+
+    def __contains__(self, clave: Hashable) -> bool:
+        return self.obtener(clave) is not None
+
+# Instancias globales: la geografía cambia poco; los resúmenes algo más
+cache_geocodificacion = CacheTTL("geocodificacion", float(os.getenv("CACHE_GEO_TTL", str(7 * 24 * 3600))),
+                                 compartida=cache_compartida)
+cache_wikipedia = CacheTTL("wikipedia", float(os.getenv("CACHE_WIKI_TTL", str(24 * 3600))),
+                           compartida=cache_compartida)
@@ -0,0 +1,268 @@
+"""
+💾 CHECKPOINTER DE LANGGRAPH SOBRE EL ALMACÉN DE SESIONES
+Guarda el historial del agente en el mismo almacén compartido que los
+viajeros (SQLite o Redis). Si dos workers intentan avanzar la misma
+conversación a la vez, el segundo recibe ConflictoVersion.
+
+LangGraph entrega en cada paso la lista completa de mensajes, así que
+guardarla entera hace crecer el almacenamiento de forma cuadrática con la
+conversación. Aquí cada checkpoint guarda solo los mensajes añadidos desde
+su padre ("delta"), con una copia completa cada CHECKPOINT_COMPLETO_CADA
+pasos para acotar la cadena al restaurar. Todo va en msgpack comprimido con
+zlib, o con zstd si CHECKPOINT_ZSTD=1 (todos los workers necesitan entonces
+`zstandard` para leerlos)
+"""
+
+import asyncio
+import os
+import random
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from metricas import metricas
+from sesiones import AlmacenSesiones, RegistroCheckpoint
+
+try:
+    import zstandard  # Opcional: mejor compresión y más rápida que zlib
+except ImportError:
+    zstandard = None
+
+# Guardar solo los mensajes nuevos de cada paso (0 = copia completa siempre, como antes)
+CHECKPOINT_DELTA = os.getenv("CHECKPOINT_DELTA", "1") != "0"
+
+# Deltas seguidos como máximo antes de una copia completa
+COMPLETO_CADA = int(os.getenv("CHECKPOINT_COMPLETO_CADA", "20"))
+
+# Comprimir con zstd: solo si TODOS los workers que comparten el almacén tienen
+# `zstandard` instalado; uno sin él no podría restaurar esas conversaciones
+USAR_ZSTD = os.getenv("CHECKPOINT_ZSTD", "0") == "1" and zstandard is not None
+
+# Nivel de compresión (zstd 1-22, zlib 1-9)
+NIVEL_COMPRESION = int(os.getenv("CHECKPOINT_NIVEL_COMPRESION", "3"))
+
+# Hilos cuyo último checkpoint se recuerda para decidir si el siguiente puede ser delta
+MAX_HILOS_RECORDADOS = 1000
+
+CANAL_MENSAJES = "messages"
+
+# ============================================================================
+# FORMATO
+# ============================================================================
+# tipo = "<forma>.<compresión>.<tipo del serde>", p. ej. "delta.zstd.msgpack".
+# Los registros antiguos (tipo del serde a secas) se leen como antes
+
+COMPLETO, DELTA = "completo", "delta"
+
+def comprimir(datos: bytes) -> Tuple[str, bytes]:
+    if USAR_ZSTD:
+        return "zstd", zstandard.ZstdCompressor(level=NIVEL_COMPRESION).compress(datos)
+    return "zlib", zlib.compress(datos, min(NIVEL_COMPRESION, 9))
+
+def descomprimir(compresion: str, datos: bytes) -> bytes:
+    if compresion == "zstd":
+        if zstandard is None:
+            raise RuntimeError("checkpoint comprimido con zstd: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(datos)
+    if compresion == "zlib":
+        return zlib.decompress(datos)
+    raise ValueError(f"compresión de checkpoint desconocida: {compresion}")
+
+class _Ultimo(NamedTuple):
+    """Lo que hace falta del último checkpoint de un hilo para escribir el siguiente como delta"""
+    checkpoint_id: str
+    huellas: Tuple[Tuple[Optional[str], int], ...]
+    cadena: Tuple[str, ...]  # ids desde la última copia completa (incluida) hasta este
+
+def _huellas(mensajes: List[Any]) -> Tuple[Tuple[Optional[str], int], ...]:
+    """(id, hash del contenido) por mensaje: detecta mensajes reemplazados con el mismo id"""
+    return tuple((getattr(m, "id", None),
+                  hash(m.content) if isinstance(getattr(m, "content", None), str) else hash(repr(m)))
+                 for m in mensajes)
+
+# ============================================================================
+# CHECKPOINTER
+# ============================================================================
+
+class CheckpointerSesiones(BaseCheckpointSaver):
+    def __init__(self, almacen: AlmacenSesiones, delta: bool = CHECKPOINT_DELTA,
+                 completo_cada: int = COMPLETO_CADA):
+        super().__init__()
+        self.almacen = almacen
+        self.delta = delta
+        self.completo_cada = completo_cada
+        self._metadata_serde = JsonPlusSerializer()
+        self._ultimos: "OrderedDict[Tuple[str, str], _Ultimo]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- Conversión ---------------------------------------------------------
+
+    def _config(self, thread_id: str, ns: str, checkpoint_id: str) -> RunnableConfig:
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}}
+
+    def _decodificar(self, registro: RegistroCheckpoint) -> Tuple[str, Checkpoint]:
+        """(forma, checkpoint tal como se guardó: en un delta, solo los mensajes nuevos)"""
+        partes = registro.tipo.split(".", 2)
+        if len(partes) < 3 or partes[0] not in (COMPLETO, DELTA):
+            return COMPLETO, self.serde.loads_typed((registro.tipo, registro.checkpoint))
+        forma, compresion, tipo = partes
+        return forma, self.serde.loads_typed((tipo, descomprimir(compresion, registro.checkpoint)))
+
+    def _restaurar(self, registro: RegistroCheckpoint,
+                   vistos: Optional[Dict[str, RegistroCheckpoint]] = None) -> Checkpoint:
+        """
+        Recorre los padres hasta la última copia completa y concatena los
+        mensajes añadidos una sola vez (como mucho COMPLETO_CADA registros).
+        `vistos` evita releer registros al listar un hilo entero
+        """
+        forma, checkpoint = self._decodificar(registro)
+        if forma == COMPLETO:
+            return checkpoint
+        tramos = [checkpoint["channel_values"].get(CANAL_MENSAJES, [])]
+        actual = registro
+        while forma == DELTA:
+            padre = (vistos or {}).get(actual.padre_id) or self.almacen.obtener_checkpoint(
+                actual.thread_id, actual.ns, actual.padre_id)
+            if padre is None:
+                raise ValueError(f"checkpoint {actual.checkpoint_id}: falta su padre {actual.padre_id}")
+            forma, anterior = self._decodificar(padre)
+            tramos.append(anterior["channel_values"].get(CANAL_MENSAJES, []))
+            actual = padre
+        mensajes = [m for tramo in reversed(tramos) for m in tramo]
+        return {**checkpoint, "channel_values": {**checkpoint["channel_values"], CANAL_MENSAJES: mensajes}}
+
+    def _tupla(self, registro: RegistroCheckpoint,
+               vistos: Optional[Dict[str, RegistroCheckpoint]] = None) -> CheckpointTuple:
+        escrituras = self.almacen.obtener_escrituras(registro.thread_id, registro.ns, registro.checkpoint_id)
+        return CheckpointTuple(
+            self._config(registro.thread_id, registro.ns, registro.checkpoint_id),
+            self._restaurar(registro, vistos),
+            self._metadata_serde.loads(registro.metadata) if registro.metadata else {},
+            self._config(registro.thread_id, registro.ns, registro.padre_id) if registro.padre_id else None,
+            [(task_id, canal, self.serde.loads_typed((tipo, valor)))
+             for task_id, _, canal, tipo, valor in escrituras],
+        )
+
+    # --- API de BaseCheckpointSaver -----------------------------------------
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        registro = self.almacen.obtener_checkpoint(str(configurable["thread_id"]),
+                                                   configurable.get("checkpoint_ns", ""),
+                                                   get_checkpoint_id(config))
+        return self._tupla(registro) if registro else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        if not config:
+            raise ValueError("CheckpointerSesiones.list necesita un thread_id")
+        configurable = config["configurable"]
+        registros = self.almacen.listar_checkpoints(
+            str(configurable["thread_id"]), configurable.get("checkpoint_ns"),
+            get_checkpoint_id(before) if before else None, None if filter else limit)
+        devueltos = 0
+        # Del más reciente al más antiguo: los padres de un delta suelen venir después
+        registros = list(registros)
+        vistos = {registro.checkpoint_id: registro for registro in registros}
+        for registro in registros:
+            tupla = self._tupla(registro, vistos)
+            if filter and any(tupla.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            yield tupla
+            devueltos += 1
+            if limit and devueltos >= limit:
+                return
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        configurable = config["configurable"]
+        thread_id, ns = str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")
+        padre_id = configurable.get("checkpoint_id")
+        mensajes = checkpoint["channel_values"].get(CANAL_MENSAJES)
+        huellas = _huellas(mensajes) if isinstance(mensajes, list) else ()
+
+        # Delta solo si el padre es el último que escribió este proceso y sus
+        # mensajes siguen al principio de la lista (sin ediciones ni borrados)
+        with self._lock:
+            ultimo = self._ultimos.get((thread_id, ns))
+        forma, guardado, depende_de = COMPLETO, checkpoint, ()
+        if (self.delta and ultimo is not None and ultimo.checkpoint_id == padre_id and huellas
+                and len(ultimo.cadena) <= self.completo_cada
+                and huellas[:len(ultimo.huellas)] == ultimo.huellas):
+            forma, depende_de = DELTA, ultimo.cadena
+            nuevos = mensajes[len(ultimo.huellas):]
+            guardado = {**checkpoint, "channel_values": {**checkpoint["channel_values"], CANAL_MENSAJES: nuevos}}
+
+        tipo, datos = self.serde.dumps_typed(guardado)
+        compresion, datos = comprimir(datos)
+        self.almacen.guardar_checkpoint(RegistroCheckpoint(
+            thread_id, ns, checkpoint["id"], padre_id, f"{forma}.{compresion}.{tipo}", datos,
+            self._metadata_serde.dumps(metadata), depende_de))
+        metricas.incrementar("checkpoints_guardados_total", forma=forma)
+        metricas.incrementar("checkpoints_bytes_total", len(datos), forma=forma)
+
+        with self._lock:
+            self._ultimos[(thread_id, ns)] = _Ultimo(checkpoint["id"], huellas, depende_de + (checkpoint["id"],))
+            self._ultimos.move_to_end((thread_id, ns))
+            while len(self._ultimos) > MAX_HILOS_RECORDADOS:
+                self._ultimos.popitem(last=False)
+        return self._config(thread_id, ns, checkpoint["id"])
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        configurable = config["configurable"]
+        escrituras = [(task_id, WRITES_IDX_MAP.get(canal, idx), canal, *self.serde.dumps_typed(valor))
+                      for idx, (canal, valor) in enumerate(writes)]
+        self.almacen.guardar_escrituras(str(configurable["thread_id"]), configurable.get("checkpoint_ns", ""),
+                                        str(configurable["checkpoint_id"]), escrituras,
+                                        reemplazar=all(canal in WRITES_IDX_MAP for canal, _ in writes))
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            for clave in [c for c in self._ultimos if c[0] == str(thread_id)]:
+                del self._ultimos[clave]
+        self.almacen.eliminar_hilo(str(thread_id))
+
+    # --- Versiones asíncronas (el almacén es síncrono: se delega a un hilo) --
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        tuplas = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for tupla in tuplas:
+            yield tupla
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: Any) -> str:
+        """Igual que los checkpointers oficiales: contador + sufijo aleatorio, ordenable como texto"""
+        if current is None:
+            actual = 0
+        elif isinstance(current, int):
+            actual = current
+        else:
+            actual = int(current.split(".")[0])
+        return f"{actual + 1:032}.{random.random():016}"
@@ -0,0 +1,234 @@
+"""
+⚙️ TABLAS DE CONFIGURACIÓN
+Costos de presupuesto, actividades, aerolíneas, rutas populares y códigos
+IATA viven en datos/tablas.json. Se cargan y validan una sola vez, se
+congelan (solo lectura) y se recargan solas si el archivo cambia, así que
+se pueden ajustar precios y rutas sin redesplegar
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from functools import wraps
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, TypeVar
+
+# Versión del formato del archivo; se incrementa si cambia su estructura
+VERSION_FORMATO = 1
+
+# Junto al código (no en el directorio de trabajo): la app y la API pueden arrancarse desde cualquier sitio
+RUTA_TABLAS = os.getenv("TABLAS_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                      "datos", "tablas.json"))
+
+# Cada cuántos segundos, como mucho, se mira si el archivo cambió
+INTERVALO_RECARGA = float(os.getenv("TABLAS_INTERVALO_RECARGA", "5"))
+
+NIVELES_PRESUPUESTO = ("economico", "medio", "lujo")
+COLUMNAS_PRESUPUESTO = ("vuelo", "hotel_noche", "comida_dia", "actividades_dia", "transporte_dia", "otros_dia")
+NIVELES_ITINERARIO = ("bajo", "medio", "alto")
+# Nivel de calcular_presupuesto -> nivel equivalente de generar_itinerario
+NIVEL_ITINERARIO = dict(zip(NIVELES_PRESUPUESTO, NIVELES_ITINERARIO))
+CAMPOS_ITINERARIO = ("comida_dia", "actividad_dia", "transporte_dia")
+
+logger = logging.getLogger(__name__)
+
+class ErrorConfiguracion(ValueError):
+    """El archivo de tablas no existe, no es JSON válido o no cumple el esquema"""
+
+# ============================================================================
+# VALIDACIÓN
+# ============================================================================
+
+def _exigir(condicion: bool, mensaje: str):
+    if not condicion:
+        raise ErrorConfiguracion(mensaje)
+
+def _numero_positivo(valor: Any) -> bool:
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool) and valor >= 0
+
+def _lista_textos(valor: Any) -> bool:
+    return isinstance(valor, list) and bool(valor) and all(isinstance(v, str) for v in valor)
+
+def validar(datos: Dict[str, Any]):
+    """Comprueba la estructura completa; lanza ErrorConfiguracion con el primer problema"""
+    _exigir(isinstance(datos, dict), "la raíz debe ser un objeto")
+    _exigir(datos.get("formato") == VERSION_FORMATO,
+            f"formato {datos.get('formato')!r} no soportado (se espera {VERSION_FORMATO})")
+    _exigir(isinstance(datos.get("version"), str), "falta 'version'")
+
+    presupuesto = datos.get("presupuesto")
+    _exigir(isinstance(presupuesto, dict), "falta 'presupuesto'")
+    for nivel in NIVELES_PRESUPUESTO:
+        costos = presupuesto.get(nivel)
+        _exigir(isinstance(costos, dict), f"presupuesto: falta el nivel '{nivel}'")
+        for columna in COLUMNAS_PRESUPUESTO:
+            _exigir(_numero_positivo(costos.get(columna)), f"presupuesto.{nivel}.{columna} inválido")
+
+    itinerarios = datos.get("itinerarios")
+    _exigir(isinstance(itinerarios, dict), "falta 'itinerarios'")
+    _exigir(isinstance(itinerarios.get("por_presupuesto"), dict), "falta 'itinerarios.por_presupuesto'")
+    for nivel in NIVELES_ITINERARIO:
+        config = itinerarios["por_presupuesto"].get(nivel)
+        _exigir(isinstance(config, dict), f"itinerarios: falta el nivel '{nivel}'")
+        _exigir(_lista_textos(config.get("actividades")), f"itinerarios.{nivel}.actividades inválido")
+        for campo in CAMPOS_ITINERARIO:
+            _exigir(_numero_positivo(config.get(campo)), f"itinerarios.{nivel}.{campo} inválido")
+    for clave in ("llegada", "salida"):
+        _exigir(_lista_textos(itinerarios.get(clave)), f"itinerarios.{clave} inválido")
+
+    vuelos = datos.get("vuelos")
+    _exigir(isinstance(vuelos, dict), "falta 'vuelos'")
+    aerolineas = vuelos.get("aerolineas")
+    _exigir(isinstance(aerolineas, list) and bool(aerolineas), "vuelos.aerolineas vacío")
+    for aerolinea in aerolineas:
+        _exigir(isinstance(aerolinea, dict) and isinstance(aerolinea.get("nombre"), str)
+                and isinstance(aerolinea.get("codigo"), str), f"aerolínea inválida: {aerolinea!r}")
+    _exigir(isinstance(vuelos.get("rutas_populares", []), list), "vuelos.rutas_populares inválido")
+    for ruta in vuelos.get("rutas_populares", []):
+        _exigir(isinstance(ruta, list) and len(ruta) == 3 and isinstance(ruta[0], str)
+                and isinstance(ruta[1], str) and _numero_positivo(ruta[2]),
+                f"ruta popular inválida: {ruta!r}")
+    bandas = vuelos.get("bandas_tarifa")
+    _exigir(isinstance(bandas, list) and bool(bandas) and isinstance(bandas[-1], list)
+            and bool(bandas[-1]) and bandas[-1][0] is None,
+            "vuelos.bandas_tarifa debe terminar en una banda sin límite (null)")
+    for banda in bandas:
+        _exigir(isinstance(banda, list) and len(banda) == 3 and all(v is None or _numero_positivo(v) for v in banda),
+                f"banda de tarifa inválida: {banda!r}")
+    temporada = vuelos.get("temporada", {})
+    _exigir(isinstance(temporada, dict), "vuelos.temporada inválido")
+    _exigir(sorted(temporada) == sorted(str(m) for m in range(1, 13)), "vuelos.temporada necesita los 12 meses")
+    _exigir(all(_numero_positivo(v) for v in temporada.values()), "vuelos.temporada inválido")
+    _exigir(_lista_textos(vuelos.get("horas_salida")), "vuelos.horas_salida inválido")
+
+    codigos = datos.get("codigos_iata")
+    _exigir(isinstance(codigos, dict) and bool(codigos), "falta 'codigos_iata'")
+    _exigir(all(isinstance(v, str) and len(v) == 3 for v in codigos.values()), "codigos_iata inválido")
+
+# ============================================================================
+# NORMALIZACIÓN Y CONGELADO
+# ============================================================================
+
+def _congelar(valor: Any) -> Any:
+    """dict -> MappingProxyType, list -> tuple, de forma recursiva"""
+    if isinstance(valor, dict):
+        return MappingProxyType({k: _congelar(v) for k, v in valor.items()})
+    if isinstance(valor, list):
+        return tuple(_congelar(v) for v in valor)
+    return valor
+
+def _normalizar(datos: Dict[str, Any]) -> Dict[str, Any]:
+    """Convierte las partes del JSON que no tienen equivalente directo en Python"""
+    vuelos = dict(datos["vuelos"])
+    vuelos["rutas_populares"] = {(o.upper(), d.upper()): p for o, d, p in vuelos.get("rutas_populares", [])}
+    vuelos["bandas_tarifa"] = [(float("inf") if hasta is None else hasta, fijo, por_km)
+                               for hasta, fijo, por_km in vuelos["bandas_tarifa"]]
+    vuelos["temporada"] = {int(m): v for m, v in vuelos["temporada"].items()}
+    codigos = {ciudad.lower(): iata.upper() for ciudad, iata in datos["codigos_iata"].items()}
+    return {**datos, "vuelos": vuelos, "codigos_iata": codigos}
+
+def leer_tablas(ruta: str) -> Mapping[str, Any]:
+    """Lee, valida y congela el archivo de tablas"""
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ErrorConfiguracion(f"no se pudo leer {ruta}: {e}") from e
+    try:
+        validar(datos)
+        return _congelar(_normalizar(datos))
+    except ErrorConfiguracion:
+        raise
+    except Exception as e:
+        # Tipos inesperados que validar no previó: también es un archivo inválido
+        raise ErrorConfiguracion(f"{ruta} no cumple el esquema ({type(e).__name__}: {e})") from e
+
+# ============================================================================
+# CARGA ÚNICA CON RECARGA EN CALIENTE
+# ============================================================================
+
+class TablasConfiguracion:
+    """
+    Instantánea inmutable de las tablas. `actual()` es barato: solo mira la
+    fecha de modificación del archivo cada `intervalo` segundos. Si la nueva
+    versión no valida se conserva la anterior.
+    """
+    def __init__(self, ruta: str = RUTA_TABLAS, intervalo: float = INTERVALO_RECARGA):
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._suscriptores: List[Callable[[], None]] = []
+        self._mtime = os.path.getmtime(ruta) if os.path.exists(ruta) else None
+        self._tablas = leer_tablas(ruta)
+        self._proxima_revision = time.monotonic() + intervalo
+
+    @property
+    def version(self) -> str:
+        return self._tablas["version"]
+
+    def actual(self) -> Mapping[str, Any]:
+        if time.monotonic() >= self._proxima_revision:
+            self._revisar()
+        return self._tablas
+
+    def __getitem__(self, seccion: str) -> Any:
+        return self.actual()[seccion]
+
+    def al_recargar(self, callback: Callable[[], None]):
+        """Registra una función a llamar tras cada recarga (p. ej. limpiar cachés derivadas)"""
+        self._suscriptores.append(callback)
+
+    def recargar(self) -> bool:
+        """Fuerza la lectura del archivo; devuelve True si se aplicó una versión nueva"""
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(self.ruta)
+            except OSError as e:
+                logger.warning("Tablas de configuración no recargadas (%s); se mantiene la versión %s",
+                               e, self.version)
+                return False
+            # Aunque falle: esa versión del archivo no se vuelve a leer hasta que cambie
+            self._mtime = mtime
+            try:
+                tablas = leer_tablas(self.ruta)
+            except ErrorConfiguracion as e:
+                logger.warning("Tablas de configuración no recargadas (%s); se mantiene la versión %s",
+                               e, self.version)
+                return False
+            self._tablas = tablas
+        logger.info("Tablas de configuración recargadas (versión %s)", self.version)
+        for callback in self._suscriptores:
+            callback()
+        return True
+
+    def _revisar(self):
+        self._proxima_revision = time.monotonic() + self.intervalo
+        try:
+            mtime = os.path.getmtime(self.ruta)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.recargar()
+
+T = TypeVar("T")
+
+def derivado(funcion: Callable[[Mapping[str, Any]], T]) -> Callable[[], T]:
+    """
+    Memoriza una estructura calculada a partir de las tablas (índices,
+    matrices NumPy...) y la recalcula solo cuando cambia la instantánea
+    """
+    cache: Dict[str, Any] = {"tablas": None, "valor": None}
+
+    @wraps(funcion)
+    def envoltura() -> T:
+        tablas = tablas_config.actual()
+        if cache["tablas"] is not tablas:
+            cache["valor"] = funcion(tablas)
+            cache["tablas"] = tablas
+        return cache["valor"]
+    return envoltura
+
+# Instancia global: se carga al importar (un archivo inválido impide arrancar)
+tablas_config = TablasConfiguracion()
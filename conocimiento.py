@@ -0,0 +1,138 @@
+"""
+📚 PAQUETE OFFLINE DE DESTINOS
+Base SQLite de solo lectura con resumen, país, población, coordenadas y
+banda climática de las ciudades conocidas. Se genera con construir_paquete.py
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+# Versión del formato del paquete; se incrementa si cambia el esquema
+VERSION_FORMATO = 1
+
+# Junto al código (no en el directorio de trabajo): la app y la API pueden arrancarse desde cualquier sitio
+RUTA_PAQUETE = os.getenv("PAQUETE_DESTINOS", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                          "datos", "destinos.sqlite"))
+
+ESQUEMA = """
+CREATE TABLE meta (clave TEXT PRIMARY KEY, valor TEXT) WITHOUT ROWID;
+CREATE TABLE destinos (
+    id INTEGER PRIMARY KEY,
+    iata TEXT,
+    idioma TEXT NOT NULL,
+    titulo TEXT NOT NULL,
+    resumen TEXT NOT NULL,
+    pais TEXT,
+    poblacion INTEGER,
+    lat REAL,
+    lon REAL,
+    clima TEXT
+);
+CREATE TABLE alias (
+    nombre TEXT NOT NULL,
+    idioma TEXT NOT NULL,
+    destino_id INTEGER NOT NULL REFERENCES destinos(id),
+    PRIMARY KEY (nombre, idioma)
+) WITHOUT ROWID;
+"""
+
+def banda_climatica(lat: float) -> str:
+    """Clima general por latitud (mismo criterio que info_destino)"""
+    return "tropical" if abs(lat) < 23.5 else "templado" if abs(lat) < 66.5 else "frío"
+
+# ============================================================================
+# LECTURA
+# ============================================================================
+
+class PaqueteDestinos:
+    """Acceso de solo lectura al paquete; si el archivo no existe queda desactivado"""
+    def __init__(self, ruta: str = RUTA_PAQUETE):
+        self.ruta = ruta
+        self.version: Optional[str] = None
+        self._conexion: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._abrir()
+
+    def _abrir(self):
+        if not os.path.exists(self.ruta):
+            return
+        try:
+            conexion = sqlite3.connect(f"file:{self.ruta}?mode=ro&immutable=1", uri=True,
+                                       check_same_thread=False)
+            meta = dict(conexion.execute("SELECT clave, valor FROM meta"))
+        except sqlite3.Error:
+            return
+        if meta.get("formato") != str(VERSION_FORMATO):
+            conexion.close()
+            return
+        self._conexion = conexion
+        self.version = meta.get("version")
+
+    @property
+    def disponible(self) -> bool:
+        return self._conexion is not None
+
+    def buscar(self, ciudad: str, idioma: str = "es") -> Optional[Dict[str, Any]]:
+        if self._conexion is None:
+            return None
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT d.titulo, d.resumen, d.pais, d.poblacion, d.lat, d.lon, d.clima, d.iata "
+                "FROM alias a JOIN destinos d ON d.id = a.destino_id "
+                "WHERE a.nombre = ? AND a.idioma = ?",
+                (ciudad.strip().lower(), idioma),
+            ).fetchone()
+        if fila is None:
+            return None
+        campos = ("titulo", "resumen", "pais", "poblacion", "lat", "lon", "clima", "iata")
+        return dict(zip(campos, fila))
+
+# ============================================================================
+# ESCRITURA (paso de build)
+# ============================================================================
+
+def escribir_paquete(ruta: str, registros: Iterable[Dict[str, Any]], version: str) -> int:
+    """
+    Escribe un paquete nuevo de forma atómica. Cada registro lleva
+    iata, idioma, titulo, resumen, pais, poblacion, lat, lon y la lista `alias`.
+    """
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    temporal = ruta + ".tmp"
+    if os.path.exists(temporal):
+        os.remove(temporal)
+
+    conexion = sqlite3.connect(temporal)
+    total = 0
+    try:
+        conexion.executescript(ESQUEMA)
+        for registro in registros:
+            cursor = conexion.execute(
+                "INSERT INTO destinos (iata, idioma, titulo, resumen, pais, poblacion, lat, lon, clima) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (registro.get("iata"), registro["idioma"], registro["titulo"], registro["resumen"],
+                 registro.get("pais"), registro.get("poblacion"), registro.get("lat"), registro.get("lon"),
+                 banda_climatica(registro["lat"]) if registro.get("lat") is not None else None),
+            )
+            conexion.executemany(
+                "INSERT OR IGNORE INTO alias (nombre, idioma, destino_id) VALUES (?, ?, ?)",
+                [(alias.lower(), registro["idioma"], cursor.lastrowid) for alias in registro["alias"]],
+            )
+            total += 1
+        conexion.executemany("INSERT INTO meta (clave, valor) VALUES (?, ?)", [
+            ("formato", str(VERSION_FORMATO)),
+            ("version", version),
+            ("generado", datetime.now().isoformat(timespec="seconds")),
+            ("destinos", str(total)),
+        ])
+        conexion.commit()
+        conexion.execute("VACUUM")
+    finally:
+        conexion.close()
+    os.replace(temporal, ruta)
+    return total
+
+# Instancia global
+paquete_destinos = PaqueteDestinos()
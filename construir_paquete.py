@@ -0,0 +1,61 @@
+"""
+🏗️ CONSTRUCCIÓN DEL PAQUETE OFFLINE DE DESTINOS
+Descarga una vez de Wikipedia y Open-Meteo la información de las ciudades
+conocidas y la guarda en datos/destinos.sqlite
+
+Uso:
+    python construir_paquete.py [--idiomas es,en] [--salida datos/destinos.sqlite]
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+from asistente import geocodificar, resumen_wikipedia
+from configuracion import tablas_config
+from conocimiento import RUTA_PAQUETE, escribir_paquete
+
+def agrupar_alias() -> Dict[str, List[str]]:
+    """Código IATA -> variantes de nombre (la primera se usa para consultar)"""
+    grupos: Dict[str, List[str]] = defaultdict(list)
+    for nombre, iata in tablas_config["codigos_iata"].items():
+        grupos[iata].append(nombre)
+    return grupos
+
+def registros(idiomas: List[str]) -> Iterator[Dict]:
+    for iata, alias in agrupar_alias().items():
+        ciudad = alias[0]
+        geo = geocodificar(ciudad) or {}
+        for idioma in idiomas:
+            wiki = resumen_wikipedia(ciudad, idioma)
+            if not wiki:
+                print(f"⚠️ Sin resumen para {ciudad} ({idioma})")
+                continue
+            titulo, resumen = wiki
+            print(f"✅ {titulo} ({idioma})")
+            yield {
+                "iata": iata,
+                "idioma": idioma,
+                "titulo": titulo,
+                "resumen": resumen,
+                "pais": geo.get("country"),
+                "poblacion": geo.get("population"),
+                "lat": geo.get("latitude"),
+                "lon": geo.get("longitude"),
+                "alias": alias + [titulo],
+            }
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera el paquete offline de destinos")
+    parser.add_argument("--idiomas", default="es", help="Idiomas separados por comas (es,en)")
+    parser.add_argument("--salida", default=RUTA_PAQUETE, help="Ruta del archivo SQLite")
+    parser.add_argument("--version", default=datetime.now().strftime("%Y.%m.%d"),
+                        help="Versión del contenido del paquete")
+    args = parser.parse_args()
+
+    total = escribir_paquete(args.salida, registros(args.idiomas.split(",")), args.version)
+    print(f"\n📦 Paquete {args.version} escrito en {args.salida} ({total} destinos)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+🧮 CONSUMO DE TOKENS Y COSTE
+Cuenta los tokens de prompt y de respuesta de cada llamada al modelo y los
+atribuye al turno, a la sesión y a las herramientas cuyo resultado ocupa el
+contexto. Con un presupuesto de tokens por sesión, al superarlo se compacta
+el historial que se envía al modelo y/o se cambia a un modelo más barato
+"""
+
+import os
+import threading
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import LLMResult
+
+from metricas import metricas
+
+# Tokens por sesión antes de aplicar ACCION_PRESUPUESTO (0 = sin límite)
+PRESUPUESTO_TOKENS_SESION = int(os.getenv("PRESUPUESTO_TOKENS_SESION", "0"))
+
+# Qué hacer al superarlo: 'compactar', 'modelo' o 'ambos'
+ACCION_PRESUPUESTO = os.getenv("ACCION_PRESUPUESTO", "compactar")
+
+# Modelo al que se pasa con ACCION_PRESUPUESTO=modelo|ambos
+MODELO_ECONOMICO = os.getenv("OPENAI_MODEL_ECONOMICO", "gpt-4.1-nano")
+
+# Mensajes del historial que se siguen enviando al compactar
+MENSAJES_COMPACTADOS = int(os.getenv("HISTORIAL_COMPACTO", "12"))
+
+# USD por millón de tokens (prompt, respuesta); los modelos que no están cuentan 0
+PRECIOS_MODELOS = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+def precio_modelo(modelo: str) -> tuple:
+    """Precio del modelo; las versiones con fecha (gpt-4o-mini-2024-07-18) usan el de su familia"""
+    for nombre in sorted(PRECIOS_MODELOS, key=len, reverse=True):
+        if modelo == nombre or modelo.startswith(nombre + "-"):
+            return PRECIOS_MODELOS[nombre]
+    return (0.0, 0.0)
+
+# ============================================================================
+# ACUMULADOR
+# ============================================================================
+
+class ConsumoTokens:
+    """Tokens y coste acumulados (de un turno o de una sesión)"""
+    def __init__(self):
+        self.prompt = 0
+        self.respuesta = 0
+        self.llamadas = 0
+        self.coste = 0.0
+        self.por_herramienta: Dict[str, int] = {}
+
+    @property
+    def total(self) -> int:
+        return self.prompt + self.respuesta
+
+    def sumar(self, otro: "ConsumoTokens") -> "ConsumoTokens":
+        self.prompt += otro.prompt
+        self.respuesta += otro.respuesta
+        self.llamadas += otro.llamadas
+        self.coste += otro.coste
+        for herramienta, tokens in otro.por_herramienta.items():
+            self.por_herramienta[herramienta] = self.por_herramienta.get(herramienta, 0) + tokens
+        return self
+
+    def a_dict(self) -> Dict[str, Any]:
+        """Forma serializable (JSON) para guardar en el almacén de sesiones"""
+        return {"prompt": self.prompt, "respuesta": self.respuesta, "llamadas": self.llamadas,
+                "coste": round(self.coste, 6), "por_herramienta": dict(self.por_herramienta)}
+
+    @classmethod
+    def desde_dict(cls, datos: Optional[Dict[str, Any]]) -> "ConsumoTokens":
+        consumo = cls()
+        if datos:
+            consumo.prompt = datos.get("prompt", 0)
+            consumo.respuesta = datos.get("respuesta", 0)
+            consumo.llamadas = datos.get("llamadas", 0)
+            consumo.coste = datos.get("coste", 0.0)
+            consumo.por_herramienta = dict(datos.get("por_herramienta", {}))
+        return consumo
+
+# ============================================================================
+# CALLBACK
+# ============================================================================
+
+class ContadorTokens(BaseCallbackHandler):
+    """
+    Se pasa en config["callbacks"] de cada turno. Los tokens de prompt de cada
+    llamada se reparten entre las herramientas en proporción al tamaño de sus
+    resultados dentro del contexto enviado
+    """
+    def __init__(self):
+        self.turno = ConsumoTokens()
+        self._reparto: Dict[UUID, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], *,
+                            run_id: UUID, **kwargs: Any) -> None:
+        mensajes = messages[0] if messages else []
+        tamanos = [len(str(m.content)) for m in mensajes]
+        total = sum(tamanos) or 1
+        reparto: Dict[str, float] = {}
+        for mensaje, tamano in zip(mensajes, tamanos):
+            if isinstance(mensaje, ToolMessage):
+                nombre = mensaje.name or "herramienta"
+                reparto[nombre] = reparto.get(nombre, 0.0) + tamano / total
+        with self._lock:
+            self._reparto[run_id] = reparto
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        prompt = respuesta = 0
+        modelo = (response.llm_output or {}).get("model_name", "")
+        for generaciones in response.generations:
+            for generacion in generaciones:
+                mensaje = getattr(generacion, "message", None)
+                uso = getattr(mensaje, "usage_metadata", None)
+                if uso:
+                    prompt += uso.get("input_tokens", 0)
+                    respuesta += uso.get("output_tokens", 0)
+                    modelo = modelo or mensaje.response_metadata.get("model_name", "")
+        if not prompt and not respuesta:
+            uso = (response.llm_output or {}).get("token_usage") or {}
+            prompt, respuesta = uso.get("prompt_tokens", 0), uso.get("completion_tokens", 0)
+
+        precio_prompt, precio_respuesta = precio_modelo(modelo)
+        coste = (prompt * precio_prompt + respuesta * precio_respuesta) / 1_000_000
+        with self._lock:
+            reparto = self._reparto.pop(run_id, {})
+            self.turno.prompt += prompt
+            self.turno.respuesta += respuesta
+            self.turno.llamadas += 1
+            self.turno.coste += coste
+            for herramienta, fraccion in reparto.items():
+                tokens = round(prompt * fraccion)
+                self.turno.por_herramienta[herramienta] = self.turno.por_herramienta.get(herramienta, 0) + tokens
+                metricas.incrementar("llm_tokens_herramienta_total", tokens, herramienta=herramienta)
+
+        etiqueta = modelo or "desconocido"
+        metricas.incrementar("llm_llamadas_total", modelo=etiqueta)
+        metricas.incrementar("llm_tokens_total", prompt, tipo="prompt", modelo=etiqueta)
+        metricas.incrementar("llm_tokens_total", respuesta, tipo="respuesta", modelo=etiqueta)
+        metricas.incrementar("llm_coste_usd_total", coste, modelo=etiqueta)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._reparto.pop(run_id, None)
+
+# ============================================================================
+# PRESUPUESTO POR SESIÓN
+# ============================================================================
+
+def config_turno(config: Dict[str, Any], sesion: ConsumoTokens,
+                 contador: Optional[ContadorTokens] = None) -> Dict[str, Any]:
+    """
+    Config del turno: añade el contador a los callbacks y, si la sesión ya
+    superó PRESUPUESTO_TOKENS_SESION, las opciones que leen el agente
+    (compactar_historial) y el modelo configurable (modelo_llm)
+    """
+    configurable = dict(config.get("configurable", {}))
+    if PRESUPUESTO_TOKENS_SESION and sesion.total >= PRESUPUESTO_TOKENS_SESION:
+        if ACCION_PRESUPUESTO in ("compactar", "ambos"):
+            configurable["compactar_historial"] = True
+        if ACCION_PRESUPUESTO in ("modelo", "ambos"):
+            configurable["modelo_llm"] = MODELO_ECONOMICO
+        metricas.incrementar("llm_presupuesto_excedido_total", accion=ACCION_PRESUPUESTO)
+    callbacks = list(config.get("callbacks") or [])
+    if contador is not None:
+        callbacks.append(contador)
+    return {**config, "configurable": configurable, "callbacks": callbacks}
+
+def compactar(mensajes: List[BaseMessage], maximo: int = MENSAJES_COMPACTADOS) -> List[BaseMessage]:
+    """
+    Últimos `maximo` mensajes, empezando siempre en un mensaje del usuario; el
+    turno en curso se envía entero aunque sea más largo
+    """
+    if len(mensajes) <= maximo:
+        return list(mensajes)
+    inicio = len(mensajes) - maximo
+    humanos = [i for i, m in enumerate(mensajes) if isinstance(m, HumanMessage)]
+    corte = next((i for i in humanos if i >= inicio), humanos[-1] if humanos else 0)
+    return list(mensajes[corte:])
@@ -0,0 +1,243 @@
+"""
+🗺️ ÍNDICE GEOGRÁFICO LOCAL
+Coordenadas, hemisferio y zona climática de Köppen para ciudades y países,
+resueltos en memoria sin llamadas de red
+"""
+
+from typing import Dict, NamedTuple, Optional, Tuple
+import unicodedata
+
+# ============================================================================
+# DATOS DE REFERENCIA
+# ============================================================================
+
+# Coordenadas (lat, lon) del aeropuerto principal de cada código IATA
+AEROPUERTOS: Dict[str, Tuple[float, float]] = {
+    # Sudamérica
+    "LIM": (-12.02, -77.11), "CUZ": (-13.54, -71.94), "AQP": (-16.34, -71.58),
+    "BUE": (-34.82, -58.54), "SCL": (-33.39, -70.79), "BOG": (4.70, -74.15),
+    "MDE": (6.16, -75.42), "CTG": (10.44, -75.51), "UIO": (-0.13, -78.36),
+    "GYE": (-2.16, -79.88), "GIG": (-22.81, -43.25), "GRU": (-23.43, -46.47),
+    "BSB": (-15.87, -47.92), "MVD": (-34.84, -56.03), "ASU": (-25.24, -57.52),
+    "LPB": (-16.51, -68.19), "CCS": (10.60, -66.99),
+    # Norteamérica
+    "NYC": (40.64, -73.78), "MIA": (25.80, -80.29), "LAX": (33.94, -118.41),
+    "CHI": (41.98, -87.90), "HOU": (29.98, -95.34), "SFO": (37.62, -122.38),
+    "WAS": (38.95, -77.46), "BOS": (42.36, -71.01), "LAS": (36.08, -115.15),
+    "MCO": (28.43, -81.31), "SEA": (47.45, -122.31), "MEX": (19.44, -99.07),
+    "CUN": (21.04, -86.87), "GDL": (20.52, -103.31), "YYZ": (43.68, -79.63),
+    "YVR": (49.19, -123.18), "YUL": (45.47, -73.74),
+    # Europa
+    "MAD": (40.49, -3.57), "BCN": (41.30, 2.08), "SVQ": (37.42, -5.90),
+    "PAR": (49.01, 2.55), "LON": (51.47, -0.45), "ROM": (41.80, 12.25),
+    "MIL": (45.63, 8.72), "BER": (52.37, 13.50), "AMS": (52.31, 4.76),
+    "BRU": (50.90, 4.48), "VIE": (48.11, 16.57), "PRG": (50.10, 14.26),
+    "LIS": (38.77, -9.13), "DUB": (53.42, -6.27), "ATH": (37.94, 23.94),
+    "IST": (41.26, 28.74), "MOW": (55.97, 37.41), "ZRH": (47.46, 8.55),
+    # Asia
+    "TYO": (35.55, 139.78), "BKK": (13.69, 100.75), "SIN": (1.36, 103.99),
+    "HKG": (22.31, 113.91), "DXB": (25.25, 55.36), "DEL": (28.56, 77.10),
+    "BOM": (19.09, 72.87), "SHA": (31.14, 121.81), "BJS": (40.08, 116.58),
+    "SEL": (37.46, 126.44), "TPE": (25.08, 121.23), "MNL": (14.51, 121.02),
+    # Oceanía
+    "SYD": (-33.95, 151.18), "MEL": (-37.67, 144.84), "AKL": (-37.01, 174.79),
+}
+
+# País y zona climática de Köppen de cada ciudad con código IATA
+CLIMA_IATA: Dict[str, Tuple[str, str]] = {
+    "LIM": ("Perú", "BWh"), "CUZ": ("Perú", "Cwb"), "AQP": ("Perú", "BWk"),
+    "BUE": ("Argentina", "Cfa"), "SCL": ("Chile", "Csb"), "BOG": ("Colombia", "Cfb"),
+    "MDE": ("Colombia", "Af"), "CTG": ("Colombia", "Aw"), "UIO": ("Ecuador", "Cfb"),
+    "GYE": ("Ecuador", "Aw"), "GIG": ("Brasil", "Aw"), "GRU": ("Brasil", "Cfa"),
+    "BSB": ("Brasil", "Aw"), "MVD": ("Uruguay", "Cfa"), "ASU": ("Paraguay", "Cfa"),
+    "LPB": ("Bolivia", "Cwc"), "CCS": ("Venezuela", "Aw"),
+    "NYC": ("Estados Unidos", "Cfa"), "MIA": ("Estados Unidos", "Am"),
+    "LAX": ("Estados Unidos", "Csb"), "CHI": ("Estados Unidos", "Dfa"),
+    "HOU": ("Estados Unidos", "Cfa"), "SFO": ("Estados Unidos", "Csb"),
+    "WAS": ("Estados Unidos", "Cfa"), "BOS": ("Estados Unidos", "Dfa"),
+    "LAS": ("Estados Unidos", "BWh"), "MCO": ("Estados Unidos", "Cfa"),
+    "SEA": ("Estados Unidos", "Csb"), "MEX": ("México", "Cwb"), "CUN": ("México", "Aw"),
+    "GDL": ("México", "Cwa"), "YYZ": ("Canadá", "Dfb"), "YVR": ("Canadá", "Cfb"),
+    "YUL": ("Canadá", "Dfb"),
+    "MAD": ("España", "Csa"), "BCN": ("España", "Csa"), "SVQ": ("España", "Csa"),
+    "PAR": ("Francia", "Cfb"), "LON": ("Reino Unido", "Cfb"), "ROM": ("Italia", "Csa"),
+    "MIL": ("Italia", "Cfa"), "BER": ("Alemania", "Dfb"), "AMS": ("Países Bajos", "Cfb"),
+    "BRU": ("Bélgica", "Cfb"), "VIE": ("Austria", "Dfb"), "PRG": ("República Checa", "Dfb"),
+    "LIS": ("Portugal", "Csa"), "DUB": ("Irlanda", "Cfb"), "ATH": ("Grecia", "Csa"),
+    "IST": ("Turquía", "Csa"), "MOW": ("Rusia", "Dfb"), "ZRH": ("Suiza", "Cfb"),
+    "TYO": ("Japón", "Cfa"), "BKK": ("Tailandia", "Aw"), "SIN": ("Singapur", "Af"),
+    "HKG": ("China", "Cwa"), "DXB": ("Emiratos Árabes Unidos", "BWh"),
+    "DEL": ("India", "Cwa"), "BOM": ("India", "Am"), "SHA": ("China", "Cfa"),
+    "BJS": ("China", "Dwa"), "SEL": ("Corea del Sur", "Dwa"), "TPE": ("Taiwán", "Cfa"),
+    "MNL": ("Filipinas", "Aw"),
+    "SYD": ("Australia", "Cfa"), "MEL": ("Australia", "Cfb"), "AKL": ("Nueva Zelanda", "Cfb"),
+}
+
+# Destinos turísticos sin aeropuerto propio en la tabla y países:
+# nombre -> (lat, lon, país, Köppen predominante)
+LUGARES_EXTRA: Dict[str, Tuple[float, float, str, str]] = {
+    "machu picchu": (-13.16, -72.55, "Perú", "Cwb"),
+    "valle sagrado": (-13.33, -72.08, "Perú", "Cwb"),
+    "bariloche": (-41.13, -71.31, "Argentina", "Csb"),
+    "ushuaia": (-54.80, -68.30, "Argentina", "ET"),
+    "mendoza": (-32.89, -68.83, "Argentina", "BWk"),
+    "san pedro de atacama": (-22.91, -68.20, "Chile", "BWk"),
+    "galapagos": (-0.74, -90.31, "Ecuador", "BWh"),
+    "punta cana": (18.58, -68.40, "República Dominicana", "Aw"),
+    "tulum": (20.21, -87.47, "México", "Aw"),
+    "playa del carmen": (20.63, -87.08, "México", "Aw"),
+    "la habana": (23.11, -82.37, "Cuba", "Aw"),
+    "florencia": (43.77, 11.26, "Italia", "Cfa"),
+    "venecia": (45.44, 12.32, "Italia", "Cfa"),
+    "ibiza": (38.91, 1.43, "España", "Csa"),
+    "mallorca": (39.57, 2.65, "España", "Csa"),
+    "granada": (37.18, -3.60, "España", "Csa"),
+    "oporto": (41.15, -8.61, "Portugal", "Csb"),
+    "santorini": (36.39, 25.46, "Grecia", "BSh"),
+    "kioto": (35.01, 135.77, "Japón", "Cfa"),
+    "bali": (-8.41, 115.19, "Indonesia", "Af"),
+    "phuket": (7.88, 98.39, "Tailandia", "Am"),
+    "maldivas": (3.20, 73.22, "Maldivas", "Af"),
+    "el cairo": (30.04, 31.24, "Egipto", "BWh"),
+    "marrakech": (31.63, -7.99, "Marruecos", "BSh"),
+    "ciudad del cabo": (-33.92, 18.42, "Sudáfrica", "Csb"),
+    # Países (centro aproximado del área turística principal)
+    "peru": (-12.05, -77.04, "Perú", "BWh"),
+    "argentina": (-34.60, -58.38, "Argentina", "Cfa"),
+    "chile": (-33.45, -70.67, "Chile", "Csb"),
+    "colombia": (4.71, -74.07, "Colombia", "Cfb"),
+    "ecuador": (-0.18, -78.47, "Ecuador", "Cfb"),
+    "brasil": (-22.91, -43.17, "Brasil", "Aw"),
+    "uruguay": (-34.90, -56.16, "Uruguay", "Cfa"),
+    "bolivia": (-16.50, -68.15, "Bolivia", "Cwc"),
+    "mexico": (19.43, -99.13, "México", "Cwb"),
+    "cuba": (23.11, -82.37, "Cuba", "Aw"),
+    "costa rica": (9.93, -84.08, "Costa Rica", "Aw"),
+    "estados unidos": (40.71, -74.01, "Estados Unidos", "Cfa"),
+    "canada": (43.65, -79.38, "Canadá", "Dfb"),
+    "espana": (40.42, -3.70, "España", "Csa"),
+    "francia": (48.86, 2.35, "Francia", "Cfb"),
+    "italia": (41.90, 12.50, "Italia", "Csa"),
+    "portugal": (38.72, -9.14, "Portugal", "Csa"),
+    "alemania": (52.52, 13.40, "Alemania", "Dfb"),
+    "reino unido": (51.51, -0.13, "Reino Unido", "Cfb"),
+    "grecia": (37.98, 23.73, "Grecia", "Csa"),
+    "turquia": (41.01, 28.98, "Turquía", "Csa"),
+    "japon": (35.68, 139.69, "Japón", "Cfa"),
+    "tailandia": (13.76, 100.50, "Tailandia", "Aw"),
+    "china": (39.90, 116.40, "China", "Dwa"),
+    "india": (28.61, 77.21, "India", "Cwa"),
+    "australia": (-33.87, 151.21, "Australia", "Cfa"),
+    "nueva zelanda": (-36.85, 174.76, "Nueva Zelanda", "Cfb"),
+    "egipto": (30.04, 31.24, "Egipto", "BWh"),
+    "marruecos": (31.63, -7.99, "Marruecos", "BSh"),
+}
+
+# Altitud (m) de los destinos de altura conocidos: su clima depende más de
+# la altitud que del hemisferio (días templados, noches frías todo el año)
+ALTITUD_IATA: Dict[str, int] = {
+    "CUZ": 3400, "LPB": 3640, "BOG": 2640, "UIO": 2850, "MEX": 2240,
+}
+ALTITUD_EXTRA: Dict[str, int] = {
+    "machu picchu": 2430, "valle sagrado": 2900, "bolivia": 3640, "mexico": 2240,
+}
+# A partir de esta altitud se usan las recomendaciones de clima de altura
+ALTITUD_MONTANA = 2000
+
+KOPPEN_DESCRIPCION = {
+    "Af": "Tropical lluvioso", "Am": "Tropical monzónico", "Aw": "Tropical de sabana",
+    "BWh": "Desértico cálido", "BWk": "Desértico frío", "BSh": "Semiárido cálido",
+    "BSk": "Semiárido frío",
+    "Csa": "Mediterráneo", "Csb": "Mediterráneo templado", "Cfa": "Subtropical húmedo",
+    "Cfb": "Oceánico", "Cwa": "Subtropical con invierno seco", "Cwb": "Templado de altura",
+    "Cwc": "Frío de altura",
+    "Dfa": "Continental húmedo", "Dfb": "Continental", "Dwa": "Continental con invierno seco",
+    "ET": "Tundra", "EF": "Polar", "H": "De montaña",
+}
+
+# ============================================================================
+# ÍNDICE
+# ============================================================================
+
+class Lugar(NamedTuple):
+    nombre: str
+    lat: float
+    lon: float
+    pais: str
+    koppen: Optional[str]
+    altitud: Optional[float] = None
+
+    @property
+    def hemisferio(self) -> str:
+        return "sur" if self.lat < 0 else "norte"
+
+    @property
+    def grupo_climatico(self) -> str:
+        """Letra principal de Köppen (A-E); por latitud si no se conoce"""
+        if self.koppen:
+            return self.koppen[0]
+        return "A" if abs(self.lat) < 23.5 else "C" if abs(self.lat) < 66.5 else "E"
+
+    @property
+    def de_altura(self) -> bool:
+        """Clima de montaña: Köppen H, templados de altura (Cwb/Cwc) o altitud conocida"""
+        if self.altitud is not None and self.altitud >= ALTITUD_MONTANA:
+            return True
+        return bool(self.koppen) and (self.koppen[0] == "H" or self.koppen in ("Cwb", "Cwc"))
+
+    @property
+    def invierno_seco(self) -> bool:
+        """Climas 'w' (Cw*/Dw*): lluvias en verano y un invierno seco"""
+        return bool(self.koppen) and self.koppen[0] in "CD" and self.koppen[1:2] == "w"
+
+    @property
+    def descripcion_clima(self) -> str:
+        return KOPPEN_DESCRIPCION.get(self.koppen or "", "Sin clasificar")
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes, para que 'Perú' y 'peru' coincidan"""
+    sin_tildes = unicodedata.normalize("NFKD", texto.strip().lower())
+    return "".join(c for c in sin_tildes if not unicodedata.combining(c))
+
+LUGARES_IATA: Dict[str, Lugar] = {
+    iata: Lugar(iata, *AEROPUERTOS[iata], *CLIMA_IATA[iata], ALTITUD_IATA.get(iata))
+    for iata in AEROPUERTOS
+}
+LUGARES_NOMBRE: Dict[str, Lugar] = {
+    normalizar(nombre): Lugar(nombre, *datos, ALTITUD_EXTRA.get(nombre))
+    for nombre, datos in LUGARES_EXTRA.items()
+}
+
+def ubicar(nombre: str, codigo_iata: Optional[str] = None) -> Optional[Lugar]:
+    """Busca un lugar por código IATA (si se conoce) o por nombre de ciudad/país"""
+    if codigo_iata and codigo_iata in LUGARES_IATA:
+        return LUGARES_IATA[codigo_iata]
+    return LUGARES_NOMBRE.get(normalizar(nombre))
+
+# ============================================================================
+# TEMPORADAS
+# ============================================================================
+
+def estacion(lugar: Lugar, mes: int) -> str:
+    """'verano', 'invierno' o 'transicion' según mes y hemisferio"""
+    verano = {6, 7, 8} if lugar.hemisferio == "norte" else {12, 1, 2}
+    invierno = {12, 1, 2} if lugar.hemisferio == "norte" else {6, 7, 8}
+    if mes in verano:
+        return "verano"
+    if mes in invierno:
+        return "invierno"
+    return "transicion"
+
+def es_temporada_lluvias(lugar: Lugar, mes: int) -> bool:
+    """
+    Lluvias en climas con estación seca: en los 'w' y monzónicos llueve en
+    el verano astronómico; en los 's' (mediterráneos) en invierno.
+    """
+    if lugar.koppen in ("Af",):
+        return True
+    verano_extendido = set(range(5, 11)) if lugar.hemisferio == "norte" else {11, 12, 1, 2, 3, 4}
+    if lugar.koppen and (lugar.koppen in ("Am", "Aw") or lugar.koppen[1:2] == "w"):
+        return mes in verano_extendido
+    if lugar.koppen and lugar.koppen[1:2] == "s":
+        return mes not in verano_extendido
+    return False
@@ -0,0 +1,84 @@
+"""
+📅 CONSTRUCCIÓN DE ITINERARIOS
+Lógica pura (sin LangChain) para generar itinerarios día a día; la usan
+la herramienta generar_itinerario y la generación por lotes
+"""
+
+import random
+from typing import Any, Dict, List, Optional
+
+from configuracion import tablas_config
+from precios import formatear_importe
+
+# Actividades y gastos diarios por nivel: tabla "itinerarios" de datos/tablas.json
+
+def rng_itinerario(destino: str, dias: int, presupuesto: str, semilla: Any) -> random.Random:
+    """Generador reproducible para una combinación (destino, días, presupuesto, semilla)"""
+    return random.Random(f"{destino.lower()}|{dias}|{presupuesto.lower()}|{semilla}")
+
+# ============================================================================
+# PLAN Y FORMATO
+# ============================================================================
+
+def planificar_itinerario(destino: str, dias: int, presupuesto: str = "medio",
+                          num_personas: int = 1, rng: Optional[random.Random] = None) -> Dict[str, Any]:
+    """Itinerario estructurado: lista de días con actividades y gastos"""
+    rng = rng or random.Random()
+    tablas = tablas_config["itinerarios"]
+    config = tablas["por_presupuesto"].get(presupuesto.lower(), tablas["por_presupuesto"]["medio"])
+    gasto_dia = config["comida_dia"] + config["actividad_dia"] + config["transporte_dia"]
+
+    plan_dias: List[Dict[str, Any]] = []
+    for dia in range(1, dias + 1):
+        if dia == 1:
+            actividades = {"llegada": "Llegada y check-in", "actividad": rng.choice(tablas["llegada"])}
+        elif dia == dias:
+            actividades = {"salida": "Check-out", "actividad": rng.choice(tablas["salida"]), "regreso": "Regreso"}
+        else:
+            actividades = {"manana": rng.choice(config["actividades"]),
+                           "tarde": rng.choice(config["actividades"])}
+        plan_dias.append({"dia": dia, "actividades": actividades, "gasto_persona": gasto_dia})
+
+    total_persona = gasto_dia * dias
+    return {
+        "destino": destino,
+        "dias": dias,
+        "presupuesto": presupuesto,
+        "num_personas": num_personas,
+        "plan": plan_dias,
+        "total_persona": total_persona,
+        "total_grupo": total_persona * num_personas,
+    }
+
+def formatear_itinerario(plan: Dict[str, Any]) -> str:
+    """Texto del itinerario tal como lo muestra la herramienta"""
+    lineas = [
+        f"📅 ITINERARIO DE {plan['dias']} DÍAS EN {plan['destino'].upper()}",
+        f"💰 Presupuesto: {plan['presupuesto'].capitalize()}",
+        f"👥 Viajeros: {plan['num_personas']}",
+        "",
+    ]
+    for dia in plan["plan"]:
+        actividades = dia["actividades"]
+        lineas.append(f"📆 DÍA {dia['dia']}:")
+        if "llegada" in actividades:
+            lineas.append(f"   🛬 {actividades['llegada']}")
+            lineas.append(f"   🏃 {actividades['actividad']}")
+        elif "salida" in actividades:
+            lineas.append(f"   🧳 {actividades['salida']}")
+            lineas.append(f"   🏃 {actividades['actividad']}")
+            lineas.append(f"   🛫 {actividades['regreso']}")
+        else:
+            lineas.append(f"   ☀️ Mañana: {actividades['manana']}")
+            lineas.append(f"   🌆 Tarde: {actividades['tarde']}")
+        lineas.append(f"   💵 Gasto estimado: {formatear_importe(dia['gasto_persona'], decimales=0)}/persona")
+        lineas.append("")
+
+    lineas += [
+        "💰 RESUMEN FINANCIERO:",
+        f"   Por persona: {formatear_importe(plan['total_persona'], decimales=0)}",
+        f"   Total grupo ({plan['num_personas']} persona(s)): {formatear_importe(plan['total_grupo'], decimales=0)}",
+        "",
+        "📝 Nota: Precios aproximados, no incluyen vuelos ni alojamiento",
+    ]
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,196 @@
+"""
+🚦 PLANIFICADOR DE PETICIONES A AMADEUS
+Cubo de tokens compartido por todo el proceso con cola de prioridad
+y manejo de respuestas 429 (Retry-After)
+"""
+
+import os
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+import plazos
+from metricas import metricas
+
+# Prioridades: un número menor se atiende antes
+PRIORIDAD_INTERACTIVA = 0
+PRIORIDAD_LOTE = 10
+PRIORIDAD_PRECARGA = 20
+
+# ============================================================================
+# CUBO DE TOKENS
+# ============================================================================
+
+class CuboTokens:
+    """Cubo de tokens clásico: se rellena a `tasa` tokens/s hasta `capacidad`"""
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.tokens = capacidad
+        self.ultimo = time.monotonic()
+        self.pausado_hasta = 0.0
+
+    def _rellenar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+        self.ultimo = ahora
+
+    def espera_necesaria(self) -> float:
+        """Segundos hasta que haya un token disponible (0 si ya lo hay)"""
+        ahora = time.monotonic()
+        if ahora < self.pausado_hasta:
+            return self.pausado_hasta - ahora
+        self._rellenar()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.tasa
+
+    def consumir(self):
+        self.tokens -= 1
+
+    def pausar(self, segundos: float):
+        """Vacía el cubo y bloquea nuevas peticiones durante `segundos`"""
+        self.tokens = 0
+        self.ultimo = time.monotonic()
+        self.pausado_hasta = max(self.pausado_hasta, self.ultimo + segundos)
+
+# ============================================================================
+# PLANIFICADOR CON PRIORIDADES
+# ============================================================================
+
+def segundos_retry_after(valor: Optional[str]) -> Optional[float]:
+    """Interpreta la cabecera Retry-After (segundos o fecha HTTP)"""
+    if not valor:
+        return None
+    try:
+        return max(float(valor), 0.0)
+    except ValueError:
+        pass
+    try:
+        fecha = parsedate_to_datetime(valor)
+        return max((fecha - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class PlanificadorPeticiones:
+    """
+    Reparte los tokens del cubo entre los hilos que esperan, siempre
+    atendiendo primero a la prioridad más alta (búsquedas interactivas
+    antes que lotes y precargas) y, a igual prioridad, por orden de llegada.
+    """
+    def __init__(self, nombre: str, tasa: float, capacidad: float,
+                 max_reintentos: int = 3, espera_maxima: float = 10.0):
+        self.nombre = nombre
+        self.cubo = CuboTokens(tasa, capacidad)
+        self.max_reintentos = max_reintentos
+        self.espera_maxima = espera_maxima
+        self._cond = threading.Condition()
+        self._cola: List[Tuple[int, int]] = []
+        self._secuencia = itertools.count()
+        self._profundidad_maxima = 0
+
+    def _publicar_profundidad(self):
+        self._profundidad_maxima = max(self._profundidad_maxima, len(self._cola))
+        metricas.fijar("upstream_cola_profundidad", len(self._cola), upstream=self.nombre)
+        metricas.fijar("upstream_cola_profundidad_maxima", self._profundidad_maxima, upstream=self.nombre)
+
+    def adquirir(self, prioridad: int = PRIORIDAD_INTERACTIVA,
+                 espera_maxima: Optional[float] = None,
+                 disponible: Optional[Callable[[], bool]] = None) -> bool:
+        """
+        Espera turno y token. Devuelve False si se agota la espera máxima o si
+        `disponible` (p. ej. el interruptor del servicio) dice que no antes de gastarlo
+        """
+        if disponible is not None and not disponible():
+            metricas.incrementar("upstream_descartadas_total", upstream=self.nombre,
+                                 prioridad=str(prioridad))
+            return False
+        espera = self.espera_maxima if espera_maxima is None else espera_maxima
+        # Nunca más de lo que le queda al turno en curso
+        limite = time.monotonic() + plazos.acotar(espera)
+        inicio = time.monotonic()
+        ticket = (prioridad, next(self._secuencia))
+        with self._cond:
+            heapq.heappush(self._cola, ticket)
+            self._publicar_profundidad()
+            try:
+                while True:
+                    espera = None
+                    if self._cola[0] == ticket:
+                        espera = self.cubo.espera_necesaria()
+                        if espera <= 0:
+                            # El interruptor pudo abrirse mientras esperaba en la cola
+                            if disponible is not None and not disponible():
+                                heapq.heappop(self._cola)
+                                metricas.incrementar("upstream_descartadas_total", upstream=self.nombre,
+                                                     prioridad=str(prioridad))
+                                return False
+                            self.cubo.consumir()
+                            heapq.heappop(self._cola)
+                            metricas.incrementar("upstream_peticiones_total", upstream=self.nombre,
+                                                 prioridad=str(prioridad))
+                            metricas.incrementar("upstream_espera_segundos_total",
+                                                 time.monotonic() - inicio, upstream=self.nombre)
+                            return True
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._cola.remove(ticket)
+                        heapq.heapify(self._cola)
+                        metricas.incrementar("upstream_descartadas_total", upstream=self.nombre,
+                                             prioridad=str(prioridad))
+                        return False
+                    self._cond.wait(restante if espera is None else min(espera, restante))
+            finally:
+                self._publicar_profundidad()
+                self._cond.notify_all()
+
+    def ejecutar(self, peticion: Callable[[], requests.Response],
+                 prioridad: int = PRIORIDAD_INTERACTIVA,
+                 espera_maxima: Optional[float] = None,
+                 disponible: Optional[Callable[[], bool]] = None) -> Optional[requests.Response]:
+        """
+        Ejecuta `peticion` respetando la cuota. Ante un 429 pausa el cubo
+        (Retry-After o retroceso exponencial) y reintenta.
+        Devuelve None si no consiguió turno a tiempo o el servicio dejó de estar disponible.
+        """
+        respuesta = None
+        for intento in range(self.max_reintentos + 1):
+            if not self.adquirir(prioridad, espera_maxima, disponible):
+                return respuesta
+            respuesta = peticion()
+            if respuesta.status_code != 429:
+                return respuesta
+
+            metricas.incrementar("upstream_429_total", upstream=self.nombre)
+            pausa = segundos_retry_after(respuesta.headers.get("Retry-After"))
+            if pausa is None:
+                pausa = 0.5 * (2 ** intento)
+            with self._cond:
+                self.cubo.pausar(pausa)
+                self._cond.notify_all()
+        return respuesta
+
+    def estado(self) -> Dict[str, float]:
+        """Resumen para mostrar en la interfaz o en logs"""
+        with self._cond:
+            return {
+                "en_cola": len(self._cola),
+                "cola_maxima": self._profundidad_maxima,
+                "tokens": round(self.cubo.tokens, 2),
+            }
+
+# Instancia global: el entorno de pruebas de Amadeus admite 10 peticiones
+# por segundo y no más de una cada 100 ms
+planificador_amadeus = PlanificadorPeticiones(
+    "amadeus",
+    tasa=float(os.getenv("AMADEUS_TPS", "10")),
+    capacidad=float(os.getenv("AMADEUS_RAFAGA", "1")),
+    max_reintentos=int(os.getenv("AMADEUS_REINTENTOS", "3")),
+    espera_maxima=float(os.getenv("AMADEUS_ESPERA_MAX", "10")),
+)
@@ -0,0 +1,144 @@
+"""
+🏭 GENERACIÓN DE ITINERARIOS POR LOTES
+API y CLI para generar itinerarios de muchas combinaciones
+(destino, días, presupuesto) con semillas deterministas y salida JSONL
+en streaming (memoria constante aunque el lote sea enorme)
+
+Uso:
+    python lotes_itinerarios.py --destinos "París,Roma" --dias 3,5,7 \\
+        --presupuestos bajo,medio,alto --semilla 42 --salida itinerarios.jsonl
+    python lotes_itinerarios.py --entrada combinaciones.jsonl --procesos 8
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from itinerarios import formatear_itinerario, planificar_itinerario, rng_itinerario
+
+Combinacion = Tuple[str, int, str]
+
+# A partir de este tamaño de lote compensa arrancar procesos
+UMBRAL_PROCESOS = 5000
+TAMANO_BLOQUE = 200
+
+# ============================================================================
+# API
+# ============================================================================
+
+def generar_uno(combinacion: Combinacion, semilla: Any = 0, num_personas: int = 1,
+                incluir_texto: bool = True) -> Dict[str, Any]:
+    destino, dias, presupuesto = combinacion
+    plan = planificar_itinerario(destino, dias, presupuesto, num_personas,
+                                 rng_itinerario(destino, dias, presupuesto, semilla))
+    plan["semilla"] = semilla
+    if incluir_texto:
+        plan["texto"] = formatear_itinerario(plan)
+    return plan
+
+def _generar_bloque(bloque: List[Combinacion], semilla: Any, num_personas: int,
+                    incluir_texto: bool) -> List[Dict[str, Any]]:
+    return [generar_uno(c, semilla, num_personas, incluir_texto) for c in bloque]
+
+def _bloques(combinaciones: Iterable[Combinacion], tamano: int) -> Iterator[List[Combinacion]]:
+    iterador = iter(combinaciones)
+    while True:
+        bloque = list(itertools.islice(iterador, tamano))
+        if not bloque:
+            return
+        yield bloque
+
+def generar_lote(combinaciones: Iterable[Combinacion], semilla: Any = 0, num_personas: int = 1,
+                 procesos: Optional[int] = None, incluir_texto: bool = True,
+                 total_estimado: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Genera itinerarios en el mismo orden que `combinaciones`.
+    Con lotes grandes reparte bloques en un pool de procesos manteniendo
+    como mucho `procesos * 2` bloques en vuelo, así la memoria no crece
+    con el tamaño del lote. El resultado es idéntico con o sin procesos.
+    """
+    if total_estimado is None and isinstance(combinaciones, (list, tuple)):
+        total_estimado = len(combinaciones)
+    procesos = procesos if procesos is not None else (os.cpu_count() or 1)
+    if procesos > 1 and total_estimado is None:
+        # Tamaño desconocido (p. ej. --entrada): se mira si llega al umbral antes de arrancar procesos
+        iterador = iter(combinaciones)
+        inicio = list(itertools.islice(iterador, UMBRAL_PROCESOS))
+        total_estimado = len(inicio) if len(inicio) < UMBRAL_PROCESOS else None
+        combinaciones = itertools.chain(inicio, iterador)
+
+    if procesos <= 1 or (total_estimado is not None and total_estimado < UMBRAL_PROCESOS):
+        for combinacion in combinaciones:
+            yield generar_uno(combinacion, semilla, num_personas, incluir_texto)
+        return
+
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        en_vuelo: deque = deque()
+        for bloque in _bloques(combinaciones, TAMANO_BLOQUE):
+            en_vuelo.append(pool.submit(_generar_bloque, bloque, semilla, num_personas, incluir_texto))
+            if len(en_vuelo) >= procesos * 2:
+                yield from en_vuelo.popleft().result()
+        while en_vuelo:
+            yield from en_vuelo.popleft().result()
+
+def escribir_jsonl(resultados: Iterable[Dict[str, Any]], salida: TextIO) -> int:
+    total = 0
+    for resultado in resultados:
+        salida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+        total += 1
+    salida.flush()
+    return total
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def _leer_entrada(ruta: str) -> Iterator[Combinacion]:
+    """JSONL con objetos {"destino": ..., "dias": ..., "presupuesto": ...}"""
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            if linea.strip():
+                datos = json.loads(linea)
+                yield datos["destino"], int(datos["dias"]), datos.get("presupuesto", "medio")
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Genera itinerarios por lotes en JSONL")
+    parser.add_argument("--entrada", help="JSONL de combinaciones (destino, dias, presupuesto)")
+    parser.add_argument("--destinos", default="", help="Destinos separados por comas")
+    parser.add_argument("--dias", default="3,5,7", help="Duraciones separadas por comas")
+    parser.add_argument("--presupuestos", default="bajo,medio,alto", help="Niveles separados por comas")
+    parser.add_argument("--personas", type=int, default=1, help="Número de viajeros")
+    parser.add_argument("--semilla", default="0", help="Semilla para resultados reproducibles")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos (por defecto, CPUs)")
+    parser.add_argument("--sin-texto", action="store_true", help="Omitir el texto formateado")
+    parser.add_argument("--salida", default="-", help="Archivo JSONL de salida ('-' = stdout)")
+    args = parser.parse_args(argv)
+
+    total = None
+    if args.entrada:
+        combinaciones: Iterable[Combinacion] = _leer_entrada(args.entrada)
+    else:
+        destinos = [d.strip() for d in args.destinos.split(",") if d.strip()]
+        if not destinos:
+            parser.error("Indica --entrada o --destinos")
+        dias = [int(d) for d in args.dias.split(",")]
+        presupuestos = [p.strip() for p in args.presupuestos.split(",")]
+        combinaciones = itertools.product(destinos, dias, presupuestos)
+        total = len(destinos) * len(dias) * len(presupuestos)
+
+    resultados = generar_lote(combinaciones, args.semilla, args.personas, args.procesos,
+                              incluir_texto=not args.sin_texto, total_estimado=total)
+    if args.salida == "-":
+        escritos = escribir_jsonl(resultados, sys.stdout)
+    else:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            escritos = escribir_jsonl(resultados, f)
+    print(f"✅ {escritos} itinerarios generados", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
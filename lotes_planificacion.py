@@ -0,0 +1,217 @@
+"""
+🤖 PLANIFICACIÓN POR LOTES (SIN INTERFAZ)
+Ejecuta muchas solicitudes de planificación contra el agente con un pool
+acotado de trabajadores. Cada trabajo tiene su propio thread_id y su propia
+lista de viajeros; los resultados se escriben en JSONL a medida que terminan
+y una ejecución interrumpida se retoma saltando los trabajos ya completados
+
+Formato de entrada (una solicitud por línea):
+    {"id": "familia-1", "mensaje": "Quiero ir a Cusco 5 días desde Lima"}
+    {"id": "conv-2", "mensajes": ["Somos Ana (34) y Leo (6)", "Vamos a Roma 4 días"]}
+    {"id": "p-3", "destino": "París", "origen": "Madrid", "dias": 5,
+     "presupuesto": "medio", "fecha_ida": "2026-06-10", "viajeros": [{"nombre": "Ana", "edad": 34}]}
+
+Uso:
+    python lotes_planificacion.py --entrada solicitudes.jsonl --salida resultados.jsonl --trabajadores 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+from dotenv import load_dotenv
+
+from viajeros import tipo_por_edad, viajeros_aislados
+
+# ============================================================================
+# SOLICITUDES
+# ============================================================================
+
+def mensaje_desde_solicitud(solicitud: Dict[str, Any]) -> str:
+    """Convierte una solicitud estructurada en el mensaje que escribiría un usuario"""
+    partes = [f"Quiero planificar un viaje a {solicitud['destino']}"]
+    if solicitud.get("origen"):
+        partes.append(f"saliendo desde {solicitud['origen']}")
+    if solicitud.get("dias"):
+        partes.append(f"por {solicitud['dias']} días")
+    if solicitud.get("fecha_ida"):
+        partes.append(f"con salida el {solicitud['fecha_ida']}")
+    if solicitud.get("fecha_vuelta"):
+        partes.append(f"y regreso el {solicitud['fecha_vuelta']}")
+    mensaje = " ".join(partes) + "."
+    if solicitud.get("presupuesto"):
+        mensaje += f" Presupuesto {solicitud['presupuesto']}."
+    if solicitud.get("ocasion"):
+        mensaje += f" Es un viaje de {solicitud['ocasion']}."
+    mensaje += " Ya registré a los viajeros; dame el plan completo sin hacerme más preguntas."
+    return mensaje
+
+def mensajes_de(solicitud: Dict[str, Any]) -> List[str]:
+    if solicitud.get("mensajes"):
+        return [str(m) for m in solicitud["mensajes"]]
+    if solicitud.get("mensaje"):
+        return [str(solicitud["mensaje"])]
+    if solicitud.get("destino"):
+        return [mensaje_desde_solicitud(solicitud)]
+    raise ValueError("la solicitud necesita 'mensaje', 'mensajes' o 'destino'")
+
+def leer_solicitudes(ruta: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(id, solicitud); sin 'id' se usa el número de línea, estable entre ejecuciones"""
+    with open(ruta, encoding="utf-8") as f:
+        for numero, linea in enumerate(f, 1):
+            if linea.strip():
+                solicitud = json.loads(linea)
+                yield str(solicitud.get("id") or f"linea-{numero}"), solicitud
+
+def ids_completados(ruta: str) -> Set[str]:
+    """Trabajos con estado 'ok' en una salida previa (las líneas cortadas se ignoran)"""
+    completados: Set[str] = set()
+    if not os.path.exists(ruta):
+        return completados
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                resultado = json.loads(linea)
+            except ValueError:
+                continue
+            if resultado.get("estado") == "ok":
+                completados.add(resultado["id"])
+    return completados
+
+# ============================================================================
+# EJECUCIÓN
+# ============================================================================
+
+def ejecutar_trabajo(agente, id_trabajo: str, solicitud: Dict[str, Any],
+                     plazo: Optional[float] = None) -> Dict[str, Any]:
+    """Ejecuta todos los turnos de una solicitud con thread_id y viajeros propios (y `plazo` s por turno)"""
+    from langchain_core.messages import AIMessage, HumanMessage
+    from consumo import ContadorTokens, config_turno
+    from plazos import plazo_turno
+    from preprocesador import preprocesar, registrar_respuesta_directa
+    from asistente import anticipador
+    from admision import limitar_herramientas
+
+    thread_id = f"lote_{id_trabajo}_{uuid.uuid4().hex[:8]}"
+    config = {"configurable": {"thread_id": thread_id}}
+    resultado: Dict[str, Any] = {
+        "id": id_trabajo,
+        "thread_id": thread_id,
+        "inicio": datetime.now().isoformat(timespec="seconds"),
+        "respuestas": [],
+        "turnos_s": [],
+        "tokens_ahorrados": 0,
+    }
+    contador = ContadorTokens()
+    inicio = time.perf_counter()
+    with viajeros_aislados() as viajeros:
+        try:
+            for viajero in solicitud.get("viajeros", []):
+                edad = int(viajero["edad"])
+                viajeros.agregar(viajero["nombre"], edad, tipo_por_edad(edad))
+            for mensaje in mensajes_de(solicitud):
+                inicio_turno = time.perf_counter()
+                with plazo_turno(plazo):
+                    preprocesado = preprocesar(mensaje)
+                    anticipador.observar_preprocesado(thread_id, preprocesado)
+                    resultado["tokens_ahorrados"] += preprocesado.tokens_ahorrados
+                    if preprocesado.respuesta_directa:
+                        registrar_respuesta_directa(agente, config, preprocesado)
+                        respuesta = preprocesado.respuesta_directa
+                    else:
+                        config_llamada = limitar_herramientas(config_turno(config, contador.turno, contador))
+                        config_llamada["callbacks"].append(anticipador.observador(thread_id))
+                        estado = agente.invoke({"messages": [HumanMessage(content=preprocesado.mensaje_agente)]},
+                                               config_llamada)
+                        respuesta = next((m.content for m in reversed(estado["messages"])
+                                          if isinstance(m, AIMessage) and m.content), "")
+                resultado["respuestas"].append(respuesta)
+                resultado["turnos_s"].append(round(time.perf_counter() - inicio_turno, 3))
+            resultado["estado"] = "ok"
+        except Exception as e:
+            resultado["estado"] = "error"
+            resultado["error"] = f"{type(e).__name__}: {e}"
+        anticipador.cancelar(thread_id)
+        resultado["viajeros"] = [{"nombre": v["nombre"], "edad": v["edad"], "tipo": v["tipo"]}
+                                 for v in viajeros.listar()]
+    resultado["consumo"] = contador.turno.a_dict()
+    resultado["duracion_s"] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+def ejecutar_lote(agente, solicitudes: Iterator[Tuple[str, Dict[str, Any]]], salida: TextIO,
+                  trabajadores: int = 4, omitir: Optional[Set[str]] = None,
+                  plazo: Optional[float] = None) -> Dict[str, int]:
+    """
+    Reparte las solicitudes en un pool de hilos con como mucho
+    `trabajadores * 2` trabajos en vuelo y escribe cada resultado al terminar
+    """
+    omitir = omitir or set()
+    totales = {"ok": 0, "error": 0, "omitidos": 0}
+
+    def escribir(futuro: Future):
+        resultado = futuro.result()
+        salida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+        salida.flush()
+        totales[resultado["estado"]] += 1
+        print(f"{'✅' if resultado['estado'] == 'ok' else '❌'} {resultado['id']} "
+              f"({resultado['duracion_s']:.1f}s)", file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=trabajadores, thread_name_prefix="lote") as pool:
+        en_vuelo: Set[Future] = set()
+        for id_trabajo, solicitud in solicitudes:
+            if id_trabajo in omitir:
+                totales["omitidos"] += 1
+                continue
+            en_vuelo.add(pool.submit(ejecutar_trabajo, agente, id_trabajo, solicitud, plazo))
+            if len(en_vuelo) >= trabajadores * 2:
+                terminados, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    escribir(futuro)
+        for futuro in wait(en_vuelo).done:
+            escribir(futuro)
+    return totales
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Ejecuta solicitudes de planificación en lote")
+    parser.add_argument("--entrada", required=True, help="JSONL de solicitudes")
+    parser.add_argument("--salida", required=True, help="JSONL de resultados (se continúa si existe)")
+    parser.add_argument("--trabajadores", type=int, default=4, help="Trabajos simultáneos")
+    parser.add_argument("--desde-cero", action="store_true", help="Ignorar resultados previos y sobrescribir")
+    parser.add_argument("--plazo", type=float, default=None,
+                        help="Segundos máximos por turno (por defecto PLAZO_TURNO_S)")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    from asistente import crear_agente_vacaciones
+
+    omitir = set() if args.desde_cero else ids_completados(args.salida)
+    if omitir:
+        print(f"↩️ Retomando: {len(omitir)} trabajos ya completados", file=sys.stderr)
+
+    agente = crear_agente_vacaciones()
+    modo = "w" if args.desde_cero else "a"
+    with open(args.salida, modo, encoding="utf-8") as salida:
+        # Si la ejecución anterior se cortó a mitad de línea, empezar en una nueva
+        if modo == "a" and salida.tell() > 0:
+            with open(args.salida, "rb") as previa:
+                previa.seek(-1, os.SEEK_END)
+                if previa.read(1) != b"\n":
+                    salida.write("\n")
+        totales = ejecutar_lote(agente, leer_solicitudes(args.entrada), salida,
+                                args.trabajadores, omitir, args.plazo)
+
+    print(f"\n📦 {totales['ok']} completados, {totales['error']} con error, "
+          f"{totales['omitidos']} omitidos", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
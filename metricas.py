@@ -0,0 +1,49 @@
+"""
+📈 MÉTRICAS DEL PROCESO
+Registro en memoria de contadores y medidores compartido por todos los módulos
+"""
+
+import threading
+from typing import Dict
+
+# ============================================================================
+# REGISTRO DE MÉTRICAS
+# ============================================================================
+
+def _clave(nombre: str, etiquetas: Dict[str, str]) -> str:
+    """Construye la clave de la serie en formato Prometheus: nombre{k="v"}"""
+    if not etiquetas:
+        return nombre
+    pares = ",".join(f'{k}="{v}"' for k, v in sorted(etiquetas.items()))
+    return f"{nombre}{{{pares}}}"
+
+class RegistroMetricas:
+    """Contadores (solo crecen) y medidores (valor actual) seguros entre hilos"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores: Dict[str, float] = {}
+        self._medidores: Dict[str, float] = {}
+
+    def incrementar(self, nombre: str, valor: float = 1, **etiquetas: str):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def fijar(self, nombre: str, valor: float, **etiquetas: str):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._medidores[clave] = valor
+
+    def instantanea(self) -> Dict[str, float]:
+        with self._lock:
+            return {**self._contadores, **self._medidores}
+
+    def exportar_prometheus(self) -> str:
+        """Exporta todas las series en el formato de texto de Prometheus"""
+        with self._lock:
+            lineas = [f"{k} {v}" for k, v in sorted(self._contadores.items())]
+            lineas += [f"{k} {v}" for k, v in sorted(self._medidores.items())]
+        return "\n".join(lineas) + "\n"
+
+# Instancia global
+metricas = RegistroMetricas()
@@ -0,0 +1,88 @@
+"""
+🎫 OFERTAS DE VUELO COMPACTAS
+Extrae de la respuesta de Amadeus solo los campos que se muestran,
+decodificando en streaming cuando ijson está disponible
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import ijson  # Opcional: decodificación incremental del JSON
+except ImportError:
+    ijson = None
+
+# Número de ofertas que se piden a Amadeus y se muestran al usuario
+MAX_OFERTAS = int(os.getenv("AMADEUS_MAX_OFERTAS", "3"))
+
+# ============================================================================
+# MODELO DE OFERTA
+# ============================================================================
+
+class OfertaVuelo:
+    """Oferta de vuelo con los campos mínimos para mostrar y calcular precios"""
+    __slots__ = ("precio", "moneda", "aerolinea", "salida", "llegada", "escalas", "duracion")
+
+    def __init__(self, precio: float, moneda: str, aerolinea: str, salida: str,
+                 llegada: str, escalas: int, duracion: str):
+        self.precio = precio
+        self.moneda = moneda
+        self.aerolinea = aerolinea
+        self.salida = salida
+        self.llegada = llegada
+        self.escalas = escalas
+        self.duracion = duracion
+
+    @classmethod
+    def desde_amadeus(cls, vuelo: Dict[str, Any]) -> "OfertaVuelo":
+        itinerario = vuelo["itineraries"][0]
+        segmentos = itinerario["segments"]
+        return cls(
+            precio=float(vuelo["price"]["total"]),
+            moneda=vuelo["price"]["currency"],
+            aerolinea=segmentos[0]["carrierCode"],
+            salida=segmentos[0]["departure"]["at"].split("T")[1][:5],
+            llegada=segmentos[-1]["arrival"]["at"].split("T")[1][:5],
+            escalas=len(segmentos) - 1,
+            # "PT12H30M" -> "12H30M"
+            duracion=itinerario["duration"][2:],
+        )
+
+    def a_tupla(self) -> tuple:
+        """Forma compacta para la caché compartida (mismo orden que el constructor)"""
+        return tuple(getattr(self, campo) for campo in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"OfertaVuelo({self.aerolinea} {self.salida}-{self.llegada} {self.precio:.2f} {self.moneda})"
+
+# ============================================================================
+# PARSEO
+# ============================================================================
+
+def _ofertas(vuelos: Iterable[Dict[str, Any]], limite: int) -> List[OfertaVuelo]:
+    ofertas = []
+    for vuelo in vuelos:
+        if len(ofertas) >= limite:
+            break
+        ofertas.append(OfertaVuelo.desde_amadeus(vuelo))
+    return ofertas
+
+def parsear_respuesta(respuesta, limite: int = MAX_OFERTAS,
+                      en_streaming: bool = False) -> Optional[List[OfertaVuelo]]:
+    """
+    Convierte una respuesta HTTP de flight-offers en ofertas compactas.
+    `en_streaming`: la petición se hizo con `stream=True` y nadie leyó aún el
+    cuerpo. Entonces, con ijson, deja de leer al llegar al límite; si no,
+    decodifica el JSON completo y descarta lo que no se usa. El llamador
+    cierra la respuesta
+    """
+    if en_streaming and ijson is not None:
+        respuesta.raw.decode_content = True
+        return _ofertas(ijson.items(respuesta.raw, "data.item", use_float=True), limite)
+    return parsear_json(respuesta.content, limite)
+
+def parsear_json(contenido: bytes, limite: int = MAX_OFERTAS) -> Optional[List[OfertaVuelo]]:
+    """Ruta sin streaming: decodifica el cuerpo completo y extrae las ofertas"""
+    datos = json.loads(contenido)
+    return _ofertas(datos.get("data", []), limite)
@@ -0,0 +1,80 @@
+"""
+⏱️ PLAZO POR TURNO
+Cada turno del agente tiene una hora límite que viaja en una ContextVar por
+el grafo, las herramientas y las peticiones HTTP (los hilos de LangGraph
+copian el contexto). Los timeouts se recortan al tiempo que queda y, cuando
+queda poco, las herramientas devuelven resultados rápidos (caché, datos
+offline o simulados) y se pide al modelo que responda ya
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Segundos máximos de un turno completo (modelo + herramientas)
+PLAZO_TURNO = float(os.getenv("PLAZO_TURNO_S", "60"))
+
+# Con menos tiempo que esto se degradan los resultados y se pide cerrar el turno
+RESERVA_FINAL = float(os.getenv("PLAZO_RESERVA_S", "8"))
+
+# Timeout mínimo que merece la pena dar a una petición HTTP
+TIMEOUT_MINIMO = float(os.getenv("PLAZO_TIMEOUT_MINIMO_S", "1"))
+
+# Hora límite (time.monotonic) del turno actual; None fuera de un turno
+_limite: ContextVar[Optional[float]] = ContextVar("plazo_limite", default=None)
+
+class PlazoAgotado(Exception):
+    """El turno superó su plazo"""
+
+@contextmanager
+def plazo_turno(segundos: Optional[float] = None) -> Iterator[float]:
+    """
+    Fija el plazo del bloque. Si ya hay uno más estricto (un turno dentro de
+    otro), se mantiene ese
+    """
+    limite = time.monotonic() + (PLAZO_TURNO if segundos is None else segundos)
+    actual = _limite.get()
+    if actual is not None:
+        limite = min(limite, actual)
+    token = _limite.set(limite)
+    try:
+        yield limite
+    finally:
+        _limite.reset(token)
+
+@contextmanager
+def plazo_independiente(segundos: float) -> Iterator[float]:
+    """Plazo propio para trabajo que sigue después del turno que lo lanzó (ignora el del turno)"""
+    limite = time.monotonic() + segundos
+    token = _limite.set(limite)
+    try:
+        yield limite
+    finally:
+        _limite.reset(token)
+
+def restante() -> Optional[float]:
+    """Segundos que quedan (None si no hay plazo)"""
+    limite = _limite.get()
+    return None if limite is None else limite - time.monotonic()
+
+def acotar(segundos: float, minimo: float = 0.0) -> float:
+    """`segundos` recortado a lo que queda del turno (nunca por debajo de `minimo`)"""
+    queda = restante()
+    if queda is None:
+        return segundos
+    return max(minimo, min(segundos, queda))
+
+def timeout(segundos: float) -> float:
+    """Timeout para una petición HTTP: el fijo del servicio o lo que queda, si es menos"""
+    return acotar(segundos, TIMEOUT_MINIMO)
+
+def sin_tiempo(necesario: float = TIMEOUT_MINIMO) -> bool:
+    """True si no queda tiempo para una petición de al menos `necesario` segundos"""
+    queda = restante()
+    return queda is not None and queda < necesario
+
+def casi_agotado() -> bool:
+    """True si queda menos que la reserva final: momento de dar resultados rápidos"""
+    return sin_tiempo(RESERVA_FINAL)
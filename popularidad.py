@@ -0,0 +1,249 @@
+"""
+🔥 POPULARIDAD DE RUTAS Y PRECALENTADO DE CACHÉS
+Aprende qué combinaciones (origen, destino, mes) consultan los usuarios
+con un count-min sketch con decaimiento exponencial y precalienta
+las cachés para las más populares en horas valle
+"""
+
+import atexit
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metricas import metricas
+
+# Clave de popularidad: (origen, destino, mes). Origen y mes pueden ser None
+ClaveRuta = Tuple[Optional[str], str, Optional[int]]
+
+MESES = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6,
+    "julio": 7, "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10,
+    "noviembre": 11, "diciembre": 12,
+}
+
+def numero_mes(mes: str) -> Optional[int]:
+    """Convierte 'Marzo', '3' o '2026-03-15' en el número de mes"""
+    mes = mes.strip().lower()
+    if mes in MESES:
+        return MESES[mes]
+    if mes.isdigit() and 1 <= int(mes) <= 12:
+        return int(mes)
+    try:
+        return datetime.strptime(mes[:10], "%Y-%m-%d").month
+    except ValueError:
+        return None
+
+def clave_ruta(origen: Optional[str], destino: str, mes: Optional[int]) -> ClaveRuta:
+    return (origen.strip().lower() if origen else None, destino.strip().lower(), mes)
+
+# ============================================================================
+# COUNT-MIN SKETCH CON DECAIMIENTO
+# ============================================================================
+
+class CountMinDecreciente:
+    """
+    Count-min sketch con decaimiento hacia adelante: cada evento pesa
+    2^(t / vida_media), así que los conteos antiguos pierden la mitad de su
+    peso relativo cada `vida_media` segundos sin tener que recorrer la tabla.
+    Además guarda los `max_candidatos` elementos más frecuentes para el top-N.
+    """
+    def __init__(self, ancho: int = 1024, profundidad: int = 4,
+                 vida_media: float = 7 * 24 * 3600, max_candidatos: int = 200):
+        self.ancho = ancho
+        self.profundidad = profundidad
+        self.vida_media = vida_media
+        self.max_candidatos = max_candidatos
+        self.tabla = [[0.0] * ancho for _ in range(profundidad)]
+        self.origen_t = time.time()
+        self.candidatos: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _indices(self, elemento: str) -> List[int]:
+        resumen = hashlib.blake2b(elemento.encode("utf-8"), digest_size=4 * self.profundidad).digest()
+        return [int.from_bytes(resumen[4 * i:4 * i + 4], "little") % self.ancho
+                for i in range(self.profundidad)]
+
+    def _peso_actual(self) -> float:
+        return 2 ** ((time.time() - self.origen_t) / self.vida_media)
+
+    def _renormalizar(self, factor: float):
+        """Evita desbordes: divide todo por el peso actual y reinicia el origen"""
+        self.tabla = [[c / factor for c in fila] for fila in self.tabla]
+        self.candidatos = {k: v / factor for k, v in self.candidatos.items()}
+        self.origen_t = time.time()
+
+    def agregar(self, elemento: str):
+        with self._lock:
+            peso = self._peso_actual()
+            if peso > 1e12:
+                self._renormalizar(peso)
+                peso = 1.0
+            estimado = math.inf
+            for fila, i in zip(self.tabla, self._indices(elemento)):
+                fila[i] += peso
+                estimado = min(estimado, fila[i])
+            self.candidatos[elemento] = estimado
+            if len(self.candidatos) > self.max_candidatos:
+                menor = min(self.candidatos, key=self.candidatos.get)
+                del self.candidatos[menor]
+
+    def estimar(self, elemento: str) -> float:
+        """Frecuencia decaída estimada, expresada en 'eventos de ahora'"""
+        with self._lock:
+            bruto = min(fila[i] for fila, i in zip(self.tabla, self._indices(elemento)))
+            return bruto / self._peso_actual()
+
+    def top(self, n: int) -> List[Tuple[str, float]]:
+        with self._lock:
+            peso = self._peso_actual()
+            ordenados = sorted(self.candidatos.items(), key=lambda kv: kv[1], reverse=True)
+            return [(k, v / peso) for k, v in ordenados[:n]]
+
+    def a_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "ancho": self.ancho, "profundidad": self.profundidad,
+                "vida_media": self.vida_media, "origen_t": self.origen_t,
+                "tabla": self.tabla, "candidatos": self.candidatos,
+            }
+
+    def cargar_dict(self, datos: Dict):
+        """Suma la instantánea a lo registrado desde el arranque (no lo reemplaza)"""
+        if datos.get("ancho") != self.ancho or datos.get("profundidad") != self.profundidad:
+            return
+        with self._lock:
+            # Expresa los pesos guardados respecto al origen actual
+            factor = 2 ** ((self.origen_t - datos["origen_t"]) / self.vida_media)
+            self.tabla = [[actual + guardado / factor for actual, guardado in zip(fila, fila_guardada)]
+                          for fila, fila_guardada in zip(self.tabla, datos["tabla"])]
+            # Estimaciones de los candidatos de ambos lados sobre la tabla combinada
+            candidatos = {k: min(fila[i] for fila, i in zip(self.tabla, self._indices(k)))
+                          for k in {*self.candidatos, *datos["candidatos"]}}
+            self.candidatos = dict(sorted(candidatos.items(), key=lambda kv: kv[1],
+                                          reverse=True)[:self.max_candidatos])
+
+# ============================================================================
+# RASTREADOR DE POPULARIDAD
+# ============================================================================
+
+class RastreadorPopularidad:
+    """Registra consultas (origen, destino, mes) y persiste instantáneas en JSON"""
+    def __init__(self, ruta_snapshot: str):
+        self.ruta_snapshot = ruta_snapshot
+        self.sketch = CountMinDecreciente()
+
+    @staticmethod
+    def _serializar(clave: ClaveRuta) -> str:
+        return json.dumps(clave, ensure_ascii=False)
+
+    def registrar(self, origen: Optional[str], destino: str, mes: Optional[int] = None):
+        if not destino:
+            return
+        self.sketch.agregar(self._serializar(clave_ruta(origen, destino, mes)))
+        metricas.incrementar("popularidad_eventos_total")
+
+    def top(self, n: int) -> List[Tuple[ClaveRuta, float]]:
+        return [(tuple(json.loads(k)), v) for k, v in self.sketch.top(n)]
+
+    def guardar(self):
+        os.makedirs(os.path.dirname(self.ruta_snapshot) or ".", exist_ok=True)
+        temporal = self.ruta_snapshot + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self.sketch.a_dict(), f)
+        os.replace(temporal, self.ruta_snapshot)
+
+    def cargar(self) -> bool:
+        try:
+            with open(self.ruta_snapshot, encoding="utf-8") as f:
+                self.sketch.cargar_dict(json.load(f))
+            return True
+        except (OSError, ValueError, KeyError):
+            return False
+
+# ============================================================================
+# PRECALENTADOR
+# ============================================================================
+
+def _horas_valle(texto: str) -> Tuple[int, int]:
+    """'2-6' -> (2, 6). El rango puede cruzar medianoche ('22-4')"""
+    inicio, fin = texto.split("-")
+    return int(inicio), int(fin)
+
+def es_hora_valle(hora: int, rango: Tuple[int, int]) -> bool:
+    inicio, fin = rango
+    if inicio <= fin:
+        return inicio <= hora < fin
+    return hora >= inicio or hora < fin
+
+class Precalentador:
+    """
+    Hilo en segundo plano que, en horas valle, llama a `calentar` para las
+    N combinaciones más populares y guarda la instantánea del rastreador.
+    """
+    def __init__(self, rastreador: RastreadorPopularidad,
+                 calentar: Callable[[ClaveRuta], None],
+                 top_n: int = 20, intervalo: float = 3600, horas_valle: str = "2-6"):
+        self.rastreador = rastreador
+        self.calentar = calentar
+        self.top_n = top_n
+        self.intervalo = intervalo
+        self.horas_valle = _horas_valle(horas_valle)
+        self._hilo: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+
+    def precalentar(self, n: Optional[int] = None) -> int:
+        """Calienta las N entradas más populares. Devuelve cuántas procesó"""
+        procesadas = 0
+        for clave, _ in self.rastreador.top(n or self.top_n):
+            if self._parar.is_set():
+                break
+            try:
+                self.calentar(clave)
+                procesadas += 1
+            except Exception:
+                metricas.incrementar("precalentado_errores_total")
+        metricas.incrementar("precalentado_entradas_total", procesadas)
+        return procesadas
+
+    def _guardar(self):
+        try:
+            self.rastreador.guardar()
+        except OSError:
+            metricas.incrementar("popularidad_snapshot_errores_total")
+
+    def _bucle(self, al_iniciar: int):
+        if al_iniciar:
+            self.precalentar(al_iniciar)
+        while not self._parar.wait(self.intervalo):
+            self._guardar()
+            if es_hora_valle(datetime.now().hour, self.horas_valle):
+                self.precalentar()
+
+    def iniciar(self, al_iniciar: int = 5):
+        """
+        Carga la instantánea y arranca el hilo (idempotente). `al_iniciar`:
+        top-N a calentar desde la instantánea
+        """
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._parar.clear()
+        # Siempre y antes de guardar nada: si no, la primera instantánea borraría el historial
+        cargada = self.rastreador.cargar()
+        atexit.register(self._guardar)
+        self._hilo = threading.Thread(target=self._bucle, args=(al_iniciar if cargada else 0,),
+                                      name="precalentador", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._parar.set()
+
+# Instancia global del rastreador (por defecto junto al código, no en el directorio de trabajo)
+rastreador_popularidad = RastreadorPopularidad(
+    os.getenv("POPULARIDAD_SNAPSHOT", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                   ".estado", "popularidad.json"))
+)
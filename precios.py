@@ -0,0 +1,143 @@
+"""
+💵 MOTOR DE PRECIOS DE GRUPO
+Cálculo vectorizado (NumPy) del precio de muchas ofertas para muchas
+combinaciones de viajeros a la vez, con un único criterio de redondeo
+y de moneda para todas las herramientas
+"""
+
+import os
+from typing import Dict, NamedTuple, Sequence, Union
+
+import numpy as np
+
+from configuracion import COLUMNAS_PRESUPUESTO, NIVELES_PRESUPUESTO, derivado
+
+# Tarifa de niños y bebés respecto a la de un adulto
+FACTOR_NINO = 0.75
+FACTOR_BEBE = 0.15
+
+# Moneda única en la que se piden y se muestran todos los precios
+# (las tablas de costos y de rutas simuladas están expresadas en ella)
+MONEDA = os.getenv("MONEDA", "USD")
+
+# ============================================================================
+# MEZCLAS DE VIAJEROS
+# ============================================================================
+
+class MezclaViajeros(NamedTuple):
+    adultos: int
+    ninos: int
+    bebes: int
+
+    @property
+    def total(self) -> int:
+        return self.adultos + self.ninos + self.bebes
+
+def mezcla_desde_conteo(conteo: Dict[str, int]) -> MezclaViajeros:
+    """Mezcla del grupo registrado; sin viajeros se asume un adulto"""
+    mezcla = MezclaViajeros(conteo.get("adulto", 0), conteo.get("niño", 0), conteo.get("bebé", 0))
+    return mezcla if mezcla.total else MezclaViajeros(1, 0, 0)
+
+def mezcla_vuelo(conteo: Dict[str, int]) -> MezclaViajeros:
+    """
+    Mezcla para buscar y cotizar vuelos: al menos un adulto (Amadeus exige
+    adults >= 1 y los menores no vuelan solos), así el total coincide con lo
+    que se busca y se enlaza
+    """
+    mezcla = mezcla_desde_conteo(conteo)
+    return mezcla._replace(adultos=max(mezcla.adultos, 1))
+
+# ============================================================================
+# PRECIOS VECTORIZADOS
+# ============================================================================
+
+class TarifasGrupo(NamedTuple):
+    """Resultado de `precios_grupo` para n ofertas y m mezclas"""
+    adulto: np.ndarray       # (n,)   precio por adulto
+    nino: np.ndarray         # (n,)   precio por niño
+    bebe: np.ndarray         # (n,)   precio por bebé
+    total_ninos: np.ndarray  # (n, m) importe de todos los niños
+    total_bebes: np.ndarray  # (n, m) importe de todos los bebés
+    total: np.ndarray        # (n, m) total del grupo
+
+def redondear(valores: Union[float, np.ndarray]) -> np.ndarray:
+    """Redondeo único a céntimos para todas las herramientas"""
+    return np.round(valores, 2)
+
+def precios_grupo(precios_adulto: Sequence[float],
+                  mezclas: Sequence[Sequence[int]]) -> TarifasGrupo:
+    """
+    Calcula de una vez los importes de n ofertas × m mezclas de viajeros.
+    Los precios por niño y por bebé se redondean antes de multiplicar para
+    que la suma de las líneas mostradas coincida con el total.
+    """
+    adulto = redondear(np.asarray(precios_adulto, dtype=float))
+    cantidades = np.asarray(mezclas, dtype=float).reshape(-1, 3)
+    nino = redondear(adulto * FACTOR_NINO)
+    bebe = redondear(adulto * FACTOR_BEBE)
+
+    total_adultos = np.outer(adulto, cantidades[:, 0])
+    total_ninos = np.outer(nino, cantidades[:, 1])
+    total_bebes = np.outer(bebe, cantidades[:, 2])
+    total = redondear(total_adultos + total_ninos + total_bebes)
+    return TarifasGrupo(adulto, nino, bebe, total_ninos, total_bebes, total)
+
+def ranking(totales: np.ndarray) -> np.ndarray:
+    """Índices de las ofertas de más barata a más cara para cada mezcla (columna)"""
+    return np.argsort(totales, axis=0, kind="stable")
+
+def formatear_importe(valor: float, moneda: str = MONEDA, decimales: int = 2) -> str:
+    """Formato de precio común: '$1,234.50 USD' o '1,234.50 EUR'"""
+    simbolo = "$" if moneda == "USD" else ""
+    return f"{simbolo}{float(valor):,.{decimales}f} {moneda}"
+
+# ============================================================================
+# PRESUPUESTO POR ESCENARIOS
+# ============================================================================
+
+# Costos por nivel (tabla "presupuesto" de datos/tablas.json): vuelo por adulto
+# (ida y vuelta), hotel por noche y gastos diarios por persona
+
+@derivado
+def _matriz_costos(tablas) -> np.ndarray:
+    costos = tablas["presupuesto"]
+    return np.array([[costos[n][c] for c in COLUMNAS_PRESUPUESTO] for n in NIVELES_PRESUPUESTO], dtype=float)
+
+def nivel_presupuesto(nivel: str) -> str:
+    """Nivel válido; los desconocidos se tratan como 'medio'"""
+    nivel = nivel.lower()
+    return nivel if nivel in NIVELES_PRESUPUESTO else "medio"
+
+class DesglosePresupuesto(NamedTuple):
+    """Cada campo es un array (días, niveles, mezclas)"""
+    vuelos: np.ndarray
+    alojamiento: np.ndarray
+    comida: np.ndarray
+    actividades: np.ndarray
+    transporte: np.ndarray
+    otros: np.ndarray
+    total: np.ndarray
+    personas: np.ndarray  # (mezclas,)
+
+def presupuesto_escenarios(dias: Sequence[int], niveles: Sequence[str],
+                           mezclas: Sequence[MezclaViajeros]) -> DesglosePresupuesto:
+    """
+    Calcula en una sola pasada todas las combinaciones días × nivel × mezcla.
+    El alojamiento es por habitación (no depende del número de viajeros).
+    """
+    d = np.asarray(dias, dtype=float)[:, None, None]
+    costos = _matriz_costos()[[NIVELES_PRESUPUESTO.index(nivel_presupuesto(n)) for n in niveles]]
+    personas = np.array([m.total for m in mezclas], dtype=float)
+
+    vuelos = precios_grupo(costos[:, 0], mezclas).total[None, :, :]
+    alojamiento = d * costos[None, :, 1, None]
+    por_persona = d * personas[None, None, :]
+    comida = por_persona * costos[None, :, 2, None]
+    actividades = por_persona * costos[None, :, 3, None]
+    transporte = por_persona * costos[None, :, 4, None]
+    otros = por_persona * costos[None, :, 5, None]
+
+    forma = (len(dias), len(niveles), len(mezclas))
+    vuelos, alojamiento = np.broadcast_to(vuelos, forma), np.broadcast_to(alojamiento, forma)
+    total = vuelos + alojamiento + comida + actividades + transporte + otros
+    return DesglosePresupuesto(vuelos, alojamiento, comida, actividades, transporte, otros, total, personas)
@@ -0,0 +1,343 @@
+"""
+⚡ PREPROCESADOR DETERMINISTA DE MENSAJES
+Antes de llamar al modelo reconoce viajeros ("Juan (30) y María (28)"),
+fechas (2026-03-15, "del 15 al 20 de marzo"), duración ("5 días") y nivel
+de presupuesto, además de la ruta ("de Lima a Cusco") para la precarga
+especulativa. Registra los viajeros directamente, añade los datos al
+mensaje para que el modelo no tenga que extraerlos con herramientas y, si
+el mensaje solo traía viajeros, responde sin pasar por el LLM.
+
+Un nombre con un número no basta para registrar a alguien ("Barcelona (4 días)
+y Madrid (3)"): se descartan lugares conocidos y hace falta una señal de que
+se habla de viajeros (ver `pista_viajeros`)
+"""
+
+import os
+import re
+import time
+import unicodedata
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from configuracion import NIVEL_ITINERARIO, derivado
+from geografia import normalizar, ubicar
+from metricas import metricas
+from popularidad import MESES
+from viajeros import tipo_por_edad, viajeros_db
+
+# Tokens (prompt + respuesta) que cuesta una iteración del agente: prompt del
+# sistema, esquemas de herramientas e historial corto. Solo para estimar ahorro
+TOKENS_POR_ITERACION = int(os.getenv("PREPROCESADOR_TOKENS_ITERACION", "2500"))
+
+NIVELES = {
+    "economico": "economico", "economica": "economico", "barato": "economico", "barata": "economico",
+    "bajo": "economico", "baja": "economico", "low cost": "economico",
+    "medio": "medio", "media": "medio", "moderado": "medio", "moderada": "medio",
+    "intermedio": "medio", "intermedia": "medio",
+    "lujo": "lujo", "lujoso": "lujo", "alto": "lujo", "alta": "lujo", "premium": "lujo",
+}
+
+_NOMBRE = r"([A-ZÁÉÍÓÚÑ][a-záéíóúñü]+(?:\s+[A-ZÁÉÍÓÚÑ][a-záéíóúñü]+)?)"
+_MES = "(" + "|".join(sorted(MESES, key=len, reverse=True)) + ")"
+_ANIO = r"(?:\s+(?:de|del)?\s*(\d{4}))?"
+
+PATRONES_VIAJERO = [
+    re.compile(_NOMBRE + r"\s*\(\s*(\d{1,3})\s*(?:años)?\s*\)"),
+    re.compile(_NOMBRE + r",?\s+(?:de\s+)?(\d{1,3})\s+años\b"),
+]
+PATRON_FECHA_ISO = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+PATRON_RANGO_MES = re.compile(r"\bdel?\s+(\d{1,2})\s+al?\s+(\d{1,2})\s+de\s+" + _MES + _ANIO, re.IGNORECASE)
+PATRON_RANGO_DOS_MESES = re.compile(
+    r"\bdel?\s+(\d{1,2})\s+de\s+" + _MES + r"\s+al?\s+(\d{1,2})\s+de\s+" + _MES + _ANIO, re.IGNORECASE)
+PATRON_DIAS = re.compile(r"\b(\d{1,2})\s+(d[ií]as|noches)\b", re.IGNORECASE)
+PATRON_SEMANAS = re.compile(r"\b(una|un|dos|tres|\d)\s+semanas?\b", re.IGNORECASE)
+PATRON_NIVEL = re.compile(r"\b(econ[oó]mic[oa]|barat[oa]|low cost|de lujo|lujos[oa]|lujo|premium|"
+                          r"(?:presupuesto|nivel|gama)\s+(?:medi[oa]|moderad[oa]|intermedi[oa]|baj[oa]|alt[oa]))\b",
+                          re.IGNORECASE)
+
+# Señales de que el mensaje habla de quién viaja (sin ellas, un solo "Nombre (30)" no se registra)
+PATRON_PISTA_VIAJEROS = re.compile(
+    r"\b(?:somos|seremos|viajamos|viajaremos|viajan|viajo|viajar[aá]n?|viajeros?|personas?|años|edad(?:es)?|"
+    r"familia|esposa|esposo|mujer|marido|hij[oa]s?|pareja|amig[oa]s?|novi[oa]|mam[aá]|pap[aá]|"
+    r"beb[eé]s?|niñ[oa]s?|adultos?)\b", re.IGNORECASE)
+
+# Palabra justo antes de un lugar ("visitar Madrid (3)"): lo que sigue no es un viajero
+PATRON_ANTES_DE_LUGAR = re.compile(r"\b(?:a|en|hacia|hasta|para|desde|de|visitar|conocer|recorrer|por)\s*$",
+                                   re.IGNORECASE)
+
+@derivado
+def patrones_ruta(tablas) -> Dict[str, re.Pattern]:
+    """Origen y destino entre las ciudades con código IATA (se rehace al recargar las tablas)"""
+    ciudad = "(" + "|".join(re.escape(c) for c in sorted(tablas["codigos_iata"], key=len, reverse=True)) + ")"
+    return {
+        "ruta": re.compile(r"\bde(?:sde)?\s+" + ciudad + r"\s+(?:a|hacia|hasta)\s+" + ciudad + r"\b", re.IGNORECASE),
+        "origen": re.compile(r"\b(?:desde|saliendo de|salimos de|salgo de|vivo en|vivimos en)\s+" + ciudad + r"\b",
+                             re.IGNORECASE),
+        "destino": re.compile(r"\b(?:a|hacia|para|en|visitar|conocer)\s+" + ciudad + r"\b", re.IGNORECASE),
+    }
+
+@derivado
+def lugares_conocidos(tablas) -> frozenset:
+    """Ciudades con código IATA (normalizadas): nunca son nombres de viajeros"""
+    return frozenset(normalizar(ciudad) for ciudad in tablas["codigos_iata"])
+
+def es_lugar(nombre: str) -> bool:
+    """True si el nombre es una ciudad o un país conocido (tablas o índice geográfico)"""
+    return normalizar(nombre) in lugares_conocidos() or ubicar(nombre) is not None
+
+# Palabras que pueden acompañar a una lista de viajeros sin pedir nada más
+_RELLENO = set("""
+hola buenas somos seremos viajamos viajaremos vamos iremos viajan viajeros viajero personas persona
+y e con mi mis su sus nuestro nuestra nuestros el la los las un una dos tres cuatro cinco seis siete
+ocho nueve diez de del años año son es esposa esposo hijo hija hijos hijas amigo amiga amigos novia
+novio pareja mama mamá papa papá bebe bebé ella el él yo soy nosotros
+""".split())
+
+class Preprocesado:
+    """Resultado de preprocesar un mensaje"""
+    def __init__(self, mensaje: str):
+        self.mensaje = mensaje
+        self.viajeros: List[Tuple[str, int]] = []
+        self.registrados: List[Dict[str, Any]] = []
+        self.fecha_ida: Optional[str] = None
+        self.fecha_vuelta: Optional[str] = None
+        self.dias: Optional[int] = None
+        self.presupuesto: Optional[str] = None
+        self.origen: Optional[str] = None
+        self.destino: Optional[str] = None
+        self.respuesta_directa: Optional[str] = None
+        self.iteraciones_ahorradas = 0
+        self.segundos = 0.0
+
+    @property
+    def hay_datos(self) -> bool:
+        """True si se aplicó algo (viajeros ya registrados antes no cuentan)"""
+        return bool(self.registrados or self.fecha_ida or self.dias or self.presupuesto)
+
+    @property
+    def tokens_ahorrados(self) -> int:
+        return self.iteraciones_ahorradas * TOKENS_POR_ITERACION
+
+    def hechos(self) -> List[str]:
+        lineas = []
+        if self.registrados:
+            nombres = ", ".join(f"{v['nombre']} ({v['edad']}, {v['tipo']})" for v in self.registrados)
+            lineas.append(f"Viajeros YA registrados con gestionar_viajeros (no repetir): {nombres}")
+        if self.fecha_ida:
+            fechas = f"ida {self.fecha_ida}" + (f", vuelta {self.fecha_vuelta}" if self.fecha_vuelta else "")
+            lineas.append(f"Fechas: {fechas}")
+        if self.dias:
+            lineas.append(f"Duración: {self.dias} días")
+        if self.presupuesto:
+            lineas.append(f"Presupuesto: {self.presupuesto} (en generar_itinerario: "
+                          f"'{NIVEL_ITINERARIO[self.presupuesto]}')")
+        return lineas
+
+    @property
+    def mensaje_agente(self) -> str:
+        """Mensaje para el modelo con los datos ya extraídos al final"""
+        hechos = self.hechos()
+        if not hechos:
+            return self.mensaje
+        return self.mensaje + "\n\n[Datos detectados automáticamente]\n" + "\n".join(f"- {h}" for h in hechos)
+
+    def resumen(self) -> Dict[str, Any]:
+        return {"viajeros": len(self.registrados), "fecha_ida": self.fecha_ida, "fecha_vuelta": self.fecha_vuelta,
+                "dias": self.dias, "presupuesto": self.presupuesto, "origen": self.origen,
+                "destino": self.destino, "directa": self.respuesta_directa is not None,
+                "tokens_ahorrados": self.tokens_ahorrados, "ms": round(self.segundos * 1000, 2)}
+
+# ============================================================================
+# EXTRACCIÓN
+# ============================================================================
+
+def _sin_acentos(texto: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", texto) if unicodedata.category(c) != "Mn")
+
+def _fecha(dia: int, mes: int, anio: Optional[int], hoy: date) -> Optional[date]:
+    """Sin año se toma la próxima vez que llega esa fecha"""
+    try:
+        fecha = date(anio or hoy.year, mes, dia)
+        if anio is None and fecha < hoy:
+            fecha = date(hoy.year + 1, mes, dia)
+        return fecha
+    except ValueError:
+        return None
+
+def extraer_viajeros(texto: str) -> Tuple[List[Tuple[str, int]], List[Tuple[int, int]]]:
+    """[(nombre, edad)] y los tramos de texto reconocidos (sin comprobar aún `pista_viajeros`)"""
+    viajeros, tramos, vistos = [], [], set()
+    for patron in PATRONES_VIAJERO:
+        for m in patron.finditer(texto):
+            if any(a <= m.start() < b for a, b in tramos):
+                continue
+            # "Somos Juan (30)": la primera palabra de la frase no es parte del nombre
+            palabras = m.group(1).split()
+            while palabras and _sin_acentos(palabras[0].lower()) in _RELLENO:
+                palabras.pop(0)
+            nombre, edad = " ".join(palabras), int(m.group(2))
+            if not nombre or edad > 120 or nombre.lower() in vistos:
+                continue
+            # "La Paz (3)", "visitar Toledo (2)": lugares, no personas. Con "años"
+            # explícito sí es una persona aunque se llame como una ciudad ("Santiago, 35 años")
+            lugar = es_lugar(m.group(1)) or es_lugar(nombre)
+            if ((lugar and "años" not in m.group(0).lower())
+                    or PATRON_ANTES_DE_LUGAR.search(texto[:m.start() + m.group(1).index(palabras[0])])):
+                continue
+            vistos.add(nombre.lower())
+            viajeros.append((nombre, edad))
+            tramos.append(m.span())
+    return viajeros, tramos
+
+def pista_viajeros(texto: str, viajeros: List[Tuple[str, int]]) -> bool:
+    """
+    True si es razonable registrar los viajeros: el mensaje habla de quién
+    viaja ("somos", "años", "mi esposa"...) o enumera varios nombres con edad
+    """
+    return bool(viajeros) and (len(viajeros) >= 2 or PATRON_PISTA_VIAJEROS.search(texto) is not None)
+
+def extraer_fechas(texto: str, hoy: Optional[date] = None) -> Tuple[Optional[str], Optional[str], List[Tuple[int, int]]]:
+    hoy = hoy or date.today()
+    iso = []
+    for m in PATRON_FECHA_ISO.finditer(texto):
+        try:
+            iso.append((datetime.strptime(m.group(1), "%Y-%m-%d").date(), m.span()))
+        except ValueError:
+            pass
+    if iso:
+        ida = iso[0][0]
+        vuelta = iso[1][0] if len(iso) > 1 and iso[1][0] > ida else None
+        return ida.isoformat(), vuelta.isoformat() if vuelta else None, [t for _, t in iso[:2]]
+
+    m = PATRON_RANGO_DOS_MESES.search(texto)
+    if m:
+        anio = int(m.group(5)) if m.group(5) else None
+        ida = _fecha(int(m.group(1)), MESES[m.group(2).lower()], anio, hoy)
+        vuelta = _fecha(int(m.group(3)), MESES[m.group(4).lower()], anio, hoy)
+        if ida and vuelta and vuelta < ida:
+            # "del 20 de diciembre al 5 de enero": la vuelta es del año siguiente
+            vuelta = _fecha(vuelta.day, vuelta.month, vuelta.year + 1, hoy)
+    else:
+        m = PATRON_RANGO_MES.search(texto)
+        if not m:
+            return None, None, []
+        anio = int(m.group(4)) if m.group(4) else None
+        mes = MESES[m.group(3).lower()]
+        dia_ida, dia_vuelta = int(m.group(1)), int(m.group(2))
+        if dia_ida <= dia_vuelta:
+            ida = _fecha(dia_ida, mes, anio, hoy)
+            vuelta = _fecha(dia_vuelta, mes, ida.year, hoy) if ida else None
+        else:
+            # "del 28 al 2 de marzo": la ida es del mes anterior ("del 30 al 2 de marzo" no existe)
+            vuelta = _fecha(dia_vuelta, mes, anio, hoy)
+            ida = _fecha(dia_ida, mes - 1 or 12, vuelta.year - (mes == 1), hoy) if vuelta else None
+            if ida and ida < hoy:
+                # Sin año explícito, el próximo rango que aún no empezó
+                ida = _fecha(ida.day, ida.month, ida.year + 1, hoy) if anio is None else None
+                vuelta = _fecha(vuelta.day, vuelta.month, vuelta.year + 1, hoy) if ida else None
+    if not ida:
+        return None, None, []
+    return ida.isoformat(), vuelta.isoformat() if vuelta else None, [m.span()]
+
+def extraer_dias(texto: str) -> Optional[int]:
+    m = PATRON_DIAS.search(texto)
+    if m:
+        numero = int(m.group(1))
+        return numero + 1 if m.group(2).lower() == "noches" else numero
+    m = PATRON_SEMANAS.search(texto)
+    if m:
+        valor = m.group(1).lower()
+        return 7 * ({"una": 1, "un": 1, "dos": 2, "tres": 3}.get(valor) or int(valor))
+    return None
+
+def extraer_presupuesto(texto: str) -> Optional[str]:
+    m = PATRON_NIVEL.search(texto)
+    if not m:
+        return None
+    # Toda la expresión ("low cost", "de lujo", "gama media"...), sin el prefijo
+    nivel = re.sub(r"^(?:de|presupuesto|nivel|gama)\s+", "", _sin_acentos(m.group(1).lower()))
+    return NIVELES.get("lujoso" if nivel.startswith("lujos") else nivel)
+
+def extraer_ruta(texto: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (origen, destino) tal como los escribió el usuario. Solo se usa para
+    precargar cachés: no se pasa al modelo, que decide con el texto completo
+    """
+    patrones = patrones_ruta()
+    m = patrones["ruta"].search(texto)
+    if m:
+        return m.group(1), m.group(2)
+    m = patrones["origen"].search(texto)
+    origen = m.group(1) if m else None
+    for m in patrones["destino"].finditer(texto):
+        if not origen or m.group(1).lower() != origen.lower():
+            return origen, m.group(1)
+    return origen, None
+
+def _solo_viajeros(texto: str, tramos: List[Tuple[int, int]]) -> bool:
+    """True si, quitando los viajeros reconocidos, solo queda relleno"""
+    resto = texto
+    for a, b in sorted(tramos, reverse=True):
+        resto = resto[:a] + " " + resto[b:]
+    palabras = re.findall(r"[a-záéíóúñü]+", resto.lower())
+    return all(p in _RELLENO or _sin_acentos(p) in _RELLENO for p in palabras)
+
+# ============================================================================
+# APLICACIÓN
+# ============================================================================
+
+def preprocesar(mensaje: str, hoy: Optional[date] = None) -> Preprocesado:
+    """
+    Extrae los datos del mensaje y registra los viajeros nuevos en la lista
+    activa (viajeros_db del contexto actual)
+    """
+    inicio = time.perf_counter()
+    resultado = Preprocesado(mensaje)
+    resultado.viajeros, tramos = extraer_viajeros(mensaje)
+    if not pista_viajeros(mensaje, resultado.viajeros):
+        # Sin señal de viajeros: que lo decida el modelo con el texto completo
+        resultado.viajeros, tramos = [], []
+    resultado.fecha_ida, resultado.fecha_vuelta, tramos_fechas = extraer_fechas(mensaje, hoy)
+    resultado.dias = extraer_dias(mensaje)
+    if resultado.dias is None and resultado.fecha_ida and resultado.fecha_vuelta:
+        resultado.dias = (date.fromisoformat(resultado.fecha_vuelta) - date.fromisoformat(resultado.fecha_ida)).days + 1
+    resultado.presupuesto = extraer_presupuesto(mensaje)
+    resultado.origen, resultado.destino = extraer_ruta(mensaje)
+
+    existentes = {v["nombre"].lower() for v in viajeros_db.listar()}
+    for nombre, edad in resultado.viajeros:
+        if nombre.lower() not in existentes:
+            resultado.registrados.append(viajeros_db.agregar(nombre, edad, tipo_por_edad(edad)))
+
+    if resultado.registrados:
+        # Una iteración del modelo para llamar a gestionar_viajeros
+        resultado.iteraciones_ahorradas = 1
+        if _solo_viajeros(mensaje, tramos) and not tramos_fechas:
+            resultado.respuesta_directa = respuesta_viajeros(resultado.registrados)
+            # ...y otra para redactar la respuesta
+            resultado.iteraciones_ahorradas = 2
+
+    resultado.segundos = time.perf_counter() - inicio
+    metricas.incrementar("preprocesador_turnos_total",
+                         ruta="directa" if resultado.respuesta_directa else "asistida" if resultado.hay_datos else "sin_datos")
+    metricas.incrementar("preprocesador_tokens_ahorrados_total", resultado.tokens_ahorrados)
+    metricas.incrementar("preprocesador_segundos_total", resultado.segundos)
+    return resultado
+
+def respuesta_viajeros(registrados: List[Dict[str, Any]]) -> str:
+    """Misma información que daría el agente tras registrar a los viajeros"""
+    iconos = {"adulto": "👨", "niño": "🧒", "bebé": "👶"}
+    lineas = [f"✅ ¡Perfecto! Registré a {len(registrados)} viajero(s):"]
+    lineas += [f"   {iconos[v['tipo']]} {v['nombre']} ({v['edad']} años) - {v['tipo']}" for v in registrados]
+    conteo = viajeros_db.contar_por_tipo()
+    lineas.append(f"\n👥 Total del grupo: {sum(conteo.values())} "
+                  f"(adultos: {conteo['adulto']}, niños: {conteo['niño']}, bebés: {conteo['bebé']})")
+    lineas.append("\n🌍 ¿A dónde les gustaría viajar y por cuántos días?")
+    return "\n".join(lineas)
+
+def registrar_respuesta_directa(agente, config: Dict[str, Any], preprocesado: Preprocesado):
+    """Añade el intercambio al historial del agente como si lo hubiera respondido el modelo"""
+    from langchain_core.messages import AIMessage, HumanMessage
+    agente.update_state(config, {"messages": [HumanMessage(content=preprocesado.mensaje_agente),
+                                              AIMessage(content=preprocesado.respuesta_directa)]},
+                        as_node="agent")
@@ -0,0 +1,203 @@
+"""
+🛡️ INTERRUPTORES Y PETICIONES DE COBERTURA PARA SERVICIOS EXTERNOS
+Cada servicio externo (Wikipedia, Open-Meteo, Amadeus) tiene un interruptor:
+tras varios fallos o respuestas lentas seguidas se abre y las llamadas fallan
+al instante (CircuitoAbierto) para que el llamador use la caché, el paquete
+offline o los datos simulados. Pasado un tiempo deja pasar una llamada de
+prueba y, si va bien, se cierra.
+
+Opcionalmente, si una petición idempotente tarda más que el percentil
+COBERTURA_PERCENTIL de las anteriores, se lanza una segunda igual y se usa
+la que responda primero
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as TiempoAgotado
+from typing import Callable, Dict, Optional, TypeVar
+
+import requests
+
+from metricas import metricas
+
+# Fallos (o llamadas lentas) consecutivos que abren el interruptor
+UMBRAL_FALLOS = int(os.getenv("CIRCUITO_FALLOS", "5"))
+
+# Segundos que el interruptor permanece abierto antes de dejar pasar una prueba
+TIEMPO_ABIERTO = float(os.getenv("CIRCUITO_ABIERTO_S", "30"))
+
+# Una llamada que tarda más que esto cuenta como fallo aunque responda
+LLAMADA_LENTA = float(os.getenv("CIRCUITO_LENTA_S", "5"))
+
+# Percentil de latencia a partir del cual se lanza la petición de cobertura (0 = nunca)
+COBERTURA_PERCENTIL = float(os.getenv("COBERTURA_PERCENTIL", "95"))
+
+# Latencias necesarias antes de fiarse del percentil
+MUESTRAS_MINIMAS = 20
+
+R = TypeVar("R")
+
+class CircuitoAbierto(Exception):
+    """El servicio está marcado como no disponible; usar el camino alternativo"""
+    def __init__(self, nombre: str):
+        super().__init__(f"{nombre}: circuito abierto")
+        self.nombre = nombre
+
+# ============================================================================
+# INTERRUPTOR
+# ============================================================================
+
+CERRADO, ABIERTO, SEMIABIERTO = "cerrado", "abierto", "semiabierto"
+_VALOR_ESTADO = {CERRADO: 0, SEMIABIERTO: 1, ABIERTO: 2}
+
+class Interruptor:
+    """Interruptor clásico cerrado -> abierto -> semiabierto -> cerrado"""
+    def __init__(self, nombre: str, umbral_fallos: int = UMBRAL_FALLOS,
+                 tiempo_abierto: float = TIEMPO_ABIERTO):
+        self.nombre = nombre
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_abierto = tiempo_abierto
+        self.estado = CERRADO
+        self.fallos = 0
+        self.abierto_desde = 0.0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+        metricas.fijar("circuito_estado", 0, upstream=nombre)
+
+    def _cambiar(self, estado: str):
+        if estado == ABIERTO and self.estado != ABIERTO:
+            metricas.incrementar("circuito_aperturas_total", upstream=self.nombre)
+        self.estado = estado
+        metricas.fijar("circuito_estado", _VALOR_ESTADO[estado], upstream=self.nombre)
+
+    def disponible(self) -> bool:
+        """True si una llamada ahora no sería rechazada (sin reservar la prueba)"""
+        with self._lock:
+            if self.estado == ABIERTO:
+                return time.monotonic() - self.abierto_desde >= self.tiempo_abierto
+            return not (self.estado == SEMIABIERTO and self._prueba_en_curso)
+
+    def permitir(self) -> bool:
+        """Reserva el paso de una llamada; en semiabierto solo pasa una a la vez"""
+        with self._lock:
+            if self.estado == ABIERTO:
+                if time.monotonic() - self.abierto_desde < self.tiempo_abierto:
+                    return False
+                self._cambiar(SEMIABIERTO)
+            if self.estado == SEMIABIERTO:
+                if self._prueba_en_curso:
+                    return False
+                self._prueba_en_curso = True
+            return True
+
+    def registrar(self, exito: bool):
+        with self._lock:
+            self._prueba_en_curso = False
+            if exito:
+                self.fallos = 0
+                if self.estado != CERRADO:
+                    self._cambiar(CERRADO)
+                return
+            self.fallos += 1
+            if self.estado == SEMIABIERTO or self.fallos >= self.umbral_fallos:
+                self.abierto_desde = time.monotonic()
+                self._cambiar(ABIERTO)
+
+# ============================================================================
+# SERVICIO EXTERNO
+# ============================================================================
+
+# Hilos para las peticiones de cobertura (y la original que compite con ellas)
+_pool_cobertura = ThreadPoolExecutor(max_workers=int(os.getenv("COBERTURA_HILOS", "16")),
+                                     thread_name_prefix="cobertura")
+
+def es_fallo_http(respuesta: requests.Response) -> bool:
+    """Errores del servidor; los 4xx (incluido 429) son respuestas válidas del servicio"""
+    return respuesta.status_code >= 500
+
+class Upstream:
+    """Interruptor + latencias recientes + cobertura opcional de un servicio externo"""
+    def __init__(self, nombre: str, cobertura: bool = False, llamada_lenta: float = LLAMADA_LENTA,
+                 percentil: float = COBERTURA_PERCENTIL, **opciones_interruptor):
+        self.nombre = nombre
+        self.cobertura = cobertura and percentil > 0
+        self.llamada_lenta = llamada_lenta
+        self.percentil = percentil
+        self.interruptor = Interruptor(nombre, **opciones_interruptor)
+        self._latencias: deque = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    def disponible(self) -> bool:
+        return self.interruptor.disponible()
+
+    def umbral_cobertura(self) -> Optional[float]:
+        """Latencia del percentil configurado (None mientras haya pocas muestras)"""
+        with self._lock:
+            if len(self._latencias) < MUESTRAS_MINIMAS:
+                return None
+            ordenadas = sorted(self._latencias)
+        indice = min(len(ordenadas) - 1, int(len(ordenadas) * self.percentil / 100))
+        return ordenadas[indice]
+
+    def llamar(self, peticion: Callable[[], R], es_fallo: Callable[[R], bool] = es_fallo_http) -> R:
+        """
+        Ejecuta `peticion` (sin argumentos, idempotente si hay cobertura).
+        Lanza CircuitoAbierto sin llamar si el servicio no está disponible;
+        las excepciones de la petición se propagan y cuentan como fallo
+        """
+        if not self.interruptor.permitir():
+            metricas.incrementar("circuito_rechazos_total", upstream=self.nombre)
+            raise CircuitoAbierto(self.nombre)
+        inicio = time.monotonic()
+        try:
+            respuesta = self._con_cobertura(peticion) if self.cobertura else peticion()
+        except Exception:
+            self.interruptor.registrar(False)
+            metricas.incrementar("upstream_errores_total", upstream=self.nombre)
+            raise
+        duracion = time.monotonic() - inicio
+        fallo = es_fallo(respuesta)
+        if not fallo:
+            with self._lock:
+                self._latencias.append(duracion)
+        self.interruptor.registrar(not fallo and duracion < self.llamada_lenta)
+        metricas.incrementar("upstream_llamadas_total", upstream=self.nombre)
+        metricas.incrementar("upstream_segundos_total", duracion, upstream=self.nombre)
+        return respuesta
+
+    def _con_cobertura(self, peticion: Callable[[], R]) -> R:
+        umbral = self.umbral_cobertura()
+        if umbral is None:
+            return peticion()
+        # Copia del contexto: la petición sigue viendo el plazo del turno
+        original = _pool_cobertura.submit(contextvars.copy_context().run, peticion)
+        try:
+            return original.result(timeout=umbral)
+        except TiempoAgotado:
+            pass
+        metricas.incrementar("cobertura_peticiones_total", upstream=self.nombre)
+        cobertura = _pool_cobertura.submit(contextvars.copy_context().run, peticion)
+        error: Optional[BaseException] = None
+        for futuro in as_completed([original, cobertura]):
+            if futuro.exception() is None:
+                if futuro is cobertura:
+                    metricas.incrementar("cobertura_ganadas_total", upstream=self.nombre)
+                return futuro.result()
+            error = futuro.exception()
+        raise error
+
+    def estado(self) -> Dict[str, object]:
+        """Resumen para mostrar en la interfaz o en logs"""
+        umbral = self.umbral_cobertura()
+        return {"estado": self.interruptor.estado, "fallos": self.interruptor.fallos,
+                "umbral_cobertura_s": round(umbral, 3) if umbral is not None else None}
+
+# Instancias globales. Amadeus sin cobertura: cada petición extra gasta cuota
+upstream_wikipedia = Upstream("wikipedia", cobertura=True)
+upstream_open_meteo = Upstream("open_meteo", cobertura=True)
+upstream_amadeus = Upstream("amadeus", llamada_lenta=float(os.getenv("CIRCUITO_LENTA_AMADEUS_S", "10")))
+UPSTREAMS = (upstream_wikipedia, upstream_open_meteo, upstream_amadeus)
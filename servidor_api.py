@@ -0,0 +1,485 @@
+"""
+🌐 API HTTP DEL AGENTE
+Servidor ASGI (FastAPI) para clientes móviles y de socios, independiente de
+Streamlit. Cada sesión tiene su propio thread_id y su lista de viajeros; las
+respuestas pueden recibirse completas o en streaming (server-sent events)
+con los tokens y los eventos de herramientas
+
+Uso:
+    uvicorn servidor_api:app --host 0.0.0.0 --port 8000
+    SESIONES_URL=redis://localhost:6379/0 uvicorn servidor_api:app --workers 4
+
+Endpoints:
+    POST   /sesiones                          -> {"sesion_id", "thread_id"}
+    POST   /sesiones/{id}/mensajes            -> respuesta completa (JSON)
+    POST   /sesiones/{id}/mensajes/stream     -> text/event-stream
+    GET    /sesiones/{id}/viajeros
+    GET    /sesiones/{id}/vuelos              -> búsquedas de vuelos en segundo plano
+    DELETE /sesiones/{id}
+    GET    /salud, /metricas
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from admision import ESPERA_MAXIMA, MENSAJE_SOBRECARGA, ControlAdmision, Sobrecarga, Ticket, limitar_herramientas
+from metricas import metricas
+from plazos import PLAZO_TURNO, PlazoAgotado, plazo_turno
+from preprocesador import preprocesar, registrar_respuesta_directa
+from resiliencia import UPSTREAMS
+from sesiones import AlmacenSesiones, ConflictoVersion, EstadoSesion, crear_almacen
+from viajeros import ViajerosDB, viajeros_aislados
+from vuelos_progresivos import VUELOS_PROGRESIVOS, busquedas_vuelos
+
+load_dotenv()
+
+# Turnos del agente ejecutándose a la vez en este proceso
+MAX_CONCURRENTES = int(os.getenv("API_MAX_CONCURRENTES", "8"))
+
+# Segundos que una petición espera en la cola de admisión antes de responder 503
+ESPERA_HUECO = float(os.getenv("API_ESPERA_HUECO", str(ESPERA_MAXIMA)))
+
+# Eventos pendientes por stream; si el cliente lee lento, el agente espera
+TAMANO_COLA_EVENTOS = int(os.getenv("API_COLA_EVENTOS", "256"))
+
+MAX_SESIONES = int(os.getenv("API_MAX_SESIONES", "10000"))
+
+# ============================================================================
+# CHECKPOINTER COMPARTIDO
+# ============================================================================
+
+def crear_checkpointer(almacen: AlmacenSesiones, url: Optional[str] = None):
+    """
+    'sesiones' (por defecto: el mismo almacén que los viajeros, con control
+    de concurrencia), 'memoria' (un solo worker), 'sqlite:ruta' o postgres://...
+    """
+    url = url or os.getenv("CHECKPOINTER", "sesiones")
+    if url == "sesiones":
+        from checkpointer_sesiones import CheckpointerSesiones
+        return CheckpointerSesiones(almacen)
+    if url == "memoria":
+        return None
+    if url.startswith("sqlite:"):
+        import sqlite3
+        from langgraph.checkpoint.sqlite import SqliteSaver  # pip install langgraph-checkpoint-sqlite
+        conexion = sqlite3.connect(url[len("sqlite:"):], check_same_thread=False)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        saver = SqliteSaver(conexion)
+        saver.setup()
+        return saver
+    if url.startswith(("postgres://", "postgresql://")):
+        from psycopg import Connection  # pip install langgraph-checkpoint-postgres
+        from langgraph.checkpoint.postgres import PostgresSaver
+        saver = PostgresSaver(Connection.connect(url, autocommit=True, prepare_threshold=0))
+        saver.setup()
+        return saver
+    raise ValueError(f"CHECKPOINTER no soportado: {url}")
+
+# ============================================================================
+# SESIONES
+# ============================================================================
+
+def thread_de(sesion_id: str) -> str:
+    return f"api_{sesion_id}"
+
+class Sesion:
+    """Parte local de una sesión: solo la marca de turno en curso en este worker"""
+    def __init__(self, sesion_id: str):
+        self.sesion_id = sesion_id
+        self.thread_id = thread_de(sesion_id)
+        self.ocupada = False
+
+    def ocupar(self) -> bool:
+        """Marca la sesión si estaba libre. Mirar y marcar sin await entre medias: sin carreras en el bucle"""
+        if self.ocupada:
+            return False
+        self.ocupada = True
+        return True
+
+class Reserva:
+    """
+    La sesión ocupada por una petición y su ticket de admisión (si ya lo
+    pidió). Al empezar el turno pasan al hilo del agente, que los suelta al
+    terminar (aunque el cliente se haya ido); si el turno no llega a empezar
+    (503, error, cliente desconectado antes), los suelta `cancelar`
+    """
+    def __init__(self, sesion: Sesion, admision: ControlAdmision):
+        self.sesion = sesion
+        self.admision = admision
+        self.ticket: Optional[Ticket] = None
+        self.en_hilo = False
+        self._soltada = False
+
+    def soltar(self):
+        if not self._soltada:
+            self._soltada = True
+            if self.ticket is not None:
+                self.admision.liberar(self.ticket)
+            self.sesion.ocupada = False
+
+    def cancelar(self):
+        if not self.en_hilo:
+            self.soltar()
+
+class RegistroSesiones:
+    """
+    El estado (viajeros, historial) vive en el almacén compartido, así que
+    cualquier worker puede atender cualquier sesión; aquí solo se guardan
+    los cerrojos locales (LRU acotado)
+    """
+    def __init__(self, almacen: AlmacenSesiones, max_sesiones: int = MAX_SESIONES):
+        self.almacen = almacen
+        self.max_sesiones = max_sesiones
+        self._sesiones: "OrderedDict[str, Sesion]" = OrderedDict()
+
+    def _local(self, sesion_id: str) -> Sesion:
+        sesion = self._sesiones.get(sesion_id)
+        if sesion is None:
+            sesion = self._sesiones[sesion_id] = Sesion(sesion_id)
+            while len(self._sesiones) > self.max_sesiones:
+                self._sesiones.popitem(last=False)
+        self._sesiones.move_to_end(sesion_id)
+        return sesion
+
+    async def crear(self) -> Sesion:
+        sesion_id = uuid.uuid4().hex
+        await asyncio.to_thread(self.almacen.escribir, sesion_id,
+                                {"viajeros": ViajerosDB().a_dict(), "creada": time.time()}, 0)
+        metricas.incrementar("api_sesiones_creadas_total")
+        return self._local(sesion_id)
+
+    async def obtener(self, sesion_id: str) -> Tuple[Sesion, EstadoSesion]:
+        estado = await asyncio.to_thread(self.almacen.leer, sesion_id)
+        if estado.version == 0:
+            raise HTTPException(status_code=404, detail="Sesión no encontrada")
+        return self._local(sesion_id), estado
+
+    async def eliminar(self, sesion_id: str):
+        from asistente import anticipador
+        anticipador.cancelar(sesion_id)
+        self._sesiones.pop(sesion_id, None)
+        await asyncio.to_thread(self.almacen.eliminar, sesion_id)
+        await asyncio.to_thread(self.almacen.eliminar_hilo, thread_de(sesion_id))
+
+# ============================================================================
+# EJECUCIÓN DE TURNOS
+# ============================================================================
+
+class MensajeInput(BaseModel):
+    mensaje: str = Field(min_length=1, max_length=4000, description="Mensaje del usuario")
+    plazo_s: Optional[float] = Field(default=None, gt=0, le=PLAZO_TURNO,
+                                     description="Segundos máximos del turno (por defecto PLAZO_TURNO_S)")
+
+class Saturado(Exception):
+    """Turno no admitido: cola de admisión llena o sin hueco a tiempo"""
+
+class Motor:
+    """
+    Agente compartido por todas las sesiones del proceso. El grafo se ejecuta
+    en hilos (las herramientas y el checkpointer son síncronos) y los eventos
+    pasan al bucle asyncio por una cola acotada
+    """
+    def __init__(self, agente, almacen: AlmacenSesiones, max_concurrentes: int = MAX_CONCURRENTES):
+        self.agente = agente
+        self.almacen = almacen
+        self.capacidad = max_concurrentes
+        self.admision = ControlAdmision(max_turnos=max_concurrentes, espera_maxima=ESPERA_HUECO, nombre="api")
+        self._hilos = ThreadPoolExecutor(max_workers=max_concurrentes, thread_name_prefix="turno")
+
+    @property
+    def en_curso(self) -> int:
+        return self.admision.en_curso
+
+    def reservar(self, reserva: Reserva) -> Ticket:
+        """
+        Entra en la cola justa de admisión; Saturado si hay que descartar la
+        petición ya. El ticket queda en la reserva: se libera al soltarla
+        """
+        try:
+            reserva.ticket = self.admision.solicitar(reserva.sesion.sesion_id)
+        except Sobrecarga as e:
+            metricas.incrementar("api_rechazadas_total", motivo=e.motivo)
+            raise Saturado(str(e)) from e
+        return reserva.ticket
+
+    async def esperar(self, ticket: Ticket) -> AsyncIterator[int]:
+        """Posiciones en la cola hasta tener hueco; Saturado si se agota la espera"""
+        try:
+            async for posicion in self.admision.posiciones(ticket):
+                yield posicion
+        except Sobrecarga as e:
+            metricas.incrementar("api_rechazadas_total", motivo=e.motivo)
+            raise Saturado(str(e)) from e
+
+    def _ejecutar(self, sesion: Sesion, mensaje: str, emitir, cancelado: threading.Event,
+                  plazo: Optional[float] = None):
+        """
+        Corre en un hilo: carga los viajeros de la sesión, recorre el stream
+        del grafo emitiendo eventos y guarda los viajeros con la versión leída
+        """
+        from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+        from consumo import ConsumoTokens, ContadorTokens, config_turno
+        from asistente import anticipador
+
+        estado = self.almacen.leer(sesion.sesion_id)
+        viajeros = ViajerosDB.desde_dict(estado.datos.get("viajeros"))
+        consumo = ConsumoTokens.desde_dict(estado.datos.get("consumo"))
+        contador = ContadorTokens()
+        config = config_turno({"configurable": {"thread_id": sesion.thread_id}}, consumo, contador)
+        config = limitar_herramientas(config)
+        config["callbacks"].append(anticipador.observador(sesion.sesion_id))
+        config["configurable"]["vuelos_progresivos"] = VUELOS_PROGRESIVOS
+        # Precios reales (o avisos de fallo) que llegaron después del turno anterior: al historial antes de seguir
+        for busqueda in busquedas_vuelos.aplicar(self.agente, config):
+            emitir("vuelos_actualizados", busqueda.a_dict())
+        respuesta = ""
+        with viajeros_aislados(viajeros), plazo_turno(plazo):
+            preprocesado = preprocesar(mensaje)
+            anticipador.observar_preprocesado(sesion.sesion_id, preprocesado)
+            if preprocesado.hay_datos:
+                emitir("preprocesado", preprocesado.resumen())
+            if preprocesado.respuesta_directa:
+                # Solo traía viajeros: ya están registrados, no hace falta el modelo
+                registrar_respuesta_directa(self.agente, config, preprocesado)
+                respuesta = preprocesado.respuesta_directa
+                emitir("token", {"texto": respuesta})
+            grafo = () if respuesta else self.agente.stream(
+                {"messages": [HumanMessage(content=preprocesado.mensaje_agente)]}, config,
+                stream_mode=["messages", "updates"])
+            # Sin tiempo: se guarda lo que haya (viajeros, consumo) y se informa al cliente
+            agotado: Optional[PlazoAgotado] = None
+            try:
+                for modo, datos in grafo:
+                    if cancelado.is_set():
+                        break
+                    if modo == "messages":
+                        fragmento, meta = datos
+                        if isinstance(fragmento, AIMessage) and fragmento.content and meta.get("langgraph_node") == "agent":
+                            emitir("token", {"texto": fragmento.content})
+                        continue
+                    for actualizacion in datos.values():
+                        for m in (actualizacion or {}).get("messages", []):
+                            if isinstance(m, AIMessage):
+                                for llamada in m.tool_calls:
+                                    emitir("herramienta_inicio", {"nombre": llamada["name"], "argumentos": llamada["args"]})
+                                if m.content and not m.tool_calls:
+                                    respuesta = m.content
+                            elif isinstance(m, ToolMessage):
+                                emitir("herramienta_fin", {"nombre": m.name, "resultado": m.content})
+            except PlazoAgotado as e:
+                agotado = e
+        emitir("consumo", {"turno": contador.turno.a_dict(), "sesion": consumo.sumar(contador.turno).a_dict()})
+        en_curso = busquedas_vuelos.en_curso(sesion.thread_id)
+        if en_curso:
+            emitir("vuelos_pendientes", {"busquedas": [b.a_dict() for b in en_curso]})
+        self.almacen.escribir(sesion.sesion_id, {**estado.datos, "viajeros": viajeros.a_dict(),
+                                                 "consumo": consumo.a_dict()}, estado.version)
+        if agotado is not None:
+            raise agotado
+        return respuesta
+
+    async def eventos(self, reserva: Reserva, mensaje: str,
+                      plazo: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Eventos del turno; debe llamarse con el ticket de la reserva ya
+        admitido. El hueco y la sesión se liberan cuando termina el hilo del
+        agente, aunque el cliente se haya desconectado antes
+        """
+        sesion = reserva.sesion
+        bucle = asyncio.get_running_loop()
+        cola: asyncio.Queue = asyncio.Queue(maxsize=TAMANO_COLA_EVENTOS)
+        cancelado = threading.Event()
+        inicio = time.perf_counter()
+
+        def emitir(tipo: str, datos: Dict[str, Any]):
+            # Bloquea el hilo del agente si el cliente no consume (contrapresión)
+            if not cancelado.is_set():
+                asyncio.run_coroutine_threadsafe(cola.put((tipo, datos)), bucle).result()
+
+        def trabajo():
+            try:
+                respuesta = self._ejecutar(sesion, mensaje, emitir, cancelado, plazo)
+                emitir("fin", {"respuesta": respuesta, "duracion_s": round(time.perf_counter() - inicio, 3)})
+            except ConflictoVersion as e:
+                metricas.incrementar("api_conflictos_total")
+                emitir("error", {"detalle": str(e), "conflicto": True})
+            except PlazoAgotado as e:
+                metricas.incrementar("api_plazos_agotados_total")
+                emitir("error", {"detalle": str(e), "plazo_agotado": True})
+            except Exception as e:
+                metricas.incrementar("api_errores_total")
+                emitir("error", {"detalle": f"{type(e).__name__}: {e}"})
+
+        def al_terminar(_):
+            reserva.soltar()
+            metricas.incrementar("api_turnos_total")
+            metricas.incrementar("api_turnos_segundos_total", time.perf_counter() - inicio)
+
+        # Sin await desde aquí hasta el submit: la reserva no queda a medias
+        reserva.en_hilo = True
+        futuro = bucle.run_in_executor(self._hilos, trabajo)
+        futuro.add_done_callback(al_terminar)
+        try:
+            while True:
+                tipo, datos = await cola.get()
+                yield {"evento": tipo, **datos}
+                if tipo in ("fin", "error"):
+                    break
+        finally:
+            cancelado.set()
+            # Desbloquear al hilo si quedó esperando sitio en la cola
+            while not cola.empty():
+                cola.get_nowait()
+
+# ============================================================================
+# APLICACIÓN
+# ============================================================================
+
+@asynccontextmanager
+async def ciclo_vida(app: FastAPI):
+    from asistente import crear_agente_vacaciones
+    almacen = crear_almacen()
+    app.state.motor = Motor(crear_agente_vacaciones(checkpointer=crear_checkpointer(almacen)), almacen)
+    app.state.sesiones = RegistroSesiones(almacen)
+    yield
+
+app = FastAPI(title="Travel Pro AI", version="3.0", lifespan=ciclo_vida)
+
+def _saturado(detalle: str = MENSAJE_SOBRECARGA) -> JSONResponse:
+    return JSONResponse(status_code=503, headers={"Retry-After": "5"}, content={"detalle": detalle})
+
+class RespuestaEventos(StreamingResponse):
+    """
+    Stream SSE que llama a `al_cerrar` al acabar la respuesta pase lo que
+    pase: si el cliente se desconecta antes de que empiece el generador, el
+    finally de este no llega a ejecutarse
+    """
+    def __init__(self, contenido: AsyncIterator[str], al_cerrar: Callable[[], None]):
+        super().__init__(contenido, media_type="text/event-stream",
+                         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        self.al_cerrar = al_cerrar
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.al_cerrar()
+
+def _sse(evento: Dict[str, Any]) -> str:
+    tipo = evento.pop("evento")
+    return f"event: {tipo}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+@app.get("/salud")
+async def salud(request: Request):
+    motor: Motor = request.app.state.motor
+    admision = motor.admision.estado()
+    return {"estado": "ok", "turnos_en_curso": admision["en_curso"], "capacidad": admision["capacidad"],
+            "turnos_en_cola": admision["en_cola"],
+            "upstreams": {u.nombre: u.estado() for u in UPSTREAMS}}
+
+@app.get("/metricas", response_class=PlainTextResponse)
+async def exportar_metricas():
+    return metricas.exportar_prometheus()
+
+@app.post("/sesiones", status_code=201)
+async def crear_sesion(request: Request):
+    sesion = await request.app.state.sesiones.crear()
+    return {"sesion_id": sesion.sesion_id, "thread_id": sesion.thread_id}
+
+@app.delete("/sesiones/{sesion_id}", status_code=204)
+async def eliminar_sesion(sesion_id: str, request: Request):
+    await request.app.state.sesiones.eliminar(sesion_id)
+
+@app.get("/sesiones/{sesion_id}/viajeros")
+async def listar_viajeros(sesion_id: str, request: Request):
+    _, estado = await request.app.state.sesiones.obtener(sesion_id)
+    viajeros = ViajerosDB.desde_dict(estado.datos.get("viajeros"))
+    return {"viajeros": viajeros.listar(), "conteo": viajeros.contar_por_tipo(), "version": estado.version}
+
+@app.get("/sesiones/{sesion_id}/vuelos")
+async def listar_vuelos(sesion_id: str, request: Request):
+    """
+    Búsquedas de vuelos en segundo plano de la sesión (solo las de este
+    worker). Las terminadas ("lista" o "fallida") pasan al historial del
+    agente con el siguiente mensaje; el cliente puede mostrar ya su "mensaje"
+    """
+    sesion, _ = await request.app.state.sesiones.obtener(sesion_id)
+    return {"busquedas": [b.a_dict() for b in busquedas_vuelos.listar(sesion.thread_id)]}
+
+@app.post("/sesiones/{sesion_id}/mensajes")
+async def enviar_mensaje(sesion_id: str, entrada: MensajeInput, request: Request):
+    sesion, _ = await request.app.state.sesiones.obtener(sesion_id)
+    motor: Motor = request.app.state.motor
+    if not sesion.ocupar():
+        raise HTTPException(status_code=409, detail="La sesión ya tiene un mensaje en curso")
+    reserva = Reserva(sesion, motor.admision)
+    try:
+        return await _responder(motor, reserva, entrada)
+    finally:
+        reserva.cancelar()
+
+async def _responder(motor: Motor, reserva: Reserva, entrada: MensajeInput):
+    try:
+        ticket = motor.reservar(reserva)
+        async for _ in motor.esperar(ticket):
+            pass
+    except Saturado as e:
+        return _saturado(str(e))
+
+    herramientas, preprocesado, consumo, vuelos_pendientes = [], None, None, []
+    async for evento in motor.eventos(reserva, entrada.mensaje, entrada.plazo_s):
+        if evento["evento"] == "preprocesado":
+            preprocesado = {k: v for k, v in evento.items() if k != "evento"}
+        elif evento["evento"] == "consumo":
+            consumo = evento["turno"]
+        elif evento["evento"] == "vuelos_pendientes":
+            vuelos_pendientes = evento["busquedas"]
+        elif evento["evento"] == "herramienta_inicio":
+            herramientas.append({"nombre": evento["nombre"], "argumentos": evento["argumentos"]})
+        elif evento["evento"] == "error":
+            estado = 409 if evento.get("conflicto") else 504 if evento.get("plazo_agotado") else 502
+            raise HTTPException(status_code=estado, detail=evento["detalle"])
+        elif evento["evento"] == "fin":
+            return {"respuesta": evento["respuesta"], "herramientas": herramientas,
+                    "preprocesado": preprocesado, "consumo": consumo, "vuelos_pendientes": vuelos_pendientes,
+                    "duracion_s": evento["duracion_s"]}
+
+@app.post("/sesiones/{sesion_id}/mensajes/stream")
+async def enviar_mensaje_stream(sesion_id: str, entrada: MensajeInput, request: Request):
+    sesion, _ = await request.app.state.sesiones.obtener(sesion_id)
+    motor: Motor = request.app.state.motor
+    if not sesion.ocupar():
+        raise HTTPException(status_code=409, detail="La sesión ya tiene un mensaje en curso")
+    reserva = Reserva(sesion, motor.admision)
+    try:
+        ticket = motor.reservar(reserva)
+    except Saturado as e:
+        reserva.cancelar()
+        return _saturado(str(e))
+
+    async def flujo():
+        # Mientras espera hueco, el cliente recibe su posición en la cola
+        try:
+            async for posicion in motor.esperar(ticket):
+                yield _sse({"evento": "cola", "posicion": posicion})
+        except Saturado as e:
+            yield _sse({"evento": "error", "detalle": str(e), "saturado": True})
+            return
+        async for evento in motor.eventos(reserva, entrada.mensaje, entrada.plazo_s):
+            yield _sse(evento)
+
+    # Si el cliente se va antes de que empiece el turno, al cerrar se devuelven la sesión y el ticket
+    return RespuestaEventos(flujo(), al_cerrar=reserva.cancelar)
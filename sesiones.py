@@ -0,0 +1,404 @@
+"""
+🗂️ ESTADO DE SESIÓN COMPARTIDO
+Lista de viajeros, historial y checkpoints del agente guardados fuera del
+proceso, para que cualquier worker detrás de un balanceador pueda atender
+a cualquier sesión. Cada escritura lleva la versión que se leyó
+(concurrencia optimista): si otro worker escribió antes, ConflictoVersion
+
+Implementaciones: SQLite (archivo local, WAL) y Redis (requiere `redis`)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# Por defecto junto al código (no en el directorio de trabajo)
+RUTA_SESIONES = os.getenv("SESIONES_URL", "sqlite:" + os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                   ".estado", "sesiones.sqlite"))
+
+class ConflictoVersion(Exception):
+    """Otro proceso modificó la sesión o el hilo desde que se leyó"""
+
+class EstadoSesion(NamedTuple):
+    datos: Dict[str, Any]
+    version: int  # 0 = la sesión aún no existe
+
+class RegistroCheckpoint(NamedTuple):
+    thread_id: str
+    ns: str
+    checkpoint_id: str
+    padre_id: Optional[str]
+    tipo: str
+    checkpoint: bytes
+    metadata: bytes
+    # Registros anteriores que hacen falta para restaurar este (los de su cadena de deltas)
+    depende_de: Tuple[str, ...] = ()
+
+# (task_id, idx, canal, tipo, valor)
+Escritura = Tuple[str, int, str, str, bytes]
+
+# ============================================================================
+# INTERFAZ
+# ============================================================================
+
+class AlmacenSesiones(ABC):
+    """Interfaz común; las implementaciones solo guardan bytes y JSON"""
+
+    # --- Sesiones -----------------------------------------------------------
+
+    @abstractmethod
+    def leer(self, sesion_id: str) -> EstadoSesion:
+        ...
+
+    @abstractmethod
+    def escribir(self, sesion_id: str, datos: Dict[str, Any], version_esperada: int) -> int:
+        """Guarda si la versión actual es `version_esperada`; devuelve la nueva versión"""
+
+    @abstractmethod
+    def eliminar(self, sesion_id: str):
+        ...
+
+    def actualizar(self, sesion_id: str, cambio: Callable[[Dict[str, Any]], Dict[str, Any]],
+                   reintentos: int = 5) -> EstadoSesion:
+        """Leer-modificar-escribir reintentando si otro worker escribió en medio"""
+        for intento in range(reintentos):
+            estado = self.leer(sesion_id)
+            datos = cambio(dict(estado.datos))
+            try:
+                return EstadoSesion(datos, self.escribir(sesion_id, datos, estado.version))
+            except ConflictoVersion:
+                time.sleep(0.01 * (2 ** intento))
+        raise ConflictoVersion(f"sesión {sesion_id}: demasiadas escrituras concurrentes")
+
+    # --- Checkpoints --------------------------------------------------------
+
+    @abstractmethod
+    def guardar_checkpoint(self, registro: RegistroCheckpoint):
+        """
+        Añade un checkpoint al hilo. Falla con ConflictoVersion si su padre no
+        es el último checkpoint del hilo (otro worker avanzó la conversación)
+        """
+
+    @abstractmethod
+    def obtener_checkpoint(self, thread_id: str, ns: str,
+                           checkpoint_id: Optional[str] = None) -> Optional[RegistroCheckpoint]:
+        """El checkpoint indicado o, sin id, el más reciente"""
+
+    @abstractmethod
+    def listar_checkpoints(self, thread_id: str, ns: Optional[str] = None, antes: Optional[str] = None,
+                           limite: Optional[int] = None) -> Iterator[RegistroCheckpoint]:
+        """Del más reciente al más antiguo"""
+
+    @abstractmethod
+    def guardar_escrituras(self, thread_id: str, ns: str, checkpoint_id: str,
+                           escrituras: Sequence[Escritura], reemplazar: bool):
+        ...
+
+    @abstractmethod
+    def obtener_escrituras(self, thread_id: str, ns: str, checkpoint_id: str) -> List[Escritura]:
+        ...
+
+    @abstractmethod
+    def eliminar_hilo(self, thread_id: str):
+        ...
+
+# ============================================================================
+# SQLITE
+# ============================================================================
+
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS sesiones (
+    id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    datos TEXT NOT NULL,
+    actualizado REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    padre_id TEXT,
+    tipo TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, ns, checkpoint_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS escrituras (
+    thread_id TEXT NOT NULL,
+    ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    canal TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    valor BLOB NOT NULL,
+    PRIMARY KEY (thread_id, ns, checkpoint_id, task_id, idx)
+) WITHOUT ROWID;
+"""
+
+class AlmacenSQLite(AlmacenSesiones):
+    """
+    Archivo SQLite en modo WAL: sirve para varios workers en la misma máquina.
+    Cada hilo usa su propia conexión
+    """
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        if os.path.dirname(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        self._local = threading.local()
+        conexion = self._conexion()
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.executescript(ESQUEMA_SQLITE)
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    @contextmanager
+    def _transaccion(self) -> Iterator[sqlite3.Connection]:
+        """BEGIN IMMEDIATE: toma el bloqueo de escritura antes de leer la versión"""
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            yield conexion
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        conexion.execute("COMMIT")
+
+    # --- Sesiones -----------------------------------------------------------
+
+    def leer(self, sesion_id: str) -> EstadoSesion:
+        fila = self._conexion().execute("SELECT datos, version FROM sesiones WHERE id = ?",
+                                        (sesion_id,)).fetchone()
+        return EstadoSesion(json.loads(fila[0]), fila[1]) if fila else EstadoSesion({}, 0)
+
+    def escribir(self, sesion_id: str, datos: Dict[str, Any], version_esperada: int) -> int:
+        texto = json.dumps(datos, ensure_ascii=False)
+        conexion = self._conexion()
+        if version_esperada == 0:
+            cursor = conexion.execute(
+                "INSERT INTO sesiones (id, version, datos, actualizado) VALUES (?, 1, ?, ?) "
+                "ON CONFLICT(id) DO NOTHING", (sesion_id, texto, time.time()))
+        else:
+            cursor = conexion.execute(
+                "UPDATE sesiones SET version = version + 1, datos = ?, actualizado = ? "
+                "WHERE id = ? AND version = ?", (texto, time.time(), sesion_id, version_esperada))
+        if cursor.rowcount != 1:
+            raise ConflictoVersion(f"sesión {sesion_id}: la versión {version_esperada} ya no es la actual")
+        return version_esperada + 1
+
+    def eliminar(self, sesion_id: str):
+        self._conexion().execute("DELETE FROM sesiones WHERE id = ?", (sesion_id,))
+
+    # --- Checkpoints --------------------------------------------------------
+
+    def guardar_checkpoint(self, registro: RegistroCheckpoint):
+        with self._transaccion() as conexion:
+            ultimo = conexion.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT 1", (registro.thread_id, registro.ns)).fetchone()
+            if ultimo and ultimo[0] != registro.padre_id and ultimo[0] != registro.checkpoint_id:
+                raise ConflictoVersion(f"hilo {registro.thread_id}: otro proceso avanzó la conversación")
+            # Sin caducidad aquí: depende_de no se guarda
+            conexion.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?)", registro[:7])
+
+    def _registro(self, fila) -> RegistroCheckpoint:
+        return RegistroCheckpoint(fila[0], fila[1], fila[2], fila[3], fila[4], bytes(fila[5]), bytes(fila[6]))
+
+    def obtener_checkpoint(self, thread_id: str, ns: str,
+                           checkpoint_id: Optional[str] = None) -> Optional[RegistroCheckpoint]:
+        if checkpoint_id:
+            fila = self._conexion().execute(
+                "SELECT * FROM checkpoints WHERE thread_id = ? AND ns = ? AND checkpoint_id = ?",
+                (thread_id, ns, checkpoint_id)).fetchone()
+        else:
+            fila = self._conexion().execute(
+                "SELECT * FROM checkpoints WHERE thread_id = ? AND ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id, ns)).fetchone()
+        return self._registro(fila) if fila else None
+
+    def listar_checkpoints(self, thread_id: str, ns: Optional[str] = None, antes: Optional[str] = None,
+                           limite: Optional[int] = None) -> Iterator[RegistroCheckpoint]:
+        condiciones, parametros = ["thread_id = ?"], [thread_id]
+        if ns is not None:
+            condiciones.append("ns = ?")
+            parametros.append(ns)
+        if antes is not None:
+            condiciones.append("checkpoint_id < ?")
+            parametros.append(antes)
+        consulta = f"SELECT * FROM checkpoints WHERE {' AND '.join(condiciones)} ORDER BY checkpoint_id DESC"
+        if limite:
+            consulta += f" LIMIT {int(limite)}"
+        for fila in self._conexion().execute(consulta, parametros).fetchall():
+            yield self._registro(fila)
+
+    def guardar_escrituras(self, thread_id: str, ns: str, checkpoint_id: str,
+                           escrituras: Sequence[Escritura], reemplazar: bool):
+        verbo = "INSERT OR REPLACE" if reemplazar else "INSERT OR IGNORE"
+        with self._transaccion() as conexion:
+            conexion.executemany(f"{verbo} INTO escrituras VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                 [(thread_id, ns, checkpoint_id, *e) for e in escrituras])
+
+    def obtener_escrituras(self, thread_id: str, ns: str, checkpoint_id: str) -> List[Escritura]:
+        filas = self._conexion().execute(
+            "SELECT task_id, idx, canal, tipo, valor FROM escrituras "
+            "WHERE thread_id = ? AND ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, ns, checkpoint_id)).fetchall()
+        return [(t, i, c, tp, bytes(v)) for t, i, c, tp, v in filas]
+
+    def eliminar_hilo(self, thread_id: str):
+        with self._transaccion() as conexion:
+            conexion.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            conexion.execute("DELETE FROM escrituras WHERE thread_id = ?", (thread_id,))
+
+# ============================================================================
+# REDIS
+# ============================================================================
+
+class AlmacenRedis(AlmacenSesiones):
+    """
+    Redis (o compatible) para workers en varias máquinas. La concurrencia
+    optimista usa WATCH/MULTI sobre la clave de la sesión o el índice del hilo
+    """
+    def __init__(self, url: str, prefijo: str = "travel:", ttl: int = 7 * 24 * 3600):
+        import redis  # pip install redis
+        self._redis = redis.Redis.from_url(url)
+        self._WatchError = redis.WatchError
+        self.prefijo = prefijo
+        self.ttl = ttl
+
+    def _clave(self, *partes: str) -> str:
+        return self.prefijo + ":".join(partes)
+
+    # --- Sesiones -----------------------------------------------------------
+
+    def leer(self, sesion_id: str) -> EstadoSesion:
+        version, datos = self._redis.hmget(self._clave("sesion", sesion_id), "version", "datos")
+        return EstadoSesion(json.loads(datos), int(version)) if version else EstadoSesion({}, 0)
+
+    def escribir(self, sesion_id: str, datos: Dict[str, Any], version_esperada: int) -> int:
+        clave = self._clave("sesion", sesion_id)
+        with self._redis.pipeline() as tuberia:
+            try:
+                tuberia.watch(clave)
+                actual = tuberia.hget(clave, "version")
+                if int(actual or 0) != version_esperada:
+                    raise ConflictoVersion(f"sesión {sesion_id}: la versión {version_esperada} ya no es la actual")
+                tuberia.multi()
+                tuberia.hset(clave, mapping={"version": version_esperada + 1,
+                                             "datos": json.dumps(datos, ensure_ascii=False)})
+                tuberia.expire(clave, self.ttl)
+                tuberia.execute()
+            except self._WatchError:
+                raise ConflictoVersion(f"sesión {sesion_id}: escritura concurrente")
+        return version_esperada + 1
+
+    def eliminar(self, sesion_id: str):
+        self._redis.delete(self._clave("sesion", sesion_id))
+
+    # --- Checkpoints --------------------------------------------------------
+    # indice (zset lexicográfico) cp:{thread}:{ns} -> ids; hash cp:{thread}:{ns}:{id} -> campos
+
+    def guardar_checkpoint(self, registro: RegistroCheckpoint):
+        indice = self._clave("cp", registro.thread_id, registro.ns)
+        with self._redis.pipeline() as tuberia:
+            try:
+                tuberia.watch(indice)
+                ultimo = tuberia.zrange(indice, -1, -1)
+                ultimo = ultimo[0].decode() if ultimo else None
+                if ultimo and ultimo not in (registro.padre_id, registro.checkpoint_id):
+                    raise ConflictoVersion(f"hilo {registro.thread_id}: otro proceso avanzó la conversación")
+                tuberia.multi()
+                tuberia.hset(f"{indice}:{registro.checkpoint_id}", mapping={
+                    "padre_id": registro.padre_id or "", "tipo": registro.tipo,
+                    "checkpoint": registro.checkpoint, "metadata": registro.metadata})
+                tuberia.zadd(indice, {registro.checkpoint_id: 0})
+                tuberia.sadd(self._clave("ns", registro.thread_id), registro.ns)
+                # La cadena de la que depende se renueva con él: si caducara antes, el
+                # checkpoint (un delta) ya no se podría restaurar
+                for clave in (indice, f"{indice}:{registro.checkpoint_id}", self._clave("ns", registro.thread_id),
+                              *(f"{indice}:{anterior}" for anterior in registro.depende_de)):
+                    tuberia.expire(clave, self.ttl)
+                tuberia.execute()
+            except self._WatchError:
+                raise ConflictoVersion(f"hilo {registro.thread_id}: escritura concurrente")
+
+    def _cargar(self, thread_id: str, ns: str, checkpoint_id: str) -> Optional[RegistroCheckpoint]:
+        campos = self._redis.hgetall(f"{self._clave('cp', thread_id, ns)}:{checkpoint_id}")
+        if not campos:
+            return None
+        return RegistroCheckpoint(thread_id, ns, checkpoint_id, campos[b"padre_id"].decode() or None,
+                                  campos[b"tipo"].decode(), campos[b"checkpoint"], campos[b"metadata"])
+
+    def obtener_checkpoint(self, thread_id: str, ns: str,
+                           checkpoint_id: Optional[str] = None) -> Optional[RegistroCheckpoint]:
+        if not checkpoint_id:
+            ultimo = self._redis.zrange(self._clave("cp", thread_id, ns), -1, -1)
+            if not ultimo:
+                return None
+            checkpoint_id = ultimo[0].decode()
+        return self._cargar(thread_id, ns, checkpoint_id)
+
+    def listar_checkpoints(self, thread_id: str, ns: Optional[str] = None, antes: Optional[str] = None,
+                           limite: Optional[int] = None) -> Iterator[RegistroCheckpoint]:
+        espacios = [ns] if ns is not None else [n.decode() for n in self._redis.smembers(self._clave("ns", thread_id))]
+        ids = []
+        for espacio in espacios:
+            maximo = f"({antes}" if antes else "+"
+            ids += [(i.decode(), espacio) for i in self._redis.zrevrangebylex(self._clave("cp", thread_id, espacio),
+                                                                              maximo, "-")]
+        ids.sort(reverse=True)
+        for checkpoint_id, espacio in ids[:limite] if limite else ids:
+            registro = self._cargar(thread_id, espacio, checkpoint_id)
+            if registro:
+                yield registro
+
+    def guardar_escrituras(self, thread_id: str, ns: str, checkpoint_id: str,
+                           escrituras: Sequence[Escritura], reemplazar: bool):
+        clave = self._clave("wr", thread_id, ns, checkpoint_id)
+        with self._redis.pipeline() as tuberia:
+            for task_id, idx, canal, tipo, valor in escrituras:
+                campo = f"{task_id}:{idx:06d}"
+                valor_codificado = canal.encode() + b"\x00" + tipo.encode() + b"\x00" + valor
+                if reemplazar:
+                    tuberia.hset(clave, campo, valor_codificado)
+                else:
+                    tuberia.hsetnx(clave, campo, valor_codificado)
+            tuberia.expire(clave, self.ttl)
+            tuberia.execute()
+
+    def obtener_escrituras(self, thread_id: str, ns: str, checkpoint_id: str) -> List[Escritura]:
+        escrituras = []
+        for campo, valor in sorted(self._redis.hgetall(self._clave("wr", thread_id, ns, checkpoint_id)).items()):
+            task_id, idx = campo.decode().rsplit(":", 1)
+            canal, tipo, dato = valor.split(b"\x00", 2)
+            escrituras.append((task_id, int(idx), canal.decode(), tipo.decode(), dato))
+        return escrituras
+
+    def eliminar_hilo(self, thread_id: str):
+        claves = [self._clave("ns", thread_id)]
+        for patron in (self._clave("cp", thread_id) + ":*", self._clave("wr", thread_id) + ":*"):
+            claves += list(self._redis.scan_iter(match=patron))
+        self._redis.delete(*claves)
+
+# ============================================================================
+# FÁBRICA
+# ============================================================================
+
+def crear_almacen(url: str = RUTA_SESIONES) -> AlmacenSesiones:
+    """'sqlite:ruta' o 'redis://...'"""
+    if url.startswith("sqlite:"):
+        return AlmacenSQLite(url[len("sqlite:"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return AlmacenRedis(url)
+    raise ValueError(f"SESIONES_URL no soportado: {url}")
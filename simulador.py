@@ -0,0 +1,115 @@
+"""
+🎲 MOTOR DE VUELOS SIMULADOS
+Genera ofertas deterministas por (ruta, fecha, semilla) a partir de una
+tabla precalculada de distancias ortodrómicas entre aeropuertos y un
+modelo de tarifas por banda de distancia y temporada
+"""
+
+import os
+import random
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import numpy as np
+
+from configuracion import tablas_config
+from geografia import AEROPUERTOS
+from ofertas import OfertaVuelo, MAX_OFERTAS
+from precios import MONEDA
+
+SEMILLA = os.getenv("SIMULADOR_SEMILLA", "0")
+
+# ============================================================================
+# DATOS DE REFERENCIA
+# ============================================================================
+
+# Aerolíneas, rutas populares (precio base solo ida por adulto calibrado a mano),
+# bandas de distancia (hasta_km, cargo_fijo, precio_por_km), multiplicador por
+# mes del vuelo de ida y horas de salida: tabla "vuelos" de datos/tablas.json
+
+VELOCIDAD_CRUCERO_KMH = 800
+PRECIO_POR_DEFECTO = 500
+
+# ============================================================================
+# TABLA DE DISTANCIAS (PRECALCULADA AL IMPORTAR)
+# ============================================================================
+
+_CODIGOS = list(AEROPUERTOS)
+_INDICE = {codigo: i for i, codigo in enumerate(_CODIGOS)}
+
+def _matriz_distancias() -> np.ndarray:
+    """Distancias ortodrómicas (haversine) en km entre todos los aeropuertos"""
+    coords = np.radians(np.array([AEROPUERTOS[c] for c in _CODIGOS]))
+    lat, lon = coords[:, 0][:, None], coords[:, 1][:, None]
+    dlat = lat - lat.T
+    dlon = lon - lon.T
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat) * np.cos(lat.T) * np.sin(dlon / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(a))
+
+DISTANCIAS_KM = _matriz_distancias()
+
+def distancia_km(origen_iata: str, destino_iata: str) -> Optional[float]:
+    i, j = _INDICE.get(origen_iata), _INDICE.get(destino_iata)
+    if i is None or j is None:
+        return None
+    return float(DISTANCIAS_KM[i, j])
+
+# ============================================================================
+# MODELO DE TARIFAS
+# ============================================================================
+
+def tarifa_por_distancia(km: float) -> float:
+    for hasta, fijo, por_km in tablas_config["vuelos"]["bandas_tarifa"]:
+        if km <= hasta:
+            return fijo + por_km * km
+    return PRECIO_POR_DEFECTO
+
+def precio_base(origen_iata: str, destino_iata: str) -> float:
+    """Precio de referencia solo ida por adulto, antes de temporada y variación"""
+    rutas_populares = tablas_config["vuelos"]["rutas_populares"]
+    ruta = rutas_populares.get((origen_iata, destino_iata)) or rutas_populares.get((destino_iata, origen_iata))
+    if ruta:
+        return ruta
+    km = distancia_km(origen_iata, destino_iata)
+    return tarifa_por_distancia(km) if km is not None else PRECIO_POR_DEFECTO
+
+@lru_cache(maxsize=4096)
+def simular_vuelos(origen_iata: str, destino_iata: str, fecha_ida: str,
+                   fecha_vuelta: Optional[str] = None, semilla: str = SEMILLA,
+                   max_ofertas: int = MAX_OFERTAS) -> Tuple[OfertaVuelo, ...]:
+    """
+    Ofertas simuladas reproducibles: la misma (ruta, fechas, semilla)
+    produce siempre el mismo resultado, así que puede cachearse y testearse
+    (la caché se vacía al recargar las tablas de configuración).
+    """
+    tablas = tablas_config["vuelos"]
+    aerolineas = tablas["aerolineas"]
+    rng = random.Random(f"{origen_iata}|{destino_iata}|{fecha_ida}|{fecha_vuelta}|{semilla}")
+    km = distancia_km(origen_iata, destino_iata) or 0.0
+    mes = datetime.strptime(fecha_ida, "%Y-%m-%d").month
+    base = precio_base(origen_iata, destino_iata) * tablas["temporada"][mes]
+    multiplicador = 2 if fecha_vuelta else 1
+
+    ofertas = []
+    for aerolinea in rng.sample(aerolineas, min(max_ofertas, len(aerolineas))):
+        escalas = 0
+        if km > 8000 or (km > 3000 and rng.random() < 0.4):
+            escalas = 1 if km < 12000 else 2
+        minutos = int((km / VELOCIDAD_CRUCERO_KMH + 0.5 + 1.75 * escalas) * 60)
+        minutos = max(minutos, 45) + rng.randrange(0, 30, 5)
+        salida = rng.choice(tablas["horas_salida"])
+        llegada = datetime.strptime(salida, "%H:%M") + timedelta(minutes=minutos)
+
+        ofertas.append(OfertaVuelo(
+            precio=float(int(base * rng.uniform(0.85, 1.25) * multiplicador)),
+            moneda=MONEDA,
+            aerolinea=f"{aerolinea['nombre']} ({aerolinea['codigo']})",
+            salida=salida,
+            llegada=llegada.strftime("%H:%M"),
+            escalas=escalas,
+            duracion=f"{minutos // 60}h {minutos % 60:02d}m",
+        ))
+    return tuple(ofertas)
+
+tablas_config.al_recargar(simular_vuelos.cache_clear)
@@ -0,0 +1,72 @@
+"""
+🧪 PRUEBAS DEL PREPROCESADOR
+Falsos positivos de viajeros (lugares con un número entre paréntesis) y
+niveles de presupuesto en femenino. Ejecutar con: python -m pytest -q
+"""
+
+from datetime import date
+
+import pytest
+
+from preprocesador import extraer_presupuesto, preprocesar
+from viajeros import ViajerosDB, viajeros_aislados
+
+HOY = date(2026, 10, 19)
+
+@pytest.fixture
+def viajeros():
+    lista = ViajerosDB()
+    with viajeros_aislados(lista):
+        yield lista
+
+# ============================================================================
+# VIAJEROS
+# ============================================================================
+
+@pytest.mark.parametrize("mensaje", [
+    "Quiero visitar Barcelona (4 días) y Madrid (3)",
+    "La Paz (3)",
+    "Madrid (3)",
+    "Iremos a Toledo (3) y Segovia (2)",
+    "Toledo (3)",
+])
+def test_lugares_no_son_viajeros(viajeros, mensaje):
+    resultado = preprocesar(mensaje, HOY)
+    assert resultado.registrados == []
+    assert viajeros.listar() == []
+    assert resultado.respuesta_directa is None
+    assert "Viajeros YA registrados" not in resultado.mensaje_agente
+
+def test_un_nombre_sin_pista_lo_decide_el_modelo(viajeros):
+    resultado = preprocesar("Juan (3)", HOY)
+    assert viajeros.listar() == []
+    assert resultado.respuesta_directa is None
+
+@pytest.mark.parametrize("mensaje, esperados", [
+    ("Juan (30) y María (28)", [("Juan", 30), ("María", 28)]),
+    ("Somos Juan (30)", [("Juan", 30)]),
+    ("Ana, 34 años", [("Ana", 34)]),
+    ("Santiago, 35 años", [("Santiago", 35)]),
+])
+def test_viajeros_con_pista(viajeros, mensaje, esperados):
+    resultado = preprocesar(mensaje, HOY)
+    assert [(v["nombre"], v["edad"]) for v in resultado.registrados] == esperados
+    assert resultado.respuesta_directa is not None
+
+def test_viajeros_y_lugar_en_el_mismo_mensaje(viajeros):
+    resultado = preprocesar("Somos Juan (30) y María (28) y queremos ir a Madrid (3 días)", HOY)
+    assert [v["nombre"] for v in viajeros.listar()] == ["Juan", "María"]
+    assert resultado.respuesta_directa is None
+
+# ============================================================================
+# PRESUPUESTO
+# ============================================================================
+
+@pytest.mark.parametrize("texto, nivel", [
+    ("gama media", "medio"), ("presupuesto media", "medio"), ("nivel moderada", "medio"),
+    ("gama intermedia", "medio"), ("presupuesto baja", "economico"), ("gama alta", "lujo"),
+    ("algo barata", "economico"), ("una opción económica", "economico"), ("viaje low cost", "economico"),
+    ("presupuesto medio", "medio"), ("de lujo", "lujo"),
+])
+def test_niveles_de_presupuesto(texto, nivel):
+    assert extraer_presupuesto(texto) == nivel
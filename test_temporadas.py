@@ -0,0 +1,26 @@
+"""
+🧪 PRUEBAS DE TEMPORADAS
+Bloque de recomendaciones según zona climática: los climas de altura y los
+de invierno seco (Cw*/Dw*) no reutilizan el verano/invierno del hemisferio
+"""
+
+import pytest
+
+from asistente import obtener_codigo_iata, tipo_temporada
+from geografia import ubicar
+
+@pytest.mark.parametrize("destino, mes, tipo", [
+    ("Cusco", 1, "altura_lluvias"), ("Cusco", 7, "altura_seca"),
+    ("Machu Picchu", 2, "altura_lluvias"), ("Bolivia", 8, "altura_seca"),
+    ("Bogotá", 1, "altura"), ("México", 7, "altura_lluvias"),
+    ("Hong Kong", 7, "monzon_lluvias"), ("China", 1, "invierno_seco"),
+    ("Madrid", 7, "verano"), ("Madrid", 1, "invierno"),
+    ("Bali", 1, "tropical_lluvias"), ("Moscú", 1, "invierno_nieve"),
+])
+def test_tipo_temporada(destino, mes, tipo):
+    lugar = ubicar(destino, obtener_codigo_iata(destino))
+    assert lugar is not None
+    assert tipo_temporada(lugar, mes) == tipo
+
+def test_sin_lugar_usa_transicion():
+    assert tipo_temporada(None, 1) == "transicion"
@@ -0,0 +1,86 @@
+"""
+👥 BASE DE DATOS DE VIAJEROS
+Módulo ligero (sin LangChain) para que la interfaz pueda mostrar los
+viajeros sin importar todo el agente. Cada ejecución puede trabajar con
+su propia lista (viajeros_aislados), p. ej. en la planificación por lotes
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+def tipo_por_edad(edad: int) -> str:
+    """adulto (18+), niño (2-17), bebé (0-1)"""
+    return "adulto" if edad >= 18 else "niño" if edad >= 2 else "bebé"
+
+class ViajerosDB:
+    """Base de datos en memoria para gestionar viajeros"""
+    def __init__(self):
+        self.viajeros: List[Dict[str, Any]] = []
+        self.contador = 1
+    
+    def agregar(self, nombre: str, edad: int, tipo: str = "adulto") -> Dict:
+        viajero = {
+            "id": self.contador,
+            "nombre": nombre,
+            "edad": edad,
+            "tipo": tipo,  # adulto, niño, bebé
+            "fecha_registro": datetime.now().strftime("%Y-%m-%d %H:%M")
+        }
+        self.viajeros.append(viajero)
+        self.contador += 1
+        return viajero
+    
+    def listar(self) -> List[Dict]:
+        return self.viajeros
+    
+    def limpiar(self):
+        self.viajeros = []
+        self.contador = 1
+    
+    def a_dict(self) -> Dict[str, Any]:
+        """Forma serializable (JSON) para guardar en el almacén de sesiones"""
+        return {"viajeros": self.viajeros, "contador": self.contador}
+    
+    @classmethod
+    def desde_dict(cls, datos: Optional[Dict[str, Any]]) -> "ViajerosDB":
+        db = cls()
+        if datos:
+            db.viajeros = list(datos.get("viajeros", []))
+            db.contador = datos.get("contador", len(db.viajeros) + 1)
+        return db
+    
+    def contar_por_tipo(self) -> Dict[str, int]:
+        conteo = {"adulto": 0, "niño": 0, "bebé": 0}
+        for v in self.viajeros:
+            conteo[v["tipo"]] = conteo.get(v["tipo"], 0) + 1
+        return conteo
+
+# ============================================================================
+# LISTA ACTIVA POR CONTEXTO
+# ============================================================================
+
+_global = ViajerosDB()
+_actual: ContextVar[ViajerosDB] = ContextVar("viajeros_actual", default=_global)
+
+class _ViajerosActivos:
+    """Delega en la lista del contexto actual (la global si nadie la cambió)"""
+    def __getattr__(self, nombre: str) -> Any:
+        return getattr(_actual.get(), nombre)
+
+@contextmanager
+def viajeros_aislados(db: Optional[ViajerosDB] = None) -> Iterator[ViajerosDB]:
+    """
+    Usa una lista propia dentro del bloque. Los hilos que copian el contexto
+    (como los que usa LangGraph para ejecutar herramientas) la heredan.
+    """
+    db = db if db is not None else ViajerosDB()
+    token = _actual.set(db)
+    try:
+        yield db
+    finally:
+        _actual.reset(token)
+
+# Instancia global
+viajeros_db = _ViajerosActivos()
@@ -0,0 +1,151 @@
+"""
+⏳ VUELOS PROGRESIVOS
+Autenticarse en Amadeus y buscar puede tardar muchos segundos. En modo
+progresivo, buscar_vuelos responde al instante con precios orientativos
+(simulados) y la búsqueda real sigue aquí en segundo plano. Cuando termina,
+el resultado queda listo para la sesión: la interfaz lo muestra (la app lo
+consulta periódicamente y la API lo expone) y se añade al historial del
+agente antes del siguiente turno, para que el modelo use los precios reales.
+Si la búsqueda falla, se avisa igual: los orientativos siguen siendo estimación
+"""
+
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from metricas import metricas
+from plazos import plazo_independiente
+
+# Activado en la app y en la API (los lotes siempre esperan los precios reales)
+VUELOS_PROGRESIVOS = os.getenv("VUELOS_PROGRESIVOS", "1") != "0"
+
+# Hilos para las búsquedas en segundo plano (todas las sesiones del proceso)
+HILOS_BUSQUEDA = int(os.getenv("VUELOS_FONDO_HILOS", "4"))
+
+# Segundos máximos de una búsqueda en segundo plano
+PLAZO_BUSQUEDA = float(os.getenv("VUELOS_FONDO_PLAZO_S", "45"))
+
+# Búsquedas terminadas que se recuerdan si nadie las recoge
+CADUCIDAD = 3600.0
+MAX_HILOS = 1000
+
+BUSCANDO, LISTA, FALLIDA = "buscando", "lista", "fallida"
+
+class BusquedaVuelos:
+    def __init__(self, thread_id: str, clave: Hashable, descripcion: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.thread_id = thread_id
+        self.clave = clave
+        self.descripcion = descripcion
+        self.estado = BUSCANDO
+        self.texto: Optional[str] = None
+        self.creada = time.time()
+        self.terminada: Optional[float] = None
+        self.aplicada = False
+
+    @property
+    def mensaje(self) -> str:
+        """Mensaje del asistente con los precios reales (o el aviso de que no llegaron)"""
+        if self.estado == FALLIDA:
+            return (f"⚠️ No he podido obtener los precios reales de {self.descripcion}. Los precios "
+                    f"orientativos siguen siendo una estimación; puedo volver a buscarlos más tarde.")
+        return f"✈️ Ya tengo los precios reales de {self.descripcion}:\n\n{self.texto}"
+
+    def a_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "descripcion": self.descripcion, "estado": self.estado,
+                "segundos": round((self.terminada or time.time()) - self.creada, 1),
+                "texto": self.texto, "aplicada": self.aplicada,
+                "mensaje": self.mensaje if self.estado != BUSCANDO else None}
+
+class RegistroBusquedas:
+    """Búsquedas en curso y terminadas por hilo de conversación (thread_id)"""
+    def __init__(self, hilos: int = HILOS_BUSQUEDA):
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="vuelos_fondo")
+        self._hilos: "OrderedDict[str, List[BusquedaVuelos]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def iniciar(self, thread_id: str, clave: Hashable, descripcion: str,
+                buscar: Callable[[], Optional[str]]) -> BusquedaVuelos:
+        """
+        Lanza `buscar` (devuelve el texto final o None si no hubo precios
+        reales) en el contexto actual (viajeros de la sesión), salvo que ya
+        haya una búsqueda igual en curso para el hilo
+        """
+        with self._lock:
+            busquedas = self._hilos.setdefault(thread_id, [])
+            self._hilos.move_to_end(thread_id)
+            ahora = time.time()
+            busquedas[:] = [b for b in busquedas if b.estado == BUSCANDO or ahora - b.terminada < CADUCIDAD]
+            for busqueda in busquedas:
+                if busqueda.clave == clave and busqueda.estado == BUSCANDO:
+                    return busqueda
+            busqueda = BusquedaVuelos(thread_id, clave, descripcion)
+            busquedas.append(busqueda)
+            while len(self._hilos) > MAX_HILOS:
+                self._hilos.popitem(last=False)
+        metricas.incrementar("vuelos_progresivos_total", resultado="iniciada")
+        self._pool.submit(contextvars.copy_context().run, self._ejecutar, busqueda, buscar)
+        return busqueda
+
+    def _ejecutar(self, busqueda: BusquedaVuelos, buscar: Callable[[], Optional[str]]):
+        # El turno que la lanzó ya terminó: su plazo no aplica aquí
+        try:
+            with plazo_independiente(PLAZO_BUSQUEDA):
+                texto = buscar()
+        except Exception:
+            texto = None
+        busqueda.texto = texto
+        busqueda.terminada = time.time()
+        # El estado al final: quien lo ve terminado ve también texto y terminada
+        busqueda.estado = LISTA if texto else FALLIDA
+        metricas.incrementar("vuelos_progresivos_total", resultado=busqueda.estado)
+        metricas.incrementar("vuelos_progresivos_segundos_total", busqueda.terminada - busqueda.creada)
+
+    def listar(self, thread_id: str) -> List[BusquedaVuelos]:
+        with self._lock:
+            return list(self._hilos.get(thread_id, []))
+
+    def en_curso(self, thread_id: str) -> List[BusquedaVuelos]:
+        return [b for b in self.listar(thread_id) if b.estado == BUSCANDO]
+
+    def pendientes(self, thread_id: str) -> List[BusquedaVuelos]:
+        """Terminadas (con precios reales o fallidas) que aún no se añadieron al historial"""
+        return [b for b in self.listar(thread_id) if b.estado != BUSCANDO and not b.aplicada]
+
+    def activas(self, thread_id: str) -> bool:
+        """True si hay algo que esperar o que mostrar para el hilo"""
+        return any(not b.aplicada for b in self.listar(thread_id))
+
+    def aplicar(self, agente, config: Dict[str, Any]) -> List[BusquedaVuelos]:
+        """
+        Añade al historial del agente los resultados pendientes del hilo, como
+        mensajes del asistente. Debe llamarse sin un turno en curso en ese hilo.
+        Las búsquedas se reservan bajo el lock antes de escribir: dos llamadas
+        a la vez (refresco de la app y nuevo mensaje) no aplican la misma dos veces
+        """
+        from langchain_core.messages import AIMessage
+
+        with self._lock:
+            pendientes = [b for b in self._hilos.get(config["configurable"]["thread_id"], [])
+                          if b.estado != BUSCANDO and not b.aplicada]
+            for busqueda in pendientes:
+                busqueda.aplicada = True
+        if pendientes:
+            try:
+                agente.update_state(config, {"messages": [AIMessage(content=b.mensaje) for b in pendientes]},
+                                    as_node="agent")
+            except BaseException:
+                # No llegaron al historial: que las recoja la siguiente llamada
+                with self._lock:
+                    for busqueda in pendientes:
+                        busqueda.aplicada = False
+                raise
+        return pendientes
+
+# Instancia global
+busquedas_vuelos = RegistroBusquedas()